@@ -102,6 +102,9 @@ else:
         "default": {
             "ENGINE": "django.db.backends.sqlite3",
             "NAME": BASE_DIR / "db.sqlite3",
+            # An on-disk test database: the in-memory one fails concurrent
+            # writers with "table is locked" instead of waiting for the lock.
+            "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
         }
     }
 
@@ -137,6 +140,13 @@ CSRF_COOKIE_SECURE = True
 CSRF_COOKIE_SAMESITE = "None"
 CSRF_COOKIE_HTTPONLY = False
 
+# Anonymous carts live in a signed cookie (products.guest_cart) rather than
+# in sessions or CartItem rows, and are merged into CartItem at login.
+GUEST_CART_COOKIE_NAME = os.getenv("GUEST_CART_COOKIE_NAME", "guest_cart")
+GUEST_CART_MAX_AGE = int(os.getenv("GUEST_CART_MAX_AGE", str(30 * 24 * 60 * 60)))
+# Per-user /api/cart/summary/ entries; cart writes drop them earlier.
+CART_SUMMARY_CACHE_TIMEOUT = int(os.getenv("CART_SUMMARY_CACHE_TIMEOUT", "300"))
+
 
 # Security hardening
 SECURE_SSL_REDIRECT = env_bool("SECURE_SSL_REDIRECT", not DEBUG)
@@ -162,6 +172,35 @@ PASSWORD_HASHERS = [
 ]
 
 
+# Cache
+# LocMemCache is per process: a catalog write only invalidates the worker that
+# handled it. Every catalog entry (responses, validators and the /api/home/ and
+# /api/offers/ snapshots) is kept for at most CATALOG_CACHE_TIMEOUT, so other
+# workers catch up within that. Point the backend at
+# django.core.cache.backends.filebased.FileBasedCache with a shared directory
+# so every gunicorn worker sees the same catalog version.
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "DJANGO_CACHE_BACKEND",
+            "django.core.cache.backends.locmem.LocMemCache",
+        ),
+        "LOCATION": os.getenv("DJANGO_CACHE_LOCATION", "vmall-cache"),
+    }
+}
+CATALOG_CACHE_TIMEOUT = int(os.getenv("CATALOG_CACHE_TIMEOUT", "300"))
+
+# Per-worker typeahead index (products.suggest)
+SUGGEST_MAX_ENTRIES = int(os.getenv("SUGGEST_MAX_ENTRIES", "200000"))
+SUGGEST_REBUILD_INTERVAL = int(os.getenv("SUGGEST_REBUILD_INTERVAL", "60"))
+
+# Stale-while-revalidate snapshots (/api/home/, /api/offers/). With background
+# rebuilds on, a stale snapshot keeps being served while one thread
+# regenerates it; off, the first request after a catalog write rebuilds inline.
+CATALOG_SNAPSHOT_BACKGROUND_REBUILD = env_bool("CATALOG_SNAPSHOT_BACKGROUND_REBUILD", True)
+CATALOG_SNAPSHOT_LOCK_TIMEOUT = int(os.getenv("CATALOG_SNAPSHOT_LOCK_TIMEOUT", "60"))
+
+
 # Static / media
 STATIC_URL = "/static/"
 STATIC_ROOT = BASE_DIR / "staticfiles"
@@ -170,6 +209,13 @@ WHITENOISE_MAX_AGE = 31536000
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Product image uploads (products.uploads). Storage writes of one request run
+# on at most this many threads. Deferred mode answers right away with pending
+# ProductImage rows and uploads after commit; a request can also opt in or out
+# with defer_images=1|0.
+PRODUCT_IMAGE_UPLOAD_WORKERS = int(os.getenv("PRODUCT_IMAGE_UPLOAD_WORKERS", "4"))
+PRODUCT_IMAGE_UPLOADS_DEFERRED = env_bool("PRODUCT_IMAGE_UPLOADS_DEFERRED", False)
+
 
 # Cloudinary
 CLOUDINARY_STORAGE = {
@@ -1,5 +1,6 @@
 from django.contrib import admin
 from django.utils.html import format_html
+from .images import stored_image_url
 from .models import Category, Product
 
 
@@ -35,7 +36,7 @@ class ProductAdmin(admin.ModelAdmin):
         if obj.image:
             return format_html(
                 '<img src="{}" style="width:60px;height:60px;object-fit:cover;border-radius:6px;" />',
-                obj.image.url
+                stored_image_url(obj)
             )
         return "—"
     image_preview.short_description = "Image"
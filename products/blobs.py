@@ -0,0 +1,168 @@
+import hashlib
+import logging
+import posixpath
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, ProtectedError
+
+from .images import build_upload_variants, delete_image_variants, run_concurrently
+from .models import ImageBlob, Product, ProductImage
+
+
+logger = logging.getLogger(__name__)
+
+BLOB_FOLDER = "products/blobs"
+
+
+def blob_storage():
+    return Product._meta.get_field("image").storage
+
+
+def content_hash(upload):
+    digest = hashlib.sha256()
+    for chunk in upload.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def blob_name(sha256, filename):
+    extension = posixpath.splitext(filename or "")[1].lower()
+    return posixpath.join(BLOB_FOLDER, sha256[:2], f"{sha256}{extension}")
+
+
+def blob_fields(blob):
+    # Column values for a Product or ProductImage row whose image is `blob`.
+    return {
+        "image": blob.name,
+        "image_blob": blob,
+        "image_url": blob.url,
+        "image_variants": blob.variants,
+    }
+
+
+def acquire_blob(sha256, count=1):
+    # Takes `count` references on an existing blob; None when there is none.
+    if ImageBlob.objects.filter(sha256=sha256).update(ref_count=F("ref_count") + count):
+        return ImageBlob.objects.get(sha256=sha256)
+    return None
+
+
+def _save(write):
+    storage, name, upload = write
+    return storage.save(name, upload)
+
+
+def _save_or_error(write):
+    try:
+        return _save(write), None
+    except Exception as exc:
+        return None, exc
+
+
+def _create_blob(storage, sha256, name, upload, count):
+    try:
+        variants = build_upload_variants(storage, name, upload)
+    except Exception:
+        logger.exception("Could not build image derivatives for blob %s", name)
+        variants = {}
+    try:
+        with transaction.atomic():
+            return ImageBlob.objects.create(
+                sha256=sha256,
+                name=name,
+                url=storage.url(name),
+                variants=variants,
+                size=upload.size or 0,
+                ref_count=count,
+            )
+    except IntegrityError:
+        # Another request stored the same bytes first: use theirs.
+        _delete_files(storage, name, variants)
+        blob = acquire_blob(sha256, count)
+        if blob is None:
+            raise
+        return blob
+
+
+def store_blobs(uploads, skip_failed=False):
+    # One ImageBlob per upload, in order, each holding one reference for the
+    # row the caller is about to point at it. Bytes that are already stored
+    # (or repeated within `uploads`) are not uploaded again; new ones go out
+    # concurrently. With skip_failed a failed upload yields None; otherwise
+    # the first failure is raised once every reference taken here has been
+    # handed back and the files written here are gone.
+    hashes = [content_hash(upload) for upload in uploads]
+    counts = Counter(hashes)
+    blobs = {}
+    stored = {}
+    storage = blob_storage()
+    try:
+        for sha256, count in counts.items():
+            blob = acquire_blob(sha256, count)
+            if blob is not None:
+                blobs[sha256] = blob
+
+        missing = {}
+        for sha256, upload in zip(hashes, uploads):
+            if sha256 not in blobs and sha256 not in missing:
+                missing[sha256] = upload
+        writes = [(storage, blob_name(sha256, upload.name), upload) for sha256, upload in missing.items()]
+        results = run_concurrently(_save_or_error, writes)
+
+        errors = []
+        for write, sha256, (name, error) in zip(writes, missing, results):
+            if error is None:
+                stored[sha256] = name
+            elif skip_failed:
+                logger.error("Upload of %s failed", write[1], exc_info=error)
+            else:
+                errors.append(error)
+        if errors:
+            raise errors[0]
+        for sha256, name in stored.items():
+            blobs[sha256] = _create_blob(storage, sha256, name, missing[sha256], counts[sha256])
+    except Exception:
+        for sha256, blob in blobs.items():
+            release_blob(blob.id, counts[sha256])
+        for sha256, name in stored.items():
+            if sha256 not in blobs:
+                _delete_files(storage, name, {})
+        raise
+    return [blobs.get(sha256) for sha256 in hashes]
+
+
+def _delete_files(storage, name, variants):
+    delete_image_variants(variants or {}, storage)
+    try:
+        storage.delete(name)
+    except Exception:
+        logger.warning("Could not delete image blob %s", name, exc_info=True)
+
+
+def release_blob(blob_id, count=1):
+    # Drops `count` references; the blob and its files go once the last one
+    # does, after the releasing transaction commits.
+    if blob_id is None:
+        return
+    ImageBlob.objects.filter(pk=blob_id, ref_count__gte=count).update(ref_count=F("ref_count") - count)
+    transaction.on_commit(lambda: collect_blob(blob_id))
+
+
+def collect_blob(blob_id):
+    with transaction.atomic():
+        blob = ImageBlob.objects.select_for_update().filter(pk=blob_id, ref_count=0).first()
+        if blob is None:
+            return False
+        try:
+            blob.delete()
+        except ProtectedError:
+            # The counter drifted below the real number of rows; repair it.
+            blob.ref_count = (
+                Product.objects.filter(image_blob=blob).count()
+                + ProductImage.objects.filter(image_blob=blob).count()
+            )
+            blob.save(update_fields=["ref_count"])
+            return False
+    _delete_files(blob_storage(), blob.name, blob.variants)
+    return True
@@ -0,0 +1,184 @@
+import hashlib
+import json
+import logging
+import math
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from rest_framework import status
+from rest_framework.response import Response
+
+
+CATALOG_VERSION_KEY = "catalog:version"
+CATEGORY_MAP_VERSION_KEY = "catalog:categories:version"
+CATALOG_STATS_KEYS = {
+    "hits": "catalog:stats:hits",
+    "misses": "catalog:stats:misses",
+    "offer_row_failures": "catalog:stats:offer_row_failures",
+}
+
+logger = logging.getLogger(__name__)
+
+
+def _fresh_version():
+    # Seeded from the clock so an evicted version key never comes back with a
+    # number that older cached responses were stored under.
+    return int(time.time() * 1000)
+
+
+def _read_version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _fresh_version(), timeout=None)
+        version = cache.get(key, 0)
+    return version
+
+
+def _bump_version(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = _fresh_version()
+        cache.set(key, version, timeout=None)
+        return version
+
+
+def catalog_version():
+    return _read_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    return _bump_version(CATALOG_VERSION_KEY)
+
+
+def category_map_version():
+    return _read_version(CATEGORY_MAP_VERSION_KEY)
+
+
+def bump_category_map_version():
+    return _bump_version(CATEGORY_MAP_VERSION_KEY)
+
+
+def incr_counter(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def catalog_cache_stats():
+    stats = {name: cache.get(key, 0) for name, key in CATALOG_STATS_KEYS.items()}
+    stats["version"] = catalog_version()
+    return stats
+
+
+def catalog_cache_key(kind, endpoint, query_params, kwargs):
+    params = sorted(
+        (name, value)
+        for name, values in query_params.lists()
+        for value in values
+    )
+    raw = repr((sorted(kwargs.items()), params)).encode("utf-8")
+    digest = hashlib.sha256(raw).hexdigest()
+    return f"catalog:{kind}:{endpoint}:{catalog_version()}:{digest}"
+
+
+def cached_catalog_response(endpoint):
+    # Caches successful GET payloads per catalog version; signal handlers bump
+    # the version on every catalog write, so stale entries are never read again
+    # and simply age out.
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if request.method != "GET":
+                return view(request, *args, **kwargs)
+
+            key = catalog_cache_key("resp", endpoint, request.query_params, kwargs)
+            data = cache.get(key)
+            if data is not None:
+                incr_counter(CATALOG_STATS_KEYS["hits"])
+                response = Response(data, status=status.HTTP_200_OK)
+                response["X-Cache"] = "HIT"
+                return response
+
+            incr_counter(CATALOG_STATS_KEYS["misses"])
+            response = view(request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                cache.set(key, response.data, timeout=settings.CATALOG_CACHE_TIMEOUT)
+            response["X-Cache"] = "MISS"
+            return response
+
+        return wrapped
+
+    return decorator
+
+
+def snapshot_lock_key(key):
+    return f"{key}:rebuilding"
+
+
+def _store_snapshot(key, build):
+    # Read the version before the data so a write racing with the build
+    # leaves the snapshot marked stale rather than fresh.
+    version = catalog_version()
+    snapshot = build()
+    snapshot["version"] = version
+    snapshot["built_at"] = time.time()
+    if "etag" not in snapshot:
+        raw = json.dumps(snapshot["data"], sort_keys=True, default=str)
+        snapshot["etag"] = hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+    # Capped at CATALOG_CACHE_TIMEOUT: with a per-process backend another
+    # worker's version bump is invisible here, so the entry has to age out.
+    timeout = settings.CATALOG_CACHE_TIMEOUT
+    if snapshot.get("expires_at") is not None:
+        timeout = min(timeout, max(1, math.ceil(snapshot["expires_at"] - snapshot["built_at"])))
+    cache.set(key, snapshot, timeout=timeout)
+    return snapshot
+
+
+def _rebuild_in_background(key, build):
+    try:
+        _store_snapshot(key, build)
+    except Exception:
+        logger.exception("Rebuilding snapshot %s failed", key)
+    finally:
+        cache.delete(snapshot_lock_key(key))
+        # Connections are per thread; close this one instead of leaking it.
+        connections.close_all()
+
+
+def cached_snapshot(key, build):
+    # Stale-while-revalidate over one cache entry tagged with the catalog
+    # version. Fresh: served as is. Stale: served as is while a single
+    # background thread rebuilds it (cache.add is the single-flight lock, and
+    # a crashed rebuild frees it when the lock expires). Missing: built
+    # inline. `build` returns a dict with at least "data". Returns
+    # (snapshot, is_stale). A snapshot with an "expires_at" (epoch seconds)
+    # is never served past it: time-based changes such as a scheduled offer
+    # going live are rebuilt inline rather than served stale.
+    snapshot = cache.get(key)
+    if snapshot is not None and time.time() >= (snapshot.get("expires_at") or math.inf):
+        snapshot = None
+    if snapshot is not None and snapshot["version"] == catalog_version():
+        incr_counter(CATALOG_STATS_KEYS["hits"])
+        return snapshot, False
+
+    incr_counter(CATALOG_STATS_KEYS["misses"])
+    if snapshot is None:
+        return _store_snapshot(key, build), False
+
+    lock_key = snapshot_lock_key(key)
+    if not cache.add(lock_key, True, timeout=settings.CATALOG_SNAPSHOT_LOCK_TIMEOUT):
+        return snapshot, True
+    if settings.CATALOG_SNAPSHOT_BACKGROUND_REBUILD:
+        threading.Thread(target=_rebuild_in_background, args=(key, build), daemon=True).start()
+        return snapshot, True
+    try:
+        return _store_snapshot(key, build), False
+    finally:
+        cache.delete(lock_key)
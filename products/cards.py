@@ -0,0 +1,122 @@
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from .images import stored_image_url
+from .models import Product, ProductCard, ProductImage, ProductSizeVariant
+from .pricing import price_summary
+
+
+CARD_UPDATE_FIELDS = [
+    "category",
+    "name",
+    "slug",
+    "is_active",
+    "featured",
+    "original_price",
+    "selling_price",
+    "has_offer",
+    "discount_percentage",
+    "min_variant_price",
+    "max_variant_price",
+    "in_stock",
+    "primary_image_url",
+    "image_count",
+    "created_at",
+    "refreshed_at",
+]
+
+
+def build_product_card(product):
+    has_offer, discount, selling_price = price_summary(
+        product.original_price, product.offer_price
+    )
+    variants = list(product.size_variants.all())
+    variant_prices = [
+        price_summary(variant.original_price, variant.offer_price)[2]
+        for variant in variants
+    ]
+    # Deferred uploads leave pending rows without a file until they land.
+    images = [row for row in product.images.all() if row.image]
+
+    primary_image_url = stored_image_url(product) or ""
+    for row in images:
+        if primary_image_url:
+            break
+        primary_image_url = stored_image_url(row) or ""
+
+    return ProductCard(
+        product=product,
+        category_id=product.category_id,
+        name=product.name,
+        slug=product.slug,
+        is_active=product.is_active,
+        featured=product.featured,
+        original_price=product.original_price,
+        selling_price=selling_price,
+        has_offer=has_offer,
+        discount_percentage=discount,
+        min_variant_price=min(variant_prices) if variant_prices else None,
+        max_variant_price=max(variant_prices) if variant_prices else None,
+        in_stock=product.stock > 0 or any(variant.stock > 0 for variant in variants),
+        primary_image_url=primary_image_url,
+        image_count=len(images) + (1 if product.image else 0),
+        created_at=product.created_at,
+    )
+
+
+def _save_cards(cards):
+    if connection.features.supports_update_conflicts_with_target:
+        ProductCard.objects.bulk_create(
+            cards,
+            update_conflicts=True,
+            unique_fields=["product"],
+            update_fields=CARD_UPDATE_FIELDS,
+        )
+        return
+    # MySQL has no ON CONFLICT (target): update the cards that exist, insert
+    # the rest. A card inserted concurrently is updated instead.
+    existing = set(
+        ProductCard.objects.filter(product_id__in=[card.product_id for card in cards])
+        .values_list("product_id", flat=True)
+    )
+    updated = [card for card in cards if card.product_id in existing]
+    for card in updated:
+        # bulk_update() skips auto_now.
+        card.refreshed_at = timezone.now()
+    ProductCard.objects.bulk_update(updated, CARD_UPDATE_FIELDS)
+    for card in cards:
+        if card.product_id in existing:
+            continue
+        try:
+            with transaction.atomic():
+                card.save(force_insert=True)
+        except IntegrityError:
+            card.save(force_update=True)
+
+
+def refresh_product_cards(product_ids):
+    product_ids = {pk for pk in product_ids if pk is not None}
+    if not product_ids:
+        return 0
+
+    products = list(
+        Product.objects.filter(id__in=product_ids).prefetch_related(
+            Prefetch(
+                "size_variants",
+                queryset=ProductSizeVariant.objects.filter(is_active=True),
+            ),
+            Prefetch(
+                "images",
+                queryset=ProductImage.objects.order_by("display_order", "id"),
+            ),
+        )
+    )
+    cards = [build_product_card(product) for product in products]
+    if cards:
+        _save_cards(cards)
+
+    missing = product_ids - {product.id for product in products}
+    if missing:
+        ProductCard.objects.filter(product_id__in=missing).delete()
+    return len(cards)
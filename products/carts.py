@@ -0,0 +1,220 @@
+from collections import Counter
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, IntegerField, Max, Q, Sum, When
+from django.utils import timezone
+
+from .cache import catalog_version
+from .models import CartItem, Product, ProductSizeVariant
+from .pricing import PRICE_FIELD, price_summary, selling_price_expression
+
+
+MAX_SYNC_LINES = 200
+
+
+def cart_line(user, product_id, size_variant_id=None):
+    # The (at most one) cart row for this product and size.
+    lines = CartItem.objects.filter(user=user, product_id=product_id)
+    if size_variant_id is None:
+        return lines.filter(size_variant__isnull=True)
+    return lines.filter(size_variant_id=size_variant_id)
+
+
+def _increment(lines, quantity):
+    return lines.update(quantity=F("quantity") + quantity, updated_at=timezone.now())
+
+
+def add_to_cart(user, product, size_variant=None, quantity=1):
+    # Adds `quantity` to the user's line with one UPDATE ... SET quantity =
+    # quantity + n, so concurrent adds never overwrite each other. When there
+    # is no line yet it is inserted; if another request inserts it first the
+    # unique constraint rejects ours and the increment lands on theirs.
+    lines = cart_line(user, product.id, size_variant.id if size_variant else None)
+    invalidate_cart_summary(user.id)
+    if not _increment(lines, quantity):
+        try:
+            with transaction.atomic():
+                return CartItem.objects.create(
+                    user=user,
+                    product=product,
+                    size_variant=size_variant,
+                    quantity=quantity,
+                )
+        except IntegrityError:
+            _increment(lines, quantity)
+    return lines.select_related("size_variant").get()
+
+
+def set_cart_quantity(item, quantity):
+    # Only the two columns that change are written.
+    item.quantity = quantity
+    item.save(update_fields=["quantity", "updated_at"])
+    return item
+
+
+def valid_cart_lines(lines):
+    # [(product_id, size_variant_id or None, quantity)] -> Counter of
+    # (product_id, size_variant_id) -> total quantity. Lines naming a missing
+    # product, or a size that is inactive or belongs to another product, are
+    # dropped. Two queries whatever the number of lines.
+    known_products = set(
+        Product.objects.filter(id__in={line[0] for line in lines}).values_list("id", flat=True)
+    )
+    variant_ids = {line[1] for line in lines if line[1] is not None}
+    variant_products = dict(
+        ProductSizeVariant.objects.filter(id__in=variant_ids, is_active=True).values_list("id", "product_id")
+    ) if variant_ids else {}
+
+    wanted = Counter()
+    for product_id, size_variant_id, quantity in lines:
+        if product_id not in known_products:
+            continue
+        if size_variant_id is not None and variant_products.get(size_variant_id) != product_id:
+            continue
+        wanted[(product_id, size_variant_id)] += quantity
+    return wanted
+
+
+def _merge_lines(user, wanted):
+    now = timezone.now()
+    existing = {
+        (item.product_id, item.size_variant_id): item
+        for item in CartItem.objects.select_for_update().filter(
+            user=user,
+            product_id__in={product_id for product_id, _ in wanted},
+        )
+    }
+    changed, created = [], []
+    for (product_id, size_variant_id), quantity in wanted.items():
+        item = existing.get((product_id, size_variant_id))
+        if item is None:
+            created.append(CartItem(
+                user=user,
+                product_id=product_id,
+                size_variant_id=size_variant_id,
+                quantity=quantity,
+            ))
+        else:
+            item.quantity += quantity
+            item.updated_at = now
+            changed.append(item)
+    CartItem.objects.bulk_update(changed, ["quantity", "updated_at"])
+    CartItem.objects.bulk_create(created)
+
+
+def sync_cart(user, lines):
+    # Adds every valid line to the user's cart in one transaction: existing
+    # lines are locked and bumped with one bulk UPDATE, new ones go in with
+    # one bulk INSERT. A line created concurrently by cart_add trips the
+    # unique constraint, and the merge is redone against it once.
+    wanted = valid_cart_lines(lines)
+    if not wanted:
+        return 0
+    invalidate_cart_summary(user.id)
+    try:
+        with transaction.atomic():
+            _merge_lines(user, wanted)
+    except IntegrityError:
+        with transaction.atomic():
+            _merge_lines(user, wanted)
+    return len(wanted)
+
+
+def cart_summary_key(user_id):
+    return f"cart:summary:{user_id}"
+
+
+def invalidate_cart_summary(user_id):
+    # Drop now and again after commit, so a summary cached from pre-commit
+    # rows in the meantime is discarded too (see invalidate_catalog).
+    key = cart_summary_key(user_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def _selected(size_value, product_value, output_field=PRICE_FIELD):
+    # A line is priced and stocked by its size when it has one.
+    return Case(
+        When(size_variant__isnull=False, then=size_value),
+        default=product_value,
+        output_field=output_field,
+    )
+
+
+CENT = Decimal("0.01")
+
+
+def _summary(lines, items, subtotal, total, out_of_stock):
+    subtotal = Decimal(subtotal or 0).quantize(CENT)
+    total = Decimal(total or 0).quantize(CENT)
+    return {
+        "line_count": lines,
+        "item_count": items or 0,
+        "subtotal": subtotal,
+        "discount_total": subtotal - total,
+        "total": total,
+        "out_of_stock_count": out_of_stock,
+        "has_out_of_stock": out_of_stock > 0,
+    }
+
+
+def cart_summary(user):
+    # Counts and totals for the user's cart in one aggregate query over
+    # CartItem joined to Product and ProductSizeVariant. Lines are priced
+    # by selling_price_expression, the SQL form of the price_summary rule
+    # that checkout and CartItemSerializer use; a line is out of stock when
+    # fewer units are left than it asks for.
+    original = _selected(F("size_variant__original_price"), F("product__original_price"))
+    selling = _selected(selling_price_expression("size_variant__"), selling_price_expression("product__"))
+    stock = _selected(F("size_variant__stock"), F("product__stock"), output_field=IntegerField())
+    totals = (
+        CartItem.objects.filter(user=user)
+        .annotate(stock_left=stock)
+        .aggregate(
+            lines=Count("id"),
+            items=Sum("quantity"),
+            subtotal=Sum(original * F("quantity"), output_field=PRICE_FIELD),
+            total=Sum(selling * F("quantity"), output_field=PRICE_FIELD),
+            out_of_stock=Count("id", filter=Q(stock_left__lt=F("quantity"))),
+        )
+    )
+    return _summary(**totals)
+
+
+def cart_stamp(user):
+    # (line count, latest updated_at) of the user's cart, read from the
+    # (user, -updated_at) index. Every cart write moves one of them, in
+    # whichever worker it happened, which invalidate_cart_summary (local to
+    # its worker's cache) cannot guarantee.
+    stamp = CartItem.objects.filter(user=user).aggregate(lines=Count("id"), changed=Max("updated_at"))
+    return stamp["lines"], stamp["changed"]
+
+
+def cached_cart_summary(user):
+    # Cached per user and keyed by the cart stamp, so a hit costs one index
+    # read instead of the joined aggregate. Prices and stock belong to the
+    # catalog, so a catalog write also retires the entry.
+    key = cart_summary_key(user.id)
+    version = (catalog_version(), cart_stamp(user))
+    cached = cache.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    summary = cart_summary(user)
+    cache.set(key, (version, summary), timeout=settings.CART_SUMMARY_CACHE_TIMEOUT)
+    return summary
+
+
+def guest_cart_summary(items):
+    # The same figures for unsaved guest CartItem rows, added up here.
+    subtotal = total = Decimal("0")
+    quantity = out_of_stock = 0
+    for item in items:
+        priced = item.size_variant if item.size_variant_id else item.product
+        subtotal += priced.original_price * item.quantity
+        total += price_summary(priced.original_price, priced.offer_price)[2] * item.quantity
+        quantity += item.quantity
+        out_of_stock += priced.stock < item.quantity
+    return _summary(len(items), quantity, subtotal, total, out_of_stock)
@@ -0,0 +1,56 @@
+import threading
+
+from django.db.models import Q
+
+from .cache import bump_category_map_version, category_map_version
+from .models import Category
+
+
+_category_map = None
+_category_map_lock = threading.Lock()
+
+
+def _load_map():
+    # Names first so a slug wins when it collides with another category's name.
+    rows = list(Category.objects.values_list("id", "slug", "name"))
+    mapping = {name.lower(): pk for pk, _, name in rows}
+    mapping.update((slug.lower(), pk) for pk, slug, _ in rows if slug)
+    return mapping
+
+
+def category_map():
+    # Per-worker {lower-cased slug or name: id}. Category writes clear it in
+    # this worker and bump a shared version so other workers reload as well.
+    global _category_map
+    version = category_map_version()
+    current = _category_map
+    if current is not None and current[0] == version:
+        return current[1]
+    with _category_map_lock:
+        _category_map = (version, _load_map())
+        return _category_map[1]
+
+
+def reset_category_map():
+    global _category_map
+    with _category_map_lock:
+        _category_map = None
+    bump_category_map_version()
+
+
+def resolve_category_id(value):
+    if not value:
+        return None
+    return category_map().get(value.lower())
+
+
+def category_q(value, field="category"):
+    # A mapped value filters on the FK column directly. Anything else (a
+    # category created by another worker a moment ago, or a bad value) is
+    # resolved by a subquery inside the same statement, so there is still no
+    # separate lookup round trip.
+    category_id = resolve_category_id(value)
+    if category_id is not None:
+        return Q(**{f"{field}_id": category_id})
+    matching = Category.objects.filter(Q(slug__iexact=value) | Q(name__iexact=value))
+    return Q(**{f"{field}_id__in": matching.values("id")})
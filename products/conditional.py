@@ -0,0 +1,123 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max, Sum
+from django.views.decorators.http import condition
+
+from .cache import catalog_cache_key
+from .models import Category, Product, ProductImage, ProductSizeVariant
+from .queries import public_products
+
+
+def _validator(endpoint, fingerprint, *timestamps):
+    # `fingerprint` identifies the row set besides its timestamps (counts and
+    # id sums), so a delete paired with an insert still changes the ETag.
+    raw = f"{endpoint}:{fingerprint}:{[value.isoformat() if value else '' for value in timestamps]}"
+    etag = hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+    timestamps = [value for value in timestamps if value is not None]
+    return etag, max(timestamps) if timestamps else None
+
+
+def _product_stats(products):
+    # (count, fingerprint, timestamps) for the products plus the size
+    # variants and images their responses embed: one aggregate per table.
+    stats = products.aggregate(
+        count=Count("id"),
+        ids=Sum("id"),
+        latest=Max("updated_at"),
+        category_latest=Max("category__updated_at"),
+    )
+    fingerprint = [(stats["count"], stats["ids"])]
+    timestamps = [stats["latest"], stats["category_latest"]]
+    for model in (ProductSizeVariant, ProductImage):
+        related = model.objects.filter(product__in=products).aggregate(
+            count=Count("id"),
+            ids=Sum("id"),
+            latest=Max("updated_at"),
+        )
+        fingerprint.append((related["count"], related["ids"]))
+        timestamps.append(related["latest"])
+    return stats["count"], fingerprint, timestamps
+
+
+def product_list_validator(request, **kwargs):
+    _, fingerprint, timestamps = _product_stats(public_products(request.GET.get("category")))
+    return _validator("product_list", fingerprint, *timestamps)
+
+
+def product_detail_validator(request, id, **kwargs):
+    count, fingerprint, timestamps = _product_stats(Product.objects.filter(id=id))
+    if not count:
+        return None
+    return _validator(f"product_detail:{id}", fingerprint, *timestamps)
+
+
+def category_list_validator(request, **kwargs):
+    stats = Category.objects.filter(is_active=True).aggregate(
+        count=Count("id"),
+        ids=Sum("id"),
+        latest=Max("updated_at"),
+    )
+    return _validator("category_list", (stats["count"], stats["ids"]), stats["latest"])
+
+
+def _last_modified(request, value):
+    # Last-Modified has one-second resolution, so two edits within a second
+    # share it. It is still advertised, but only the ETag earns a 304: a
+    # bare If-Modified-Since gets the full response. (With both headers
+    # Django already ignores If-Modified-Since.)
+    if "HTTP_IF_MODIFIED_SINCE" in request.META and "HTTP_IF_NONE_MATCH" not in request.META:
+        return None
+    return value
+
+
+def catalog_condition(endpoint, compute):
+    # One aggregate query per catalog version yields both the ETag and
+    # Last-Modified; a matching request gets a 304 before DRF runs at all.
+    def validator(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return None
+        if not hasattr(request, "_catalog_validator"):
+            key = catalog_cache_key("validator", endpoint, request.GET, kwargs)
+            cached = cache.get(key)
+            if cached is None:
+                cached = {"value": compute(request, **kwargs)}
+                cache.set(key, cached, timeout=settings.CATALOG_CACHE_TIMEOUT)
+            request._catalog_validator = cached["value"]
+        return request._catalog_validator
+
+    def etag_func(request, *args, **kwargs):
+        value = validator(request, *args, **kwargs)
+        return value[0] if value else None
+
+    def last_modified_func(request, *args, **kwargs):
+        value = validator(request, *args, **kwargs)
+        return _last_modified(request, value[1]) if value else None
+
+    return condition(etag_func=etag_func, last_modified_func=last_modified_func)
+
+
+def request_snapshot(request, load):
+    # Memoized so the view serves the very snapshot its validators came from.
+    if not hasattr(request, "_catalog_snapshot"):
+        request._catalog_snapshot = load()
+    return request._catalog_snapshot
+
+
+def snapshot_condition(load):
+    # For views served from a cached_snapshot(): the ETag and Last-Modified
+    # are stored on the snapshot itself, so a 304 costs no query at all.
+    def etag_func(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return None
+        snapshot, _ = request_snapshot(request, load)
+        return snapshot["etag"]
+
+    def last_modified_func(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return None
+        snapshot, _ = request_snapshot(request, load)
+        return _last_modified(request, snapshot.get("last_modified"))
+
+    return condition(etag_func=etag_func, last_modified_func=last_modified_func)
@@ -0,0 +1,144 @@
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Count, Exists, Max, Min, OuterRef, Q
+
+from .categories import category_q
+from .models import ProductCard, ProductSizeVariant
+
+
+PRICE_BUCKETS = [
+    (Decimal("0"), Decimal("500")),
+    (Decimal("500"), Decimal("1000")),
+    (Decimal("1000"), Decimal("2500")),
+    (Decimal("2500"), Decimal("5000")),
+    (Decimal("5000"), None),
+]
+TRUTHY = ("1", "true", "yes", "on")
+
+
+def _decimal(raw):
+    if raw in (None, ""):
+        return None
+    try:
+        return Decimal(str(raw))
+    except (InvalidOperation, ValueError):
+        return None
+
+
+def parse_product_filters(params):
+    sizes = [
+        label.strip()
+        for label in (params.get("size") or "").split(",")
+        if label.strip()
+    ]
+    return {
+        "min_price": _decimal(params.get("min_price")),
+        "max_price": _decimal(params.get("max_price")),
+        "in_stock": str(params.get("in_stock", "")).lower() in TRUTHY,
+        "on_offer": str(params.get("on_offer", "")).lower() in TRUTHY,
+        "sizes": sizes,
+    }
+
+
+def _size_exists(sizes):
+    return Exists(
+        ProductSizeVariant.objects.filter(
+            product_id=OuterRef("pk"),
+            is_active=True,
+            size_label__in=sizes,
+        )
+    )
+
+
+def filter_q(filters, card_prefix=""):
+    # card_prefix is "card__" when filtering Product rows, "" for ProductCard.
+    q = Q()
+    if filters["min_price"] is not None:
+        q &= Q(**{f"{card_prefix}selling_price__gte": filters["min_price"]})
+    if filters["max_price"] is not None:
+        q &= Q(**{f"{card_prefix}selling_price__lte": filters["max_price"]})
+    if filters["in_stock"]:
+        q &= Q(**{f"{card_prefix}in_stock": True})
+    if filters["on_offer"]:
+        q &= Q(**{f"{card_prefix}has_offer": True})
+    return q
+
+
+def apply_product_filters(queryset, filters, card_prefix=""):
+    queryset = queryset.filter(filter_q(filters, card_prefix))
+    if filters["sizes"]:
+        # OuterRef("pk") is the product id for both Product and ProductCard.
+        queryset = queryset.filter(_size_exists(filters["sizes"]))
+    return queryset
+
+
+def facet_counts(filters, category_value=None):
+    # Three aggregate queries regardless of catalog size. Category and size
+    # counts apply every active filter except their own; stock, offer and
+    # price-bucket counts share one query that ignores those three filters.
+    cards = ProductCard.objects.filter(is_active=True)
+
+    category_rows = apply_product_filters(cards, filters).values(
+        "category_id", "category__name", "category__slug"
+    ).annotate(count=Count("pk")).order_by("category__name")
+
+    in_category = cards.filter(category_q(category_value)) if category_value else cards
+
+    size_filters = dict(filters, sizes=[])
+    size_rows = (
+        ProductSizeVariant.objects.filter(
+            is_active=True,
+            product__in=apply_product_filters(in_category, size_filters).values("pk"),
+        )
+        .values("size_label")
+        .annotate(count=Count("product", distinct=True))
+        .order_by("size_label")
+    )
+
+    flag_base = apply_product_filters(
+        in_category,
+        dict(filters, min_price=None, max_price=None, in_stock=False, on_offer=False),
+    )
+    bucket_aggregates = {}
+    for index, (low, high) in enumerate(PRICE_BUCKETS):
+        bucket_q = Q(selling_price__gte=low)
+        if high is not None:
+            bucket_q &= Q(selling_price__lt=high)
+        bucket_aggregates[f"bucket_{index}"] = Count("pk", filter=bucket_q)
+    flags = flag_base.aggregate(
+        in_stock=Count("pk", filter=Q(in_stock=True)),
+        on_offer=Count("pk", filter=Q(has_offer=True)),
+        min_price=Min("selling_price"),
+        max_price=Max("selling_price"),
+        **bucket_aggregates,
+    )
+
+    return {
+        "categories": [
+            {
+                "id": row["category_id"],
+                "name": row["category__name"],
+                "slug": row["category__slug"],
+                "count": row["count"],
+            }
+            for row in category_rows
+        ],
+        "sizes": [
+            {"size_label": row["size_label"], "count": row["count"]}
+            for row in size_rows
+        ],
+        "in_stock": flags["in_stock"],
+        "on_offer": flags["on_offer"],
+        "price": {
+            "min": flags["min_price"],
+            "max": flags["max_price"],
+            "buckets": [
+                {
+                    "min": low,
+                    "max": high,
+                    "count": flags[f"bucket_{index}"],
+                }
+                for index, (low, high) in enumerate(PRICE_BUCKETS)
+            ],
+        },
+    }
@@ -0,0 +1,123 @@
+from django.conf import settings
+from django.core import signing
+
+from .models import CartItem, Product, ProductSizeVariant
+from .queries import product_queryset
+
+
+GUEST_CART_SALT = "products.guest_cart"
+MAX_GUEST_CART_LINES = 50
+MAX_GUEST_LINE_QUANTITY = 99
+
+
+def read_guest_cart(request):
+    # [(product_id, size_variant_id or None, quantity)] from the signed
+    # cookie; an absent, expired or tampered cookie is an empty cart.
+    raw = request.COOKIES.get(settings.GUEST_CART_COOKIE_NAME)
+    if not raw:
+        return []
+    try:
+        payload = signing.loads(raw, salt=GUEST_CART_SALT, max_age=settings.GUEST_CART_MAX_AGE)
+        return [
+            (int(product_id), int(size_variant_id) if size_variant_id else None, _clamp(int(quantity)))
+            for product_id, size_variant_id, quantity in payload
+        ][:MAX_GUEST_CART_LINES]
+    except (signing.BadSignature, TypeError, ValueError):
+        return []
+
+
+def write_guest_cart(response, lines):
+    if not lines:
+        clear_guest_cart(response)
+        return response
+    # Plain [product, size or 0, quantity] triples keep the cookie small.
+    payload = [[product_id, size_variant_id or 0, quantity] for product_id, size_variant_id, quantity in lines]
+    response.set_cookie(
+        settings.GUEST_CART_COOKIE_NAME,
+        signing.dumps(payload, salt=GUEST_CART_SALT, compress=True),
+        max_age=settings.GUEST_CART_MAX_AGE,
+        secure=settings.SESSION_COOKIE_SECURE,
+        httponly=True,
+        # Same as the session cookie: the frontend is served from another
+        # site, so Lax would keep the cookie off its requests. Guest writes
+        # are CSRF-checked instead (views._ensure_guest_csrf).
+        samesite=settings.SESSION_COOKIE_SAMESITE,
+    )
+    return response
+
+
+def clear_guest_cart(response):
+    response.delete_cookie(
+        settings.GUEST_CART_COOKIE_NAME,
+        samesite=settings.SESSION_COOKIE_SAMESITE,
+    )
+    return response
+
+
+def _clamp(quantity):
+    return max(1, min(quantity, MAX_GUEST_LINE_QUANTITY))
+
+
+def _find(lines, product_id, size_variant_id):
+    for index, (line_product, line_size, _) in enumerate(lines):
+        if line_product == product_id and line_size == size_variant_id:
+            return index
+    return None
+
+
+def add_guest_line(lines, product_id, size_variant_id, quantity):
+    # Returns the new line list, or None when the cart is full.
+    lines = list(lines)
+    index = _find(lines, product_id, size_variant_id)
+    if index is None:
+        if len(lines) >= MAX_GUEST_CART_LINES:
+            return None
+        lines.append((product_id, size_variant_id, _clamp(quantity)))
+    else:
+        lines[index] = (product_id, size_variant_id, _clamp(lines[index][2] + quantity))
+    return lines
+
+
+def set_guest_line(lines, product_id, size_variant_id, quantity):
+    # Returns the new line list, or None when there is no such line.
+    lines = list(lines)
+    index = _find(lines, product_id, size_variant_id)
+    if index is None:
+        return None
+    if quantity <= 0:
+        del lines[index]
+    else:
+        lines[index] = (product_id, size_variant_id, _clamp(quantity))
+    return lines
+
+
+def remove_guest_lines(lines, product_id, size_variant_id=None):
+    # Mirrors cart_remove: without a size, the plain line goes if there is
+    # one, otherwise every line of the product.
+    if size_variant_id is None and _find(lines, product_id, None) is None:
+        return [line for line in lines if line[0] != product_id]
+    return [line for line in lines if (line[0], line[1]) != (product_id, size_variant_id)]
+
+
+def guest_cart_items(lines, fields=None):
+    # Unsaved CartItem rows for CartItemSerializer, built from one product
+    # query (plus its prefetches) and one size query. Lines whose product
+    # or size has gone are left out.
+    products = {
+        product.id: product
+        for product in product_queryset(
+            Product.objects.filter(id__in={line[0] for line in lines}),
+            fields=fields,
+        )
+    }
+    size_ids = {line[1] for line in lines if line[1] is not None}
+    sizes = ProductSizeVariant.objects.in_bulk(size_ids) if size_ids else {}
+
+    items = []
+    for product_id, size_variant_id, quantity in lines:
+        product = products.get(product_id)
+        size_variant = sizes.get(size_variant_id)
+        if product is None or (size_variant_id is not None and size_variant is None):
+            continue
+        items.append(CartItem(product=product, size_variant=size_variant, quantity=quantity))
+    return items
@@ -0,0 +1,25 @@
+from .cache import cached_snapshot
+from .models import Category, ProductCard
+from .offers import build_offers_payload
+from .serializers import CategorySerializer, ProductCardSerializer
+
+
+HOME_SNAPSHOT_KEY = "catalog:home:snapshot"
+HOME_FEATURED_LIMIT = 12
+
+
+def build_home_payload():
+    featured = ProductCard.objects.filter(is_active=True, featured=True)[:HOME_FEATURED_LIMIT]
+    offers = build_offers_payload()
+    return {
+        "data": {
+            "categories": CategorySerializer(Category.objects.filter(is_active=True), many=True).data,
+            "offers": offers["data"],
+            "featured": ProductCardSerializer(featured, many=True).data,
+        },
+        "expires_at": offers["expires_at"],
+    }
+
+
+def home_snapshot():
+    return cached_snapshot(HOME_SNAPSHOT_KEY, build_home_payload)
@@ -0,0 +1,254 @@
+import base64
+import io
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVE_WIDTHS = (160, 320, 640, 1280)
+DERIVATIVE_FORMATS = {
+    # format key -> (Pillow format, file extension, save options)
+    "webp": ("WEBP", "webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "jpg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+PLACEHOLDER_WIDTH = 16
+
+
+def run_concurrently(func, items):
+    # Storage writes are network round trips on Cloudinary, so one request's
+    # files go out on a small bounded pool. Results come back in input order.
+    items = list(items)
+    if len(items) <= 1:
+        return [func(item) for item in items]
+    workers = max(1, min(settings.PRODUCT_IMAGE_UPLOAD_WORKERS, len(items)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(func, items))
+
+
+def _save(write):
+    storage, name, content = write
+    return storage.save(name, content)
+
+
+def save_files(writes):
+    # [(storage, name, content)] -> stored names.
+    return run_concurrently(_save, writes)
+
+
+def derivative_widths(width):
+    # Never upscale: a 900px original yields 160/320/640/900.
+    widths = [bound for bound in DERIVATIVE_WIDTHS if bound < width]
+    if width <= DERIVATIVE_WIDTHS[-1]:
+        widths.append(width)
+    return widths
+
+
+def derivative_name(name, width, extension):
+    folder, filename = posixpath.split(name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(folder, "derived", f"{stem}-{width}w.{extension}")
+
+
+def _resized(image, width):
+    if width >= image.width:
+        return image
+    height = max(1, round(image.height * width / image.width))
+    return image.resize((width, height), Image.Resampling.LANCZOS)
+
+
+def _encode(image, key, **overrides):
+    pil_format, _, options = DERIVATIVE_FORMATS[key]
+    if pil_format == "JPEG" and image.mode != "RGB":
+        # JPEG has no alpha channel, so transparent areas become white.
+        flat = Image.new("RGB", image.size, (255, 255, 255))
+        flat.paste(image, mask=image.getchannel("A") if "A" in image.getbands() else None)
+        image = flat
+    buffer = io.BytesIO()
+    image.save(buffer, pil_format, **{**options, **overrides})
+    return buffer.getvalue()
+
+
+def _load(fileobj):
+    image = Image.open(fileobj)
+    image.load()
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+    return image
+
+
+def placeholder_data_uri(image):
+    small = _resized(image, PLACEHOLDER_WIDTH)
+    payload = base64.b64encode(_encode(small, "webp", quality=30)).decode("ascii")
+    return f"data:image/webp;base64,{payload}"
+
+
+def build_image_variants(field_file):
+    # Writes every derivative next to the original through the field's
+    # storage and returns the manifest stored in `image_variants`.
+    field_file.open("rb")
+    try:
+        image = _load(field_file)
+    finally:
+        field_file.close()
+    return _build_variants(field_file.storage, field_file.name, image)
+
+
+def build_upload_variants(storage, name, upload):
+    # Same, for an upload already stored as `name`; reads the request's copy
+    # instead of fetching the file back from storage.
+    upload.seek(0)
+    return _build_variants(storage, name, _load(upload))
+
+
+def _build_variants(storage, name, image):
+    manifest = {
+        "source": name,
+        "width": image.width,
+        "height": image.height,
+        "placeholder": placeholder_data_uri(image),
+    }
+    entries, writes = [], []
+    for key, (_, extension, _) in DERIVATIVE_FORMATS.items():
+        manifest[key] = []
+        for width in derivative_widths(image.width):
+            entries.append((key, width))
+            writes.append((
+                storage,
+                derivative_name(name, width, extension),
+                ContentFile(_encode(_resized(image, width), key)),
+            ))
+    for (key, width), name in zip(entries, save_files(writes)):
+        manifest[key].append([width, name, storage.url(name)])
+    return manifest
+
+
+def delete_image_variants(manifest, storage):
+    for key in DERIVATIVE_FORMATS:
+        for _, name, *_ in manifest.get(key, []):
+            try:
+                storage.delete(name)
+            except Exception:
+                logger.warning("Could not delete image derivative %s", name, exc_info=True)
+
+
+def public_url(field_file):
+    # "" when there is no file or the backend cannot build a URL for it.
+    try:
+        return field_file.url if field_file else ""
+    except Exception:
+        return ""
+
+
+def stored_image_url(instance):
+    # The persisted `image_url` of a Product or ProductImage. Rows saved
+    # before the column existed fall back to the storage until
+    # backfill_image_urls has run.
+    if instance.image_url:
+        return instance.image_url
+    return public_url(instance.image) or None
+
+
+def _save_image_fields(instance, changes):
+    changes = {**changes, "updated_at": timezone.now()}
+    type(instance).objects.filter(pk=instance.pk).update(**changes)
+    for field, value in changes.items():
+        setattr(instance, field, value)
+
+
+def ensure_image_variants(instance, force=False):
+    # Keeps image_url and image_variants of a Product or ProductImage row in
+    # step with its image. Saves with update() so no post_save (and no
+    # second round of this) fires; returns True when it wrote. Derivatives
+    # of a shared ImageBlob are never deleted here; a row whose image no
+    # longer comes from its blob lets go of it instead.
+    field_file = instance.image
+    current = instance.image_variants or {}
+    changes = {}
+    detached_blob_id = None
+    if instance.image_blob_id and field_file and field_file.name == instance.image_blob.name:
+        # The blob owns the file and its derivatives, even when building
+        # them failed and the manifest is empty.
+        return False
+    if instance.image_blob_id:
+        detached_blob_id = instance.image_blob_id
+        changes["image_blob"] = None
+        changes["image_variants"] = {}
+        current = {}
+    url = public_url(field_file)
+    if url != instance.image_url:
+        changes["image_url"] = url
+    if not field_file:
+        if current:
+            changes["image_variants"] = {}
+    elif force or current.get("source") != field_file.name:
+        try:
+            changes["image_variants"] = build_image_variants(field_file)
+        except Exception as exc:
+            logger.warning(
+                "Could not build image derivatives for %s id=%s: %s",
+                type(instance).__name__,
+                instance.pk,
+                exc,
+            )
+    if not changes:
+        return False
+    if "image_variants" in changes and current and not instance.image_blob_id:
+        delete_image_variants(current, field_file.storage)
+    _save_image_fields(instance, changes)
+    if detached_blob_id:
+        # Imported here because blobs.py imports this module.
+        from .blobs import release_blob
+
+        release_blob(detached_blob_id)
+    return True
+
+
+def refresh_image_urls(instance):
+    # Recomputes the stored URLs of the image and its derivatives without
+    # touching any file; for backfills and storage domain changes.
+    storage = instance.image.storage
+    manifest = instance.image_variants or {}
+    refreshed = dict(manifest)
+    for key in DERIVATIVE_FORMATS:
+        if key in manifest:
+            refreshed[key] = [[width, name, storage.url(name)] for width, name, *_ in manifest[key]]
+    changes = {}
+    url = public_url(instance.image)
+    if url != instance.image_url:
+        changes["image_url"] = url
+    if refreshed != manifest:
+        changes["image_variants"] = refreshed
+    if not changes:
+        return False
+    _save_image_fields(instance, changes)
+    return True
+
+
+def image_srcset(field_file, manifest):
+    # {"width", "height", "placeholder", "webp", "jpeg"} where each format is
+    # a ready-to-use srcset string, or None before derivatives exist. Built
+    # from the URLs stored in the manifest, so no storage call is made.
+    if not field_file or not manifest or manifest.get("source") != field_file.name:
+        return None
+    srcset = {
+        "width": manifest["width"],
+        "height": manifest["height"],
+        "placeholder": manifest["placeholder"],
+    }
+    try:
+        for key in DERIVATIVE_FORMATS:
+            srcset[key] = ", ".join(
+                f"{entry[2] if len(entry) > 2 else field_file.storage.url(entry[1])} {entry[0]}w"
+                for entry in manifest.get(key, [])
+            )
+    except Exception:
+        return None
+    return srcset
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.offers import apply_offer_prices
+
+
+class Command(BaseCommand):
+    help = "Put live offer prices on their products and take ended ones off"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--every",
+            type=int,
+            default=0,
+            help="Keep running, applying prices every N seconds",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            changed = apply_offer_prices()
+            self.stdout.write(f"Updated offer prices on {changed} products")
+            if options["every"] <= 0:
+                return
+            time.sleep(options["every"])
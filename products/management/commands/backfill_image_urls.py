@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from products.cards import refresh_product_cards
+from products.images import refresh_image_urls
+from products.models import Product, ProductImage
+from products.signals import invalidate_catalog
+
+
+class Command(BaseCommand):
+    help = "Store the public URL of every product image and derivative in its row"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options["batch_size"])
+        touched = set()
+        updated = 0
+        for model in (Product, ProductImage):
+            rows = model.objects.exclude(image="").exclude(image__isnull=True).order_by("pk")
+            for row in rows.iterator(chunk_size=batch_size):
+                if refresh_image_urls(row):
+                    updated += 1
+                    touched.add(row.pk if model is Product else row.product_id)
+
+        touched = sorted(touched)
+        for start in range(0, len(touched), batch_size):
+            refresh_product_cards(touched[start:start + batch_size])
+        if updated:
+            invalidate_catalog()
+        self.stdout.write(f"Stored URLs for {updated} images")
@@ -0,0 +1,193 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+
+from products.cards import refresh_product_cards
+from products.models import Category, Product, ProductCard
+from products.queries import product_queryset, public_products
+from products.search import (
+    icontains_ids,
+    rebuild_search_index,
+    search_backend,
+    search_product_ids,
+    search_terms,
+)
+from products.serializers import PRODUCT_CARD_FIELDS, ProductCardSerializer, ProductSerializer
+from products.suggest import build_index
+
+
+WORDS = [
+    "steel", "cotton", "lamp", "cooker", "kettle", "shirt", "garden", "hose",
+    "pressure", "wooden", "chair", "table", "leather", "bag", "runner", "shoe",
+    "ceramic", "mug", "glass", "bottle", "silk", "saree", "kurta", "denim",
+    "jacket", "copper", "pan", "tawa", "mixer", "grinder", "blender", "fan",
+    "cooler", "heater", "pillow", "blanket", "curtain", "mat", "rug", "toy",
+]
+CATEGORY_NAMES = ["Kitchen", "Clothing", "Home", "Garden", "Footwear", "Toys", "Decor", "Appliances"]
+SEARCH_QUERIES = ["lamp", "steel cooker", "cotton shirt", "garden hose", "cera", "footwear runner"]
+SUGGEST_PREFIXES = ["c", "co", "cop", "copper k", "garden", "zz"]
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Benchmark catalog read paths on a generated fixture that is removed afterwards"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--suite", choices=["search", "suggest", "views", "category"], default="search")
+        parser.add_argument("--products", type=int, default=100000)
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=7)
+
+    def handle(self, *args, **options):
+        if options["suite"] == "search" and connection.vendor == "mysql":
+            # FULLTEXT indexes do not see uncommitted rows, so this fixture
+            # is committed and deleted afterwards instead of rolled back.
+            self._drop_fixture()
+            try:
+                self._run(options)
+            finally:
+                self._drop_fixture()
+            self.stdout.write("Fixture deleted")
+            return
+        try:
+            with transaction.atomic():
+                self._run(options)
+                raise _Rollback
+        except _Rollback:
+            self.stdout.write("Fixture rolled back")
+
+    def _run(self, options):
+        started = time.perf_counter()
+        self._build_fixture(options["products"], options["seed"])
+        self.stdout.write(
+            f"Fixture: {options['products']} products in "
+            f"{time.perf_counter() - started:.1f}s"
+        )
+        getattr(self, f"_bench_{options['suite']}")(options)
+
+    def _drop_fixture(self):
+        Product.objects.filter(slug__startswith="bench-").delete()
+        Category.objects.filter(slug__startswith="bench-").delete()
+
+    def _build_fixture(self, count, seed):
+        rng = random.Random(seed)
+        Category.objects.bulk_create(
+            [
+                Category(name=f"Bench {name}", slug=f"bench-{name.lower()}")
+                for name in CATEGORY_NAMES
+            ]
+        )
+        categories = list(Category.objects.filter(slug__startswith="bench-"))
+
+        batch = []
+        for index in range(count):
+            name_words = rng.sample(WORDS, 3)
+            batch.append(
+                Product(
+                    category=rng.choice(categories),
+                    name=" ".join(name_words).title(),
+                    slug=f"bench-{index}",
+                    description=" ".join(rng.choices(WORDS, k=12)),
+                    original_price=rng.randint(100, 5000),
+                    stock=rng.randint(0, 50),
+                )
+            )
+            if len(batch) == 5000:
+                Product.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            Product.objects.bulk_create(batch)
+        rebuild_search_index()
+
+    def _timed(self, fn, repeat):
+        fn()
+        started = time.perf_counter()
+        for _ in range(repeat):
+            result = fn()
+        elapsed = (time.perf_counter() - started) / repeat * 1000
+        return elapsed, result
+
+    def _bench_search(self, options):
+        repeat = options["repeat"]
+        self.stdout.write(f"Search backend: {search_backend()}")
+        self.stdout.write(f"{'query':<20}{'indexed ms':>12}{'icontains ms':>14}{'hits':>6}")
+        for query in SEARCH_QUERIES:
+            indexed_ms, ids = self._timed(lambda: search_product_ids(query, 24), repeat)
+            scan_ms, _ = self._timed(lambda: icontains_ids(search_terms(query), 24, 0), repeat)
+            self.stdout.write(f"{query:<20}{indexed_ms:>12.2f}{scan_ms:>14.2f}{len(ids):>6}")
+
+    def _bench_suggest(self, options):
+        started = time.perf_counter()
+        index = build_index()
+        self.stdout.write(
+            f"Suggestion index: {len(index)} keys built in "
+            f"{time.perf_counter() - started:.2f}s"
+        )
+        self.stdout.write(f"{'prefix':<20}{'ms':>10}{'hits':>6}")
+        for prefix in SUGGEST_PREFIXES:
+            elapsed, rows = self._timed(lambda: index.suggest(prefix, 8), options["repeat"] * 50)
+            self.stdout.write(f"{prefix:<20}{elapsed:>10.4f}{len(rows):>6}")
+
+    def _bench_views(self, options):
+        # One listing page rendered three ways: the full ProductSerializer,
+        # the same serializer restricted to the card fields, and the
+        # precomputed ProductCard read model.
+        page = 24
+        ids = list(Product.objects.values_list("id", flat=True)[:page])
+        refresh_product_cards(ids)
+        card_fields = set(PRODUCT_CARD_FIELDS)
+        renderer = JSONRenderer()
+
+        def full():
+            products = product_queryset(Product.objects.filter(id__in=ids))
+            return renderer.render(ProductSerializer(products, many=True).data)
+
+        def card():
+            products = product_queryset(Product.objects.filter(id__in=ids), fields=card_fields)
+            serializer = ProductSerializer(products, many=True, context={"product_fields": card_fields})
+            return renderer.render(serializer.data)
+
+        def read_model():
+            cards = ProductCard.objects.filter(product_id__in=ids)
+            return renderer.render(ProductCardSerializer(cards, many=True).data)
+
+        self.stdout.write(f"{'view':<20}{'ms':>10}{'bytes':>10}")
+        for label, fn in (("full", full), ("card", card), ("read model", read_model)):
+            elapsed, body = self._timed(fn, options["repeat"])
+            self.stdout.write(f"{label:<20}{elapsed:>10.2f}{len(body):>10}")
+
+    def _bench_category(self, options):
+        # Category-filtered listing page: the old lookup-then-filter against
+        # the per-worker category map (one query, or a subquery on a miss).
+        def before(value):
+            category = Category.objects.filter(
+                Q(slug__iexact=value) | Q(name__iexact=value)
+            ).first()
+            if category is None:
+                return []
+            return list(
+                Product.objects.filter(is_active=True, category=category)
+                .values_list("id", flat=True)[:24]
+            )
+
+        def after(value):
+            return list(public_products(value).values_list("id", flat=True)[:24])
+
+        self.stdout.write(f"{'category':<20}{'before ms':>11}{'q':>3}{'after ms':>11}{'q':>3}")
+        for name in [*CATEGORY_NAMES[:3], "bench-toys", "missing"]:
+            value = name if name.startswith(("bench-", "missing")) else f"Bench {name}"
+            cells = []
+            for fn in (before, after):
+                elapsed, _ = self._timed(lambda: fn(value), options["repeat"])
+                with CaptureQueriesContext(connection) as ctx:
+                    fn(value)
+                cells.append(f"{elapsed:>11.3f}{len(ctx.captured_queries):>3}")
+            self.stdout.write(f"{value:<20}{''.join(cells)}")
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from products.images import ensure_image_variants
+from products.models import Product, ProductImage
+from products.signals import invalidate_catalog
+
+
+class Command(BaseCommand):
+    help = "Generate resized WebP/JPEG derivatives for product images that lack them"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Rebuild derivatives even when they are up to date",
+        )
+
+    def handle(self, *args, **options):
+        built = 0
+        for model in (Product, ProductImage):
+            rows = model.objects.exclude(image="").exclude(image__isnull=True).order_by("pk")
+            for row in rows.iterator():
+                if ensure_image_variants(row, force=options["force"]):
+                    built += 1
+        if built:
+            invalidate_catalog()
+        self.stdout.write(f"Built derivatives for {built} images")
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from products.similarity import DEFAULT_NEIGHBOURS, build_similarity_table
+
+
+class Command(BaseCommand):
+    help = "Rebuild the co-purchase ProductSimilarity table from order items"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top-n", type=int, default=DEFAULT_NEIGHBOURS)
+        parser.add_argument(
+            "--min-support",
+            type=int,
+            default=1,
+            help="Minimum number of shared orders for a pair to be kept",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            total = build_similarity_table(
+                top_n=max(1, options["top_n"]),
+                min_support=max(1, options["min_support"]),
+            )
+        except ImportError as exc:
+            raise CommandError(f"numpy and scipy are required: {exc}") from exc
+        self.stdout.write(f"Stored {total} product similarities")
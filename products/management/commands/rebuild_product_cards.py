@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from products.cards import refresh_product_cards
+from products.models import Product, ProductCard
+
+
+class Command(BaseCommand):
+    help = "Rebuild the ProductCard read model from products, variants and images"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options["batch_size"])
+        product_ids = list(Product.objects.order_by("id").values_list("id", flat=True))
+
+        total = 0
+        for start in range(0, len(product_ids), batch_size):
+            total += refresh_product_cards(product_ids[start:start + batch_size])
+
+        orphaned, _ = ProductCard.objects.exclude(product_id__in=Product.objects.values("id")).delete()
+        self.stdout.write(f"Rebuilt {total} product cards, removed {orphaned} stale cards")
@@ -0,0 +1,104 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Prefetch
+
+from products.pricing import price_summary
+
+
+BATCH_SIZE = 500
+
+
+def _image_url(field_file):
+    try:
+        return field_file.url if field_file else ""
+    except Exception:
+        return ""
+
+
+def build_cards(apps, schema_editor):
+    # Same fields as products.cards.build_product_card, from the historical
+    # models, so listings served from ProductCard are complete right after
+    # migrate without a manual rebuild_product_cards run.
+    Product = apps.get_model("products", "Product")
+    ProductCard = apps.get_model("products", "ProductCard")
+    ProductImage = apps.get_model("products", "ProductImage")
+    ProductSizeVariant = apps.get_model("products", "ProductSizeVariant")
+
+    product_ids = list(Product.objects.order_by("id").values_list("id", flat=True))
+    for start in range(0, len(product_ids), BATCH_SIZE):
+        products = Product.objects.filter(id__in=product_ids[start:start + BATCH_SIZE]).prefetch_related(
+            Prefetch("size_variants", queryset=ProductSizeVariant.objects.filter(is_active=True)),
+            Prefetch("images", queryset=ProductImage.objects.order_by("display_order", "id")),
+        )
+        cards = []
+        for product in products:
+            has_offer, discount, selling_price = price_summary(product.original_price, product.offer_price)
+            variants = list(product.size_variants.all())
+            variant_prices = [
+                price_summary(variant.original_price, variant.offer_price)[2]
+                for variant in variants
+            ]
+            images = list(product.images.all())
+            primary_image_url = _image_url(product.image)
+            for row in images:
+                if primary_image_url:
+                    break
+                primary_image_url = _image_url(row.image)
+            cards.append(ProductCard(
+                product=product,
+                category_id=product.category_id,
+                name=product.name,
+                slug=product.slug,
+                is_active=product.is_active,
+                featured=product.featured,
+                original_price=product.original_price,
+                selling_price=selling_price,
+                has_offer=has_offer,
+                discount_percentage=discount,
+                min_variant_price=min(variant_prices) if variant_prices else None,
+                max_variant_price=max(variant_prices) if variant_prices else None,
+                in_stock=product.stock > 0 or any(variant.stock > 0 for variant in variants),
+                primary_image_url=primary_image_url,
+                image_count=len(images) + (1 if product.image else 0),
+                created_at=product.created_at,
+            ))
+        ProductCard.objects.bulk_create(cards)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0014_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductCard',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='card', serialize=False, to='products.product')),
+                ('name', models.CharField(max_length=200)),
+                ('slug', models.SlugField(max_length=220)),
+                ('is_active', models.BooleanField(default=True)),
+                ('featured', models.BooleanField(default=False)),
+                ('original_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('selling_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('has_offer', models.BooleanField(default=False)),
+                ('discount_percentage', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('min_variant_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('max_variant_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('in_stock', models.BooleanField(default=False)),
+                ('primary_image_url', models.CharField(blank=True, max_length=500)),
+                ('image_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField()),
+                ('refreshed_at', models.DateTimeField(auto_now=True)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='product_cards', to='products.category')),
+            ],
+            options={
+                'ordering': ['-created_at', '-product'],
+                'indexes': [models.Index(fields=['is_active', '-created_at', '-product'], name='products_pc_active_created_idx'), models.Index(fields=['category', 'is_active', '-created_at', '-product'], name='products_pc_cat_active_idx')],
+            },
+        ),
+        migrations.RunPython(build_cards, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+from django.db import migrations
+
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS products_product_fts USING fts5("
+    "name, description, category_name, tokenize = 'unicode61 remove_diacritics 2')",
+    "INSERT INTO products_product_fts(rowid, name, description, category_name) "
+    "SELECT p.id, p.name, p.description, c.name "
+    "FROM products_product p JOIN products_category c ON c.id = p.category_id",
+]
+SQLITE_BACKWARD = ["DROP TABLE IF EXISTS products_product_fts"]
+
+MYSQL_FORWARD = [
+    "ALTER TABLE products_product ADD FULLTEXT INDEX products_product_ft (name, description)",
+    "ALTER TABLE products_category ADD FULLTEXT INDEX products_category_ft (name)",
+]
+MYSQL_BACKWARD = [
+    "ALTER TABLE products_product DROP INDEX products_product_ft",
+    "ALTER TABLE products_category DROP INDEX products_category_ft",
+]
+
+
+def _run(statements_by_vendor):
+    def run(apps, schema_editor):
+        for statement in statements_by_vendor.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0015_productcard"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _run({"sqlite": SQLITE_FORWARD, "mysql": MYSQL_FORWARD}),
+            _run({"sqlite": SQLITE_BACKWARD, "mysql": MYSQL_BACKWARD}),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0016_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productcard',
+            index=models.Index(fields=['is_active', 'category', 'in_stock', 'has_offer', 'selling_price'], name='products_pc_facet_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productcard',
+            index=models.Index(fields=['is_active', 'selling_price'], name='products_pc_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productsizevariant',
+            index=models.Index(fields=['size_label', 'is_active', 'product'], name='products_psv_size_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0018_productsimilarity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='offer',
+            name='ends_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='offer',
+            name='starts_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='offer',
+            index=models.Index(fields=['is_active', 'starts_at', 'ends_at'], name='products_offer_window_idx'),
+        ),
+    ]
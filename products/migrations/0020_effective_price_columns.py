@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:48
+
+import django.db.models.expressions
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0019_offer_schedule'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='discount_rank',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(models.Q(('offer_price__gt', 0), ('offer_price__isnull', False), ('offer_price__lt', models.F('original_price'))), then=models.ExpressionWrapper(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('original_price'), '-', models.F('offer_price')), '*', models.Value(100)), '/', models.F('original_price')), output_field=models.DecimalField(decimal_places=2, max_digits=10))), default=models.Value(Decimal('0')), output_field=models.DecimalField(decimal_places=2, max_digits=10)), output_field=models.DecimalField(decimal_places=2, max_digits=10)),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(models.Q(('offer_price__gt', 0), ('offer_price__isnull', False), ('offer_price__lt', models.F('original_price'))), then=models.F('offer_price')), default=models.F('original_price'), output_field=models.DecimalField(decimal_places=2, max_digits=10)), output_field=models.DecimalField(decimal_places=2, max_digits=10)),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['effective_price'], name='products_pr_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['discount_rank'], name='products_pr_discount_idx'),
+        ),
+    ]
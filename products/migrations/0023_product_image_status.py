@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0022_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productimage',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending upload'), ('ready', 'Ready'), ('failed', 'Upload failed')], default='ready', max_length=10),
+        ),
+    ]
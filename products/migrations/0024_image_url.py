@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0023_product_image_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='image_url',
+            field=models.CharField(blank=True, editable=False, max_length=500),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='image_url',
+            field=models.CharField(blank=True, editable=False, max_length=500),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:05
+
+import django.db.models.functions.comparison
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def merge_duplicate_lines(apps, schema_editor):
+    # Folds repeated "no size" lines into the most recent one so the new
+    # constraint can be created.
+    CartItem = apps.get_model("products", "CartItem")
+    duplicates = (
+        CartItem.objects.filter(size_variant__isnull=True)
+        .values("user_id", "product_id")
+        .annotate(lines=Count("id"), total=Sum("quantity"))
+        .filter(lines__gt=1)
+    )
+    for group in duplicates:
+        lines = CartItem.objects.filter(
+            user_id=group["user_id"],
+            product_id=group["product_id"],
+            size_variant__isnull=True,
+        ).order_by("-updated_at", "-id")
+        keep = lines.first()
+        lines.exclude(id=keep.id).delete()
+        CartItem.objects.filter(id=keep.id).update(quantity=group["total"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0025_image_blob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_lines, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(models.F('user'), models.F('product'), django.db.models.functions.comparison.Coalesce('size_variant', 0), name='products_cart_line_unique'),
+        ),
+    ]
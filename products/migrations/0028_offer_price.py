@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-17 09:12
+
+from django.db import migrations, models
+from django.db.models import Q
+from django.utils import timezone
+
+
+def copy_product_offer_prices(apps, schema_editor):
+    # Until now the offer views wrote the sale price straight onto the
+    # product, so that is the only record of what a live offer charges.
+    # Inactive, ended and future offers are left unpriced: their product's
+    # price is not theirs.
+    Offer = apps.get_model("products", "Offer")
+    now = timezone.now()
+    live = Offer.objects.select_related("product").filter(
+        Q(starts_at__isnull=True) | Q(starts_at__lte=now),
+        Q(ends_at__isnull=True) | Q(ends_at__gt=now),
+        is_active=True,
+        product__offer_price__isnull=False,
+    )
+    for offer in live:
+        offer.offer_price = offer.product.offer_price
+        offer.save(update_fields=["offer_price"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0027_product_image_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='offer',
+            name='offer_price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.RunPython(copy_product_offer_prices, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='offer',
+            index=models.Index(condition=models.Q(('offer_price__isnull', False)), fields=['product'], name='products_offer_priced_idx'),
+        ),
+    ]
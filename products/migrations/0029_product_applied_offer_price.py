@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 10:41
+
+from django.db import migrations, models
+
+
+def mark_applied_offer_prices(apps, schema_editor):
+    # Products whose live offer got its price in 0028 carry that offer's
+    # price, not one the seller set; record it as applied so it comes off
+    # when the offer ends.
+    Offer = apps.get_model("products", "Offer")
+    Product = apps.get_model("products", "Product")
+    product_ids = Offer.objects.filter(offer_price__isnull=False).values_list("product_id", flat=True)
+    Product.objects.filter(id__in=product_ids).update(applied_offer_price=models.F("offer_price"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0028_offer_price'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='applied_offer_price',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='regular_offer_price',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.RunPython(mark_applied_offer_prices, migrations.RunPython.noop),
+    ]
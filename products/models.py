@@ -1,7 +1,10 @@
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.conf import settings
 from django.utils.text import slugify
 
+from .pricing import PRICE_FIELD, discount_expression, selling_price_expression
+
 
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
@@ -14,6 +17,13 @@ class Category(models.Model):
     class Meta:
         verbose_name_plural = "Categories"
         ordering = ["name"]
+        indexes = [
+            models.Index(
+                fields=["name"],
+                name="products_cat_active_name_idx",
+                condition=models.Q(is_active=True),
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -30,6 +40,22 @@ class Category(models.Model):
         return self.name
 
 
+class ImageBlob(models.Model):
+    # One stored image (and its derivatives) per distinct content. Every
+    # Product/ProductImage row uploaded with the same bytes points here;
+    # ref_count is the number of such rows, see products.blobs.
+    sha256 = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=255)
+    url = models.CharField(max_length=500, blank=True)
+    variants = models.JSONField(default=dict, blank=True)
+    size = models.PositiveIntegerField(default=0)
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+
 class Product(models.Model):
     seller = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -54,6 +80,35 @@ class Product(models.Model):
         null=True,
         blank=True
     )
+    # Set by offers.apply_offer_prices while a scheduled offer's price is in
+    # offer_price: the price it put there, and the seller's own offer price
+    # to restore when the offer ends.
+    applied_offer_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        editable=False
+    )
+    regular_offer_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        editable=False
+    )
+    # Stored by the database from the two prices above (see products.pricing)
+    # so price and discount sorts can use an index.
+    effective_price = models.GeneratedField(
+        expression=selling_price_expression(),
+        output_field=PRICE_FIELD,
+        db_persist=True,
+    )
+    discount_rank = models.GeneratedField(
+        expression=discount_expression(),
+        output_field=PRICE_FIELD,
+        db_persist=True,
+    )
 
     stock = models.PositiveIntegerField(default=0)
     is_active = models.BooleanField(default=True)
@@ -64,6 +119,18 @@ class Product(models.Model):
         null=True,
         blank=True
     )
+    # Public URL of `image` and its resized copies, written by
+    # products.images whenever the image is saved.
+    image_url = models.CharField(max_length=500, blank=True, editable=False)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    image_blob = models.ForeignKey(
+        ImageBlob,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name="+"
+    )
 
     description = models.TextField(blank=True)
 
@@ -71,7 +138,47 @@ class Product(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        ordering = ["-created_at"]
+        ordering = ["-created_at", "-id"]
+        indexes = [
+            models.Index(
+                fields=["is_active", "-created_at", "-id"],
+                name="products_pr_active_created_idx",
+            ),
+            models.Index(
+                fields=["category", "is_active", "-created_at", "-id"],
+                name="products_pr_cat_active_idx",
+            ),
+            # SQLite compiles is_active=True to a bare column test, which can
+            # only use an index whose WHERE clause is the same test. MySQL has
+            # no partial indexes and skips these; it seeks the ones above.
+            models.Index(
+                fields=["-created_at", "-id"],
+                name="products_pr_live_created_idx",
+                condition=models.Q(is_active=True),
+            ),
+            models.Index(
+                fields=["category", "-created_at", "-id"],
+                name="products_pr_live_cat_idx",
+                condition=models.Q(is_active=True),
+            ),
+            models.Index(
+                fields=["-created_at", "-id"],
+                name="products_pr_hidden_created_idx",
+                condition=models.Q(is_active=False),
+            ),
+            # ?ordering=price|-price|discount walk these in order and stop at
+            # LIMIT; the pk is implicitly part of each entry for tie-breaks.
+            # No is_active prefix: the boolean filter compiles to a bare
+            # column test, which can't seek an index anyway.
+            models.Index(
+                fields=["effective_price"],
+                name="products_pr_price_idx",
+            ),
+            models.Index(
+                fields=["discount_rank"],
+                name="products_pr_discount_idx",
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -89,14 +196,33 @@ class Product(models.Model):
 
 
 class ProductImage(models.Model):
+    STATUS_CHOICES = [
+        ("pending", "Pending upload"),
+        ("ready", "Ready"),
+        ("failed", "Upload failed"),
+    ]
+
     product = models.ForeignKey(
         Product,
         on_delete=models.CASCADE,
         related_name="images"
     )
     image = models.ImageField(upload_to="products/extra/")
+    image_url = models.CharField(max_length=500, blank=True, editable=False)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    image_blob = models.ForeignKey(
+        ImageBlob,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name="+"
+    )
+    # Deferred uploads create the row first and fill `image` once stored.
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="ready")
     display_order = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["display_order", "id"]
@@ -128,6 +254,12 @@ class ProductSizeVariant(models.Model):
     class Meta:
         ordering = ["display_order", "id"]
         unique_together = ("product", "size_label")
+        indexes = [
+            models.Index(
+                fields=["size_label", "is_active", "product"],
+                name="products_psv_size_idx",
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         self.size_label = (self.size_label or "").strip()
@@ -137,6 +269,122 @@ class ProductSizeVariant(models.Model):
         return f"{self.product.name} - {self.size_label}"
 
 
+class ProductCard(models.Model):
+    # Read model for listing grids, rebuilt from Product, its size variants,
+    # images and offers by products.cards.refresh_product_cards().
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="card"
+    )
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name="product_cards"
+    )
+    name = models.CharField(max_length=200)
+    slug = models.SlugField(max_length=220)
+    is_active = models.BooleanField(default=True)
+    featured = models.BooleanField(default=False)
+
+    original_price = models.DecimalField(max_digits=10, decimal_places=2)
+    selling_price = models.DecimalField(max_digits=10, decimal_places=2)
+    has_offer = models.BooleanField(default=False)
+    discount_percentage = models.PositiveSmallIntegerField(null=True, blank=True)
+    min_variant_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True
+    )
+    max_variant_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True
+    )
+    in_stock = models.BooleanField(default=False)
+    primary_image_url = models.CharField(max_length=500, blank=True)
+    image_count = models.PositiveIntegerField(default=0)
+
+    created_at = models.DateTimeField()
+    refreshed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-created_at", "-product"]
+        indexes = [
+            models.Index(
+                fields=["is_active", "-created_at", "-product"],
+                name="products_pc_active_created_idx",
+            ),
+            models.Index(
+                fields=["category", "is_active", "-created_at", "-product"],
+                name="products_pc_cat_active_idx",
+            ),
+            # Partial twins of the two above for SQLite; see Product.Meta.
+            models.Index(
+                fields=["-created_at", "-product"],
+                name="products_pc_live_created_idx",
+                condition=models.Q(is_active=True),
+            ),
+            models.Index(
+                fields=["category", "-created_at", "-product"],
+                name="products_pc_live_cat_idx",
+                condition=models.Q(is_active=True),
+            ),
+            models.Index(
+                fields=["-created_at", "-product"],
+                name="products_pc_featured_idx",
+                condition=models.Q(is_active=True, featured=True),
+            ),
+            # Facet aggregates and price filters are answered from these
+            # without touching the table rows.
+            models.Index(
+                fields=["is_active", "category", "in_stock", "has_offer", "selling_price"],
+                name="products_pc_facet_idx",
+            ),
+            models.Index(
+                fields=["is_active", "selling_price"],
+                name="products_pc_price_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class ProductSimilarity(models.Model):
+    # Top-N co-purchase neighbours per product, written in bulk by the
+    # build_product_similarity management command.
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name="similarities"
+    )
+    related = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name="+"
+    )
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    built_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["product", "rank"]
+        unique_together = ("product", "related")
+        indexes = [
+            models.Index(
+                fields=["product", "rank"],
+                name="products_ps_product_rank_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.related_id} ({self.score:.3f})"
+
+
 class Offer(models.Model):
     product = models.ForeignKey(
         Product,
@@ -149,12 +397,39 @@ class Offer(models.Model):
 
     display_order = models.PositiveIntegerField(default=0)
     is_active = models.BooleanField(default=True)
+    # Optional schedule; an empty bound means "open-ended" on that side.
+    starts_at = models.DateTimeField(null=True, blank=True)
+    ends_at = models.DateTimeField(null=True, blank=True)
+    # The sale price; copied onto Product.offer_price only while the offer is
+    # live (see offers.apply_offer_prices).
+    offer_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True
+    )
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["display_order", "-created_at"]
+        indexes = [
+            models.Index(
+                fields=["is_active", "starts_at", "ends_at"],
+                name="products_offer_window_idx",
+            ),
+            models.Index(
+                fields=["display_order", "-created_at"],
+                name="products_offer_live_order_idx",
+                condition=models.Q(is_active=True),
+            ),
+            models.Index(
+                fields=["product"],
+                name="products_offer_priced_idx",
+                condition=models.Q(offer_price__isnull=False),
+            ),
+        ]
 
     def __str__(self):
         return f"{self.title} ({self.product.name})"
@@ -181,6 +456,22 @@ class CartItem(models.Model):
     class Meta:
         unique_together = ("user", "product", "size_variant")
         ordering = ["-updated_at"]
+        indexes = [
+            models.Index(
+                fields=["user", "-updated_at"],
+                name="products_cart_user_recent_idx",
+            ),
+        ]
+        constraints = [
+            # NULLs never collide in unique_together, so the "no size" line
+            # is keyed on size 0 to keep it one row per product.
+            models.UniqueConstraint(
+                "user",
+                "product",
+                Coalesce("size_variant", 0),
+                name="products_cart_line_unique",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user} - {self.product} ({self.quantity})"
@@ -198,6 +489,12 @@ class WishlistItem(models.Model):
     class Meta:
         unique_together = ("user", "product")
         ordering = ["-added_at"]
+        indexes = [
+            models.Index(
+                fields=["user", "-added_at"],
+                name="products_wish_user_recent_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user} - {self.product}"
@@ -263,6 +560,12 @@ class Order(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(
+                fields=["user", "-created_at"],
+                name="products_order_user_recent_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"Order #{self.id} ({self.user})"
@@ -315,6 +618,16 @@ class Enquiry(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(
+                fields=["user", "-created_at"],
+                name="products_enq_user_recent_idx",
+            ),
+            models.Index(
+                fields=["-created_at"],
+                name="products_enq_recent_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.subject}"
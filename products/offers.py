@@ -0,0 +1,181 @@
+import logging
+
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+from rest_framework import serializers
+
+from .cache import CATALOG_STATS_KEYS, cached_snapshot, incr_counter
+from .models import Offer, Product
+
+
+logger = logging.getLogger(__name__)
+
+OFFERS_SNAPSHOT_KEY = "catalog:offers:snapshot"
+OFFER_ROW_FIELDS = (
+    "id",
+    "title",
+    "subtitle",
+    "display_order",
+    "is_active",
+    "starts_at",
+    "ends_at",
+    "updated_at",
+    "product_id",
+    "product__name",
+    "product__original_price",
+    "offer_price",
+    "product__offer_price",
+    "product__image",
+    "product__image_url",
+    "product__updated_at",
+)
+
+
+def _in_window(now):
+    return Q(starts_at__isnull=True) | Q(starts_at__lte=now), Q(ends_at__isnull=True) | Q(ends_at__gt=now)
+
+
+def scheduled_offers():
+    return Offer.objects.filter(is_active=True, product__is_active=True)
+
+
+def public_offers(now=None):
+    now = now or timezone.now()
+    return scheduled_offers().filter(*_in_window(now)).order_by("display_order", "-created_at")
+
+
+def offer_boundaries(now=None):
+    # (last_ended, next_boundary): the latest offer end at or before `now`,
+    # and the earliest moment after `now` at which an offer starts or ends,
+    # i.e. when the public offer list next changes without any write.
+    now = now or timezone.now()
+    bounds = scheduled_offers().aggregate(
+        last_end=Max("ends_at", filter=Q(ends_at__lte=now)),
+        next_start=Min("starts_at", filter=Q(starts_at__gt=now)),
+        next_end=Min("ends_at", filter=Q(ends_at__gt=now)),
+    )
+    upcoming = [value for value in (bounds["next_start"], bounds["next_end"]) if value is not None]
+    return bounds["last_end"], min(upcoming) if upcoming else None
+
+
+def _price_changes(product, price):
+    # Column changes that put `price` (the live offer price, or None) on
+    # `product`. The seller's own offer price is set aside while an offer is
+    # applied and restored afterwards; a price the seller edited meanwhile
+    # is left as it is.
+    applied = product.applied_offer_price
+    if price is None:
+        if applied is None:
+            return {}
+        changes = {"applied_offer_price": None, "regular_offer_price": None}
+        if product.offer_price == applied:
+            changes["offer_price"] = product.regular_offer_price
+        return changes
+    if applied is None:
+        return {"regular_offer_price": product.offer_price, "offer_price": price, "applied_offer_price": price}
+    if product.offer_price == applied and price != applied:
+        return {"offer_price": price, "applied_offer_price": price}
+    return {}
+
+
+def apply_offer_prices(product_ids=None, now=None):
+    # Product.offer_price is what every price reader uses (the generated
+    # effective_price column, cards, carts and checkout). While a priced
+    # offer is live it holds the lowest live offer price; once none is, the
+    # seller's own price comes back. Pass product_ids after an offer write;
+    # without them every product with a live or applied offer is checked.
+    # Returns the number of products changed; each is saved so the usual
+    # catalog signals run.
+    now = now or timezone.now()
+    live_offers = Offer.objects.filter(is_active=True, offer_price__isnull=False).filter(*_in_window(now))
+    products = Product.objects.all()
+    if product_ids is not None:
+        live_offers = live_offers.filter(product_id__in=product_ids)
+        products = products.filter(id__in=product_ids)
+    live = dict(
+        live_offers.order_by()
+        .values("product_id")
+        .annotate(price=Min("offer_price"))
+        .values_list("product_id", "price")
+    )
+    changed = 0
+    for product in products.filter(Q(id__in=list(live)) | Q(applied_offer_price__isnull=False)):
+        changes = _price_changes(product, live.get(product.id))
+        if not changes:
+            continue
+        for field, value in changes.items():
+            setattr(product, field, value)
+        product.save(update_fields=[*changes, "updated_at"])
+        changed += 1
+    return changed
+
+
+def _image_url(row):
+    # Same answer as OfferSerializer.get_image (the product's main image),
+    # read from the stored column so no storage call is made per offer.
+    name = row["product__image"]
+    if not name:
+        return None
+    if row["product__image_url"]:
+        return row["product__image_url"]
+    return Product._meta.get_field("image").storage.url(name)
+
+
+_datetime_field = serializers.DateTimeField()
+
+
+def _datetime(value):
+    return None if value is None else _datetime_field.to_representation(value)
+
+
+def offer_row(row):
+    # Output matches OfferSerializer field for field.
+    offer_price = row["offer_price"] if row["offer_price"] is not None else row["product__offer_price"]
+    return {
+        "id": row["id"],
+        "title": row["title"],
+        "subtitle": row["subtitle"],
+        "product_id": row["product_id"],
+        "product_name": row["product__name"],
+        "original_price": str(row["product__original_price"]),
+        "offer_price": None if offer_price is None else str(offer_price),
+        "image": _image_url(row),
+        "display_order": row["display_order"],
+        "is_active": row["is_active"],
+        "starts_at": _datetime(row["starts_at"]),
+        "ends_at": _datetime(row["ends_at"]),
+    }
+
+
+def build_offers_payload():
+    # One query for every offer, product price and image URL. A row that
+    # fails to build is dropped and counted, the rest of the carousel stays.
+    now = timezone.now()
+    payload = []
+    timestamps = []
+    for row in public_offers(now).values(*OFFER_ROW_FIELDS):
+        try:
+            payload.append(offer_row(row))
+        except Exception:
+            incr_counter(CATALOG_STATS_KEYS["offer_row_failures"])
+            logger.exception("Skipping broken offer id=%s in public offer_list", row["id"])
+            continue
+        timestamps.extend(
+            value
+            for value in (row["updated_at"], row["product__updated_at"], row["starts_at"])
+            if value
+        )
+    # An offer starting or ending changes the list too, so it counts towards
+    # Last-Modified just like an edit.
+    last_ended, boundary = offer_boundaries(now)
+    if last_ended:
+        timestamps.append(last_ended)
+    return {
+        "data": payload,
+        "last_modified": max(timestamps) if timestamps else None,
+        "expires_at": boundary.timestamp() if boundary else None,
+    }
+
+
+def offers_snapshot():
+    return cached_snapshot(OFFERS_SNAPSHOT_KEY, build_offers_payload)
@@ -0,0 +1,67 @@
+import base64
+import binascii
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def wants_pagination(request):
+    params = request.query_params
+    return "cursor" in params or "limit" in params
+
+
+def parse_limit(raw, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    try:
+        limit = int(raw)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(limit, maximum))
+
+
+def encode_cursor(value, pk):
+    value = value.isoformat() if hasattr(value, "isoformat") else str(value)
+    raw = json.dumps([value, pk], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token, parse=parse_datetime):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        raw_value, pk = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        value = parse(raw_value)
+        pk = int(pk)
+    except (ArithmeticError, binascii.Error, UnicodeError, TypeError, ValueError) as exc:
+        raise InvalidCursor("Invalid cursor") from exc
+    if value is None:
+        raise InvalidCursor("Invalid cursor")
+    return value, pk
+
+
+def paginate_by_key(queryset, cursor, limit, key="created_at", descending=True, parse=parse_datetime):
+    # Keyset pagination on (key, pk): rows inserted while a client is
+    # scrolling land before the cursor and never shift later pages. `key` may
+    # be a model field or an annotation, and must not be NULL.
+    sign, op = ("-", "lt") if descending else ("", "gt")
+    queryset = queryset.order_by(f"{sign}{key}", f"{sign}pk")
+    if cursor:
+        value, pk = decode_cursor(cursor, parse)
+        queryset = queryset.filter(
+            Q(**{f"{key}__{op}": value}) | Q(**{key: value, f"pk__{op}": pk})
+        )
+
+    rows = list(queryset[: limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, key), last.pk)
+    return rows, next_cursor
@@ -0,0 +1,86 @@
+from decimal import Decimal
+
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, Q, Value, When
+from django.db.models.functions import Coalesce
+from django.utils.dateparse import parse_datetime
+
+
+PRICE_FIELD = DecimalField(max_digits=10, decimal_places=2)
+
+# ?ordering= value -> (sort key, descending, cursor value parser). The sort
+# keys are Product columns and are annotated onto cards by with_card_sort_keys().
+# Price sorts use the product's own price; size variant prices are not
+# considered, so the sort stays on an indexed column.
+PRODUCT_ORDERINGS = {
+    "newest": ("created_at", True, parse_datetime),
+    "price": ("effective_price", False, Decimal),
+    "-price": ("effective_price", True, Decimal),
+    "discount": ("discount_rank", True, Decimal),
+}
+
+
+def price_summary(original_price, offer_price):
+    # (has_offer, discount_percentage, selling_price). The one rule for an
+    # effective price: an offer counts only when 0 < offer < original.
+    has_offer = False
+    discount = None
+    try:
+        if offer_price is not None:
+            offer = float(offer_price)
+            original = float(original_price)
+            has_offer = 0 < offer < original
+            if has_offer:
+                discount = round(((original - offer) / original) * 100)
+    except (TypeError, ValueError, ZeroDivisionError):
+        has_offer = False
+    selling_price = offer_price if has_offer else original_price
+    return has_offer, discount, selling_price
+
+
+def effective_price(original_price, offer_price):
+    return price_summary(original_price, offer_price)[2]
+
+
+def _offer_applies(prefix=""):
+    return Q(
+        **{
+            f"{prefix}offer_price__isnull": False,
+            f"{prefix}offer_price__gt": 0,
+            f"{prefix}offer_price__lt": F(f"{prefix}original_price"),
+        }
+    )
+
+
+def selling_price_expression(prefix=""):
+    # The price_summary() rule as SQL, for Product or ProductSizeVariant rows.
+    return Case(
+        When(_offer_applies(prefix), then=F(f"{prefix}offer_price")),
+        default=F(f"{prefix}original_price"),
+        output_field=PRICE_FIELD,
+    )
+
+
+def discount_expression(prefix=""):
+    # Unrounded discount percentage, 0 when no offer applies, so it can be a
+    # keyset sort key.
+    return Case(
+        When(
+            _offer_applies(prefix),
+            then=ExpressionWrapper(
+                (F(f"{prefix}original_price") - F(f"{prefix}offer_price")) * Value(100)
+                / F(f"{prefix}original_price"),
+                output_field=PRICE_FIELD,
+            ),
+        ),
+        default=Value(Decimal("0")),
+        output_field=PRICE_FIELD,
+    )
+
+
+def with_card_sort_keys(cards):
+    # ProductCard already stores the effective price; sorting on the plain
+    # column keeps products_pc_price_idx usable.
+    return cards.annotate(
+        effective_price=F("selling_price"),
+        discount_rank=Coalesce("discount_percentage", 0),
+    )
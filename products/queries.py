@@ -0,0 +1,97 @@
+from django.db.models import Prefetch
+
+from .categories import category_q
+from .models import OrderItem, Product, ProductCard, ProductImage, ProductSizeVariant
+
+
+def _wants(fields, *names):
+    return fields is None or any(name in fields for name in names)
+
+
+def product_prefetches(prefix="", active_variants=True, fields=None):
+    # The serializer reads images/size_variants through `.all()`, so these
+    # prefetches must already be in display order for the cache to be used.
+    # `fields` is the sparse fieldset in use; relations it omits are skipped.
+    prefetches = []
+    if _wants(fields, "images", "extra_images"):
+        prefetches.append(
+            Prefetch(
+                f"{prefix}images",
+                queryset=ProductImage.objects.order_by("display_order", "id"),
+            )
+        )
+    if _wants(fields, "size_variants"):
+        variants = ProductSizeVariant.objects.order_by("display_order", "id")
+        if active_variants:
+            variants = variants.filter(is_active=True)
+        prefetches.append(Prefetch(f"{prefix}size_variants", queryset=variants))
+    return prefetches
+
+
+def _category_relation(prefix, fields):
+    return [f"{prefix}category"] if _wants(fields, "category_name") else []
+
+
+def product_queryset(queryset=None, active_variants=True, fields=None):
+    if queryset is None:
+        queryset = Product.objects.all()
+    return queryset.select_related(*_category_relation("", fields)).prefetch_related(
+        *product_prefetches(active_variants=active_variants, fields=fields)
+    )
+
+
+def with_product_relations(queryset, field="product", fields=None):
+    # For CartItem/WishlistItem style querysets that embed a ProductSerializer.
+    return queryset.select_related(
+        field, *_category_relation(f"{field}__", fields)
+    ).prefetch_related(
+        *product_prefetches(prefix=f"{field}__", fields=fields)
+    )
+
+
+COMPACT_ITEM_PRODUCT_COLUMNS = (
+    "name",
+    "slug",
+    "original_price",
+    "offer_price",
+    "stock",
+    "image",
+    "image_url",
+)
+
+
+def compact_item_queryset(queryset, *columns):
+    # Cart/wishlist rows for the compact item serializers: the product is
+    # joined in the same query, and only the columns those serializers read
+    # are loaded (description and image manifests stay behind).
+    return queryset.select_related("product").only(
+        "product",
+        *columns,
+        *(f"product__{column}" for column in COMPACT_ITEM_PRODUCT_COLUMNS),
+    )
+
+
+def order_queryset(queryset, fields=None):
+    return queryset.prefetch_related(
+        Prefetch(
+            "items",
+            queryset=OrderItem.objects.select_related(
+                "product", *_category_relation("product__", fields)
+            ),
+        ),
+        *product_prefetches(prefix="items__product__", fields=fields),
+    )
+
+
+def public_products(category_value=None):
+    products = Product.objects.filter(is_active=True)
+    if category_value:
+        products = products.filter(category_q(category_value))
+    return products
+
+
+def public_product_cards(category_value=None):
+    cards = ProductCard.objects.filter(is_active=True)
+    if category_value:
+        cards = cards.filter(category_q(category_value))
+    return cards
@@ -0,0 +1,147 @@
+import re
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from .models import Product
+
+
+FTS_TABLE = "products_product_fts"
+# bm25 column weights for (name, description, category_name).
+FTS_WEIGHTS = (10.0, 1.0, 4.0)
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def search_backend():
+    if connection.vendor == "sqlite":
+        return "fts5"
+    if connection.vendor == "mysql":
+        return "fulltext"
+    return "icontains"
+
+
+def search_terms(query):
+    return _TOKEN_RE.findall((query or "").lower())[:10]
+
+
+def _fts5_match(terms):
+    # Quote each token so user input can never be parsed as FTS5 syntax; the
+    # trailing * turns the last token into a prefix match for partial words.
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def _fts5_ids(terms, limit, offset):
+    sql = (
+        f"SELECT f.rowid FROM {FTS_TABLE} f "
+        "JOIN products_product p ON p.id = f.rowid "
+        f"WHERE {FTS_TABLE} MATCH %s AND p.is_active = 1 "
+        f"ORDER BY bm25({FTS_TABLE}, %s, %s, %s), p.id DESC "
+        "LIMIT %s OFFSET %s"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [_fts5_match(terms), *FTS_WEIGHTS, limit, offset])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _fulltext_ids(terms, limit, offset):
+    query = " ".join(terms)
+    sql = (
+        "SELECT p.id, "
+        "MATCH(p.name, p.description) AGAINST (%s IN NATURAL LANGUAGE MODE) "
+        "+ 0.5 * MATCH(c.name) AGAINST (%s IN NATURAL LANGUAGE MODE) AS score "
+        "FROM products_product p "
+        "JOIN products_category c ON c.id = p.category_id "
+        "WHERE p.is_active = 1 AND ("
+        "MATCH(p.name, p.description) AGAINST (%s IN NATURAL LANGUAGE MODE) "
+        "OR MATCH(c.name) AGAINST (%s IN NATURAL LANGUAGE MODE)) "
+        "ORDER BY score DESC, p.id DESC "
+        "LIMIT %s OFFSET %s"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [query, query, query, query, limit, offset])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def icontains_ids(terms, limit, offset):
+    # Unindexed scan, kept as the fallback for other databases and as the
+    # baseline in `benchmark_catalog --suite search`.
+    products = Product.objects.filter(is_active=True)
+    name_hit = Q()
+    for term in terms:
+        term_filter = (
+            Q(name__icontains=term)
+            | Q(description__icontains=term)
+            | Q(category__name__icontains=term)
+        )
+        products = products.filter(term_filter)
+        name_hit &= Q(name__icontains=term)
+    products = products.annotate(
+        name_rank=Case(When(name_hit, then=Value(0)), default=Value(1), output_field=IntegerField())
+    ).order_by("name_rank", "-id")
+    return list(products.values_list("id", flat=True)[offset:offset + limit])
+
+
+def search_product_ids(query, limit, offset=0):
+    terms = search_terms(query)
+    if not terms:
+        return []
+    backend = search_backend()
+    if backend == "fts5":
+        return _fts5_ids(terms, limit, offset)
+    if backend == "fulltext":
+        return _fulltext_ids(terms, limit, offset)
+    return icontains_ids(terms, limit, offset)
+
+
+def index_products(product_ids):
+    # MySQL maintains FULLTEXT indexes itself; only the FTS5 table needs help.
+    if search_backend() != "fts5" or not product_ids:
+        return
+    product_ids = list(product_ids)
+    placeholders = ", ".join(["%s"] * len(product_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", product_ids)
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}(rowid, name, description, category_name) "
+            "SELECT p.id, p.name, p.description, c.name "
+            "FROM products_product p "
+            "JOIN products_category c ON c.id = p.category_id "
+            f"WHERE p.id IN ({placeholders})",
+            product_ids,
+        )
+
+
+def remove_products(product_ids):
+    if search_backend() != "fts5" or not product_ids:
+        return
+    product_ids = list(product_ids)
+    placeholders = ", ".join(["%s"] * len(product_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", product_ids)
+
+
+def reindex_category(category_id):
+    if search_backend() != "fts5":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {FTS_TABLE} SET category_name = "
+            "(SELECT name FROM products_category WHERE id = %s) "
+            "WHERE rowid IN (SELECT id FROM products_product WHERE category_id = %s)",
+            [category_id, category_id],
+        )
+
+
+def rebuild_search_index():
+    if search_backend() != "fts5":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}(rowid, name, description, category_name) "
+            "SELECT p.id, p.name, p.description, c.name "
+            "FROM products_product p "
+            "JOIN products_category c ON c.id = p.category_id"
+        )
@@ -2,7 +2,10 @@ import json
 
 from rest_framework import serializers
 from django.db import DatabaseError
-from .models import Product, ProductImage, Category, Offer, ProductSizeVariant, CartItem, WishlistItem, CustomerProfile, Order, OrderItem, Enquiry
+from .models import Product, ProductCard, ProductImage, Category, Offer, ProductSizeVariant, CartItem, WishlistItem, CustomerProfile, Order, OrderItem, Enquiry
+from .cards import refresh_product_cards
+from .images import image_srcset, stored_image_url
+from .pricing import price_summary
 from django.utils import timezone
 from datetime import timedelta
 
@@ -34,45 +37,63 @@ class ProductSizeVariantSerializer(serializers.ModelSerializer):
         ]
 
     def get_has_offer(self, obj):
-        if obj.offer_price is None:
-            return False
-        try:
-            offer = float(obj.offer_price)
-            original = float(obj.original_price)
-            if offer <= 0:
-                return False
-            return offer < original
-        except (TypeError, ValueError):
-            return False
+        return price_summary(obj.original_price, obj.offer_price)[0]
 
     def get_discount_percentage(self, obj):
-        if not self.get_has_offer(obj):
-            return None
-        try:
-            original = float(obj.original_price)
-            offer = float(obj.offer_price)
-            if original <= 0:
-                return None
-            return round(((original - offer) / original) * 100)
-        except (TypeError, ValueError, ZeroDivisionError):
-            return None
+        return price_summary(obj.original_price, obj.offer_price)[1]
 
     def get_selling_price(self, obj):
-        if self.get_has_offer(obj):
-            return obj.offer_price
-        return obj.original_price
+        return price_summary(obj.original_price, obj.offer_price)[2]
+
+
+class StoredImageField(serializers.ImageField):
+    # Writes like ImageField, but reads the persisted image_url column instead
+    # of asking the storage backend to build a URL for every row.
+    def to_representation(self, value):
+        if not value:
+            return None
+        return stored_image_url(value.instance)
 
 
 class ProductImageSerializer(serializers.ModelSerializer):
+    image = StoredImageField()
+    image_srcset = serializers.SerializerMethodField()
+
     class Meta:
         model = ProductImage
-        fields = ["id", "image", "display_order"]
+        fields = ["id", "image", "image_srcset", "display_order", "status"]
+
+    def get_image_srcset(self, obj):
+        return image_srcset(obj.image, obj.image_variants)
+
+
+PRODUCT_CARD_FIELDS = [
+    "id",
+    "name",
+    "slug",
+    "original_price",
+    "selling_price",
+    "has_offer",
+    "discount_percentage",
+    "image",
+]
 
-    def to_representation(self, instance):
-        data = super().to_representation(instance)
-        if instance.image:
-            data["image"] = instance.image.url
-        return data
+
+def requested_product_fields(params):
+    # ?fields=a,b,c wins over ?view=card; anything else means the full shape.
+    raw = params.get("fields")
+    if raw:
+        fields = {name.strip() for name in raw.split(",") if name.strip()}
+        return fields or None
+    if params.get("view") == "card":
+        return set(PRODUCT_CARD_FIELDS)
+    return None
+
+
+def wants_compact_items(params):
+    # Cart and wishlist rows are compact unless ?view=full, or a nested
+    # product shape is asked for with ?view=card / ?fields=.
+    return params.get("view") not in ("full", "card") and not params.get("fields")
 
 
 class ProductSerializer(serializers.ModelSerializer):
@@ -81,7 +102,8 @@ class ProductSerializer(serializers.ModelSerializer):
         read_only=True
     )
     seller = serializers.PrimaryKeyRelatedField(read_only=True)
-    image = serializers.ImageField(required=False, allow_null=True)
+    image = StoredImageField(required=False, allow_null=True)
+    image_srcset = serializers.SerializerMethodField()
     has_offer = serializers.SerializerMethodField()
     discount_percentage = serializers.SerializerMethodField()
     selling_price = serializers.SerializerMethodField()
@@ -104,6 +126,7 @@ class ProductSerializer(serializers.ModelSerializer):
             "is_active",
             "featured",
             "image",
+            "image_srcset",
             "description",
             "created_at",
             "updated_at",
@@ -117,6 +140,20 @@ class ProductSerializer(serializers.ModelSerializer):
             "size_variants_payload",
         ]
 
+    def get_fields(self):
+        # Dropping unrequested fields here means their SerializerMethodFields
+        # (and the queries behind them) never run. Works when nested too,
+        # because self.context is the root serializer's context.
+        fields = super().get_fields()
+        requested = self.context.get("product_fields")
+        if requested:
+            fields = {
+                name: field
+                for name, field in fields.items()
+                if name in requested or field.write_only
+            }
+        return fields
+
     def _normalize_variants_payload(self):
         raw = self.initial_data.get("size_variants_payload", None)
         if raw is None:
@@ -234,22 +271,23 @@ class ProductSerializer(serializers.ModelSerializer):
 
     def _replace_size_variants(self, product, variants):
         product.size_variants.all().delete()
-        if not variants:
-            return
-        ProductSizeVariant.objects.bulk_create(
-            [
-                ProductSizeVariant(
-                    product=product,
-                    size_label=row["size_label"],
-                    original_price=row["original_price"],
-                    offer_price=row["offer_price"],
-                    stock=row["stock"],
-                    display_order=row["display_order"],
-                    is_active=row["is_active"],
-                )
-                for row in variants
-            ]
-        )
+        if variants:
+            ProductSizeVariant.objects.bulk_create(
+                [
+                    ProductSizeVariant(
+                        product=product,
+                        size_label=row["size_label"],
+                        original_price=row["original_price"],
+                        offer_price=row["offer_price"],
+                        stock=row["stock"],
+                        display_order=row["display_order"],
+                        is_active=row["is_active"],
+                    )
+                    for row in variants
+                ]
+            )
+        # bulk_create skips post_save, so the card would miss the new variants.
+        refresh_product_cards([product.id])
 
     def create(self, validated_data):
         variants = validated_data.pop("_size_variants_payload", None)
@@ -277,26 +315,21 @@ class ProductSerializer(serializers.ModelSerializer):
                 )
         return product
 
-    def to_representation(self, instance):
-        data = super().to_representation(instance)
-        if instance.image:
-            data["image"] = instance.image.url
-        return data
+    def get_image_srcset(self, obj):
+        return image_srcset(obj.image, obj.image_variants)
 
     def get_images(self, obj):
         items = []
         if obj.image:
-            try:
-                items.append(obj.image.url)
-            except Exception:
-                pass
+            url = stored_image_url(obj)
+            if url:
+                items.append(url)
         try:
-            extra = obj.images.all().order_by("display_order", "id")
+            extra = obj.images.all()
             for row in extra:
-                try:
-                    items.append(row.image.url)
-                except Exception:
-                    continue
+                url = stored_image_url(row)
+                if url:
+                    items.append(url)
         except Exception:
             return items
 
@@ -311,7 +344,7 @@ class ProductSerializer(serializers.ModelSerializer):
 
     def get_extra_images(self, obj):
         try:
-            rows = obj.images.all().order_by("display_order", "id")
+            rows = obj.images.all()
             return ProductImageSerializer(rows, many=True).data
         except Exception:
             return []
@@ -320,7 +353,7 @@ class ProductSerializer(serializers.ModelSerializer):
         # Backward-compatible: if migration is not yet applied in an environment,
         # do not break product listing; just return no variants.
         try:
-            rows = obj.size_variants.all().order_by("display_order", "id")
+            rows = obj.size_variants.all()
             return ProductSizeVariantSerializer(rows, many=True).data
         except DatabaseError:
             return []
@@ -329,34 +362,38 @@ class ProductSerializer(serializers.ModelSerializer):
 
 
     def get_has_offer(self, obj):
-        if obj.offer_price is None:
-            return False
-        try:
-            offer = float(obj.offer_price)
-            original = float(obj.original_price)
-            if offer <= 0:
-                return False
-            return offer < original
-        except (TypeError, ValueError):
-            return False
+        return price_summary(obj.original_price, obj.offer_price)[0]
 
     def get_discount_percentage(self, obj):
-        if not self.get_has_offer(obj):
-            return None
-        try:
-            original = float(obj.original_price)
-            offer = float(obj.offer_price)
-            if original <= 0:
-                return None
-            return round(((original - offer) / original) * 100)
-        except (TypeError, ValueError, ZeroDivisionError):
-            return None
+        return price_summary(obj.original_price, obj.offer_price)[1]
 
     def get_selling_price(self, obj):
-        if self.get_has_offer(obj):
-            return obj.offer_price
-        return obj.original_price
+        return price_summary(obj.original_price, obj.offer_price)[2]
         
+class ProductCardSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source="product_id", read_only=True)
+    image = serializers.CharField(source="primary_image_url", read_only=True)
+
+    class Meta:
+        model = ProductCard
+        fields = [
+            "id",
+            "category",
+            "name",
+            "slug",
+            "featured",
+            "original_price",
+            "selling_price",
+            "has_offer",
+            "discount_percentage",
+            "min_variant_price",
+            "max_variant_price",
+            "in_stock",
+            "image",
+            "image_count",
+        ]
+
+
 class OfferSerializer(serializers.ModelSerializer):
     product_id = serializers.IntegerField(source="product.id", read_only=True)
     product_name = serializers.CharField(source="product.name", read_only=True)
@@ -377,14 +414,14 @@ class OfferSerializer(serializers.ModelSerializer):
             "image",
             "display_order",
             "is_active",
+            "starts_at",
+            "ends_at",
         ]
     def get_image(self, obj):
         if obj.product and obj.product.image:
-            try:
-                return obj.product.image.url
-            except Exception:
-                # Do not fail the whole offers API because of one broken image reference.
-                return None
+            # stored_image_url() never raises, so one broken image reference
+            # cannot fail the whole offers API.
+            return stored_image_url(obj.product)
         return None
 
     def get_original_price(self, obj):
@@ -395,7 +432,9 @@ class OfferSerializer(serializers.ModelSerializer):
 
     def get_offer_price(self, obj):
         try:
-            value = obj.product.offer_price
+            # Offers created before the price was stored on them fall back to
+            # the product's.
+            value = obj.offer_price if obj.offer_price is not None else obj.product.offer_price
             return None if value is None else str(value)
         except Exception:
             return None
@@ -445,14 +484,8 @@ class CartItemSerializer(serializers.ModelSerializer):
         return self._selected_original_price(obj)
 
     def get_has_offer(self, obj):
-        selected_offer = self._selected_offer_price(obj)
-        selected_original = self._selected_original_price(obj)
-        if selected_offer is None:
-            return False
-        try:
-            return float(selected_offer) < float(selected_original)
-        except (TypeError, ValueError):
-            return False
+        # The pricing rule checkout and cart_summary charge by.
+        return price_summary(self._selected_original_price(obj), self._selected_offer_price(obj))[0]
 
     def get_discounted_price(self, obj):
         if not self.get_has_offer(obj):
@@ -460,6 +493,41 @@ class CartItemSerializer(serializers.ModelSerializer):
         return self._selected_offer_price(obj)
 
 
+class CompactCartItemSerializer(CartItemSerializer):
+    # The product fields a cart line shows instead of the nested product;
+    # everything comes from the line's row joins, with no extra queries.
+    product = None
+    product_id = serializers.IntegerField(read_only=True)
+    name = serializers.CharField(source="product.name", read_only=True)
+    slug = serializers.CharField(source="product.slug", read_only=True)
+    image = serializers.SerializerMethodField()
+    stock = serializers.SerializerMethodField()
+
+    class Meta(CartItemSerializer.Meta):
+        fields = [
+            "id",
+            "product_id",
+            "name",
+            "slug",
+            "image",
+            "size_variant_id",
+            "size_label",
+            "quantity",
+            "price",
+            "has_offer",
+            "discounted_price",
+            "stock",
+        ]
+
+    def get_image(self, obj):
+        return stored_image_url(obj.product)
+
+    def get_stock(self, obj):
+        if obj.size_variant_id:
+            return obj.size_variant.stock
+        return obj.product.stock
+
+
 class WishlistItemSerializer(serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
 
@@ -468,6 +536,45 @@ class WishlistItemSerializer(serializers.ModelSerializer):
         fields = ["id", "product", "added_at"]
 
 
+class CompactWishlistItemSerializer(serializers.ModelSerializer):
+    product_id = serializers.IntegerField(read_only=True)
+    name = serializers.CharField(source="product.name", read_only=True)
+    slug = serializers.CharField(source="product.slug", read_only=True)
+    image = serializers.SerializerMethodField()
+    price = serializers.SerializerMethodField()
+    has_offer = serializers.SerializerMethodField()
+    discounted_price = serializers.SerializerMethodField()
+    stock = serializers.IntegerField(source="product.stock", read_only=True)
+
+    class Meta:
+        model = WishlistItem
+        fields = [
+            "id",
+            "product_id",
+            "name",
+            "slug",
+            "image",
+            "price",
+            "has_offer",
+            "discounted_price",
+            "stock",
+            "added_at",
+        ]
+
+    def get_image(self, obj):
+        return stored_image_url(obj.product)
+
+    def get_price(self, obj):
+        return obj.product.original_price
+
+    def get_has_offer(self, obj):
+        return price_summary(obj.product.original_price, obj.product.offer_price)[0]
+
+    def get_discounted_price(self, obj):
+        has_offer, _, selling_price = price_summary(obj.product.original_price, obj.product.offer_price)
+        return selling_price if has_offer else None
+
+
 class CustomerProfileSerializer(serializers.ModelSerializer):
     email = serializers.EmailField(source="user.email", read_only=True)
 
@@ -0,0 +1,173 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+
+from .blobs import release_blob
+from .cache import bump_catalog_version
+from .cards import refresh_product_cards
+from .carts import invalidate_cart_summary
+from .categories import reset_category_map
+from .images import ensure_image_variants
+from .models import CartItem, Category, Offer, Product, ProductImage, ProductSizeVariant
+from .search import index_products, reindex_category, remove_products
+from .suggest import apply_change
+
+
+CATALOG_MODELS = (Product, ProductSizeVariant, ProductImage, Offer, Category)
+CARD_SOURCE_MODELS = (ProductSizeVariant, ProductImage, Offer)
+SEARCH_FIELDS = {"name", "description", "category", "category_id"}
+
+
+def invalidate_catalog():
+    # Bump now so this write is visible immediately, and again after commit so
+    # a response cached from pre-commit data in the meantime is discarded too.
+    bump_catalog_version()
+    transaction.on_commit(bump_catalog_version)
+
+
+def invalidate_catalog_cache(sender, **kwargs):
+    invalidate_catalog()
+
+
+def _image_name(instance):
+    # Read from the instance dict so a deferred image is not fetched; None
+    # when the field was not loaded.
+    value = instance.__dict__.get("image")
+    return getattr(value, "name", value)
+
+
+def remember_image_on_init(sender, instance, **kwargs):
+    instance._loaded_image_name = _image_name(instance)
+
+
+def build_image_variants_on_save(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    # Only a new or replaced image is processed in the request; rows that
+    # predate derivatives are left to the build_image_variants command.
+    if raw:
+        return
+    if update_fields is not None and "image" not in update_fields:
+        return
+    name = _image_name(instance)
+    if not created and name == instance._loaded_image_name:
+        return
+    instance._loaded_image_name = name
+    ensure_image_variants(instance)
+
+
+def release_image_blob_on_delete(sender, instance, **kwargs):
+    release_blob(instance.image_blob_id)
+
+
+def invalidate_cart_summary_on_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    invalidate_cart_summary(instance.user_id)
+
+
+def refresh_card_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    product_id = instance.pk if sender is Product else instance.product_id
+    refresh_product_cards([product_id])
+
+
+def refresh_card_on_delete(sender, instance, **kwargs):
+    # Deferred: during a cascading product delete the parent row still exists
+    # when its children's post_delete fires.
+    product_id = instance.product_id
+    transaction.on_commit(lambda: refresh_product_cards([product_id]))
+
+
+def sync_search_on_product_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not SEARCH_FIELDS.intersection(update_fields):
+        return
+    index_products([instance.pk])
+
+
+def sync_search_on_product_delete(sender, instance, **kwargs):
+    remove_products([instance.pk])
+
+
+def sync_search_on_category_save(sender, instance, created=False, raw=False, **kwargs):
+    if not raw and not created:
+        reindex_category(instance.pk)
+
+
+def reset_category_map_on_change(sender, **kwargs):
+    reset_category_map()
+    transaction.on_commit(reset_category_map)
+
+
+def update_suggestions_on_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        apply_change("product" if sender is Product else "category", instance)
+
+
+def update_suggestions_on_delete(sender, instance, **kwargs):
+    apply_change("product" if sender is Product else "category", instance, deleted=True)
+
+
+# Connected first so the catalog invalidation below already sees the srcset.
+for _model in (Product, ProductImage):
+    post_init.connect(
+        remember_image_on_init,
+        sender=_model,
+        dispatch_uid=f"image-name-init-{_model.__name__}",
+    )
+    post_save.connect(
+        build_image_variants_on_save,
+        sender=_model,
+        dispatch_uid=f"image-variants-save-{_model.__name__}",
+    )
+    post_delete.connect(
+        release_image_blob_on_delete,
+        sender=_model,
+        dispatch_uid=f"image-blob-delete-{_model.__name__}",
+    )
+
+for _model in CATALOG_MODELS:
+    post_save.connect(
+        invalidate_catalog_cache,
+        sender=_model,
+        dispatch_uid=f"catalog-cache-save-{_model.__name__}",
+    )
+    post_delete.connect(
+        invalidate_catalog_cache,
+        sender=_model,
+        dispatch_uid=f"catalog-cache-delete-{_model.__name__}",
+    )
+
+post_save.connect(refresh_card_on_save, sender=Product, dispatch_uid="product-card-save-Product")
+for _model in CARD_SOURCE_MODELS:
+    post_save.connect(
+        refresh_card_on_save,
+        sender=_model,
+        dispatch_uid=f"product-card-save-{_model.__name__}",
+    )
+    post_delete.connect(
+        refresh_card_on_delete,
+        sender=_model,
+        dispatch_uid=f"product-card-delete-{_model.__name__}",
+    )
+
+post_save.connect(sync_search_on_product_save, sender=Product, dispatch_uid="product-search-save")
+post_delete.connect(sync_search_on_product_delete, sender=Product, dispatch_uid="product-search-delete")
+post_save.connect(sync_search_on_category_save, sender=Category, dispatch_uid="category-search-save")
+post_save.connect(reset_category_map_on_change, sender=Category, dispatch_uid="category-map-save")
+post_delete.connect(reset_category_map_on_change, sender=Category, dispatch_uid="category-map-delete")
+
+for _model in (Product, Category):
+    post_save.connect(
+        update_suggestions_on_save,
+        sender=_model,
+        dispatch_uid=f"suggest-save-{_model.__name__}",
+    )
+    post_delete.connect(
+        update_suggestions_on_delete,
+        sender=_model,
+        dispatch_uid=f"suggest-delete-{_model.__name__}",
+    )
+
+post_save.connect(invalidate_cart_summary_on_change, sender=CartItem, dispatch_uid="cart-summary-save")
+post_delete.connect(invalidate_cart_summary_on_change, sender=CartItem, dispatch_uid="cart-summary-delete")
@@ -0,0 +1,98 @@
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+
+from .models import OrderItem, ProductSimilarity
+from .queries import public_products
+from .signals import invalidate_catalog
+
+
+DEFAULT_NEIGHBOURS = 20
+RELATED_LIMIT = 12
+
+
+def _purchase_pairs():
+    # One (order, product) pair per product bought in a non-cancelled order.
+    return list(
+        OrderItem.objects.exclude(order__status="cancelled")
+        .values_list("order_id", "product_id")
+        .distinct()
+    )
+
+
+def compute_neighbours(pairs, top_n=DEFAULT_NEIGHBOURS, min_support=1):
+    # Cosine similarity between the product columns of a binary
+    # order x product matrix: co-purchases / sqrt(orders(a) * orders(b)).
+    # Returns {product_id: [(related_id, score), ...]} ranked best first.
+    import numpy as np
+    from scipy import sparse
+
+    if not pairs:
+        return {}
+    pairs = np.asarray(pairs, dtype=np.int64)
+    _, order_index = np.unique(pairs[:, 0], return_inverse=True)
+    product_ids, product_index = np.unique(pairs[:, 1], return_inverse=True)
+    purchases = sparse.csr_matrix(
+        (np.ones(len(pairs), dtype=np.float64), (order_index, product_index)),
+        shape=(order_index.max() + 1, len(product_ids)),
+    )
+    purchases.data[:] = 1.0
+
+    co = (purchases.T @ purchases).tocsr()
+    co.setdiag(0)
+    if min_support > 1:
+        co.data[co.data < min_support] = 0
+    co.eliminate_zeros()
+
+    norms = 1.0 / np.sqrt(np.asarray(purchases.sum(axis=0)).ravel())
+    scores = (sparse.diags(norms) @ co @ sparse.diags(norms)).tocsr()
+
+    neighbours = {}
+    for row in range(scores.shape[0]):
+        start, end = scores.indptr[row], scores.indptr[row + 1]
+        if start == end:
+            continue
+        columns = scores.indices[start:end]
+        values = scores.data[start:end]
+        # Highest score first; ties go to the lower product id.
+        order = np.lexsort((product_ids[columns], -values))[:top_n]
+        neighbours[int(product_ids[row])] = [
+            (int(product_ids[columns[i]]), float(values[i])) for i in order
+        ]
+    return neighbours
+
+
+def store_neighbours(neighbours, batch_size=1000):
+    rows = [
+        ProductSimilarity(product_id=product_id, related_id=related_id, rank=rank, score=score)
+        for product_id, ranked in neighbours.items()
+        for rank, (related_id, score) in enumerate(ranked, start=1)
+    ]
+    with transaction.atomic():
+        ProductSimilarity.objects.all().delete()
+        ProductSimilarity.objects.bulk_create(rows, batch_size=batch_size)
+        invalidate_catalog()
+    return len(rows)
+
+
+def build_similarity_table(top_n=DEFAULT_NEIGHBOURS, min_support=1):
+    return store_neighbours(compute_neighbours(_purchase_pairs(), top_n, min_support))
+
+
+def related_product_ids(product_id, category_value=None, limit=RELATED_LIMIT):
+    ids = list(
+        ProductSimilarity.objects.filter(product_id=product_id, related__is_active=True)
+        .order_by("rank")
+        .values_list("related_id", flat=True)[:limit]
+    )
+    if len(ids) < limit and category_value:
+        # Top up with the category's bestsellers for products that have no
+        # (or too few) co-purchases yet.
+        ids.extend(
+            public_products(category_value)
+            .exclude(id__in=[product_id, *ids])
+            .annotate(sold=Coalesce(Sum("orderitem__quantity"), 0))
+            .order_by("-sold", "-created_at", "-id")
+            .values_list("id", flat=True)[:limit - len(ids)]
+        )
+    return ids
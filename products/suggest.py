@@ -0,0 +1,235 @@
+import heapq
+import threading
+import time
+from bisect import bisect_left, bisect_right
+
+from django.conf import settings
+from django.db.models import Count, Q, Sum
+
+from .cache import catalog_version
+from .models import Category, Product
+
+
+BLOCK_SIZE = 64
+MAX_SUGGESTIONS = 20
+# Each summary keeps a few spare candidates because one item can own several
+# keys (one per word) inside the same prefix range.
+SUMMARY_SIZE = MAX_SUGGESTIONS * 2
+
+
+def normalize(text):
+    return " ".join((text or "").lower().split())
+
+
+def _keys_for(label):
+    # Every word start is a key, so "kett" finds "Copper Kettle" as well.
+    words = normalize(label).split(" ")
+    return {" ".join(words[index:]) for index in range(len(words)) if words[index]}
+
+
+class SuggestionIndex:
+    # Sorted array of (key, item) pairs searched with bisect. A prefix maps to
+    # one contiguous range; the most popular entries of that range come from a
+    # segment tree of per-block top-N summaries, so a lookup touches at most
+    # two partial blocks plus O(log n) summaries however wide the range is.
+    # keys/refs/scores are parallel lists edited in place by signal-driven
+    # updates, so reads and writes all hold the index's own lock.
+
+    def __init__(self, rows, max_entries, version=None):
+        self.version = version
+        self.built_at = time.monotonic()
+        self.max_entries = max_entries
+        self.items = {}
+        entries = []
+        for kind, pk, label, slug, popularity in rows:
+            item = (kind, pk)
+            self.items[item] = (label, slug, popularity or 0)
+            entries.extend((key, item) for key in _keys_for(label))
+
+        if len(entries) > max_entries:
+            entries = heapq.nlargest(max_entries, entries, key=lambda entry: self.items[entry[1]][2])
+            kept = {item for _, item in entries}
+            self.items = {item: value for item, value in self.items.items() if item in kept}
+
+        entries.sort()
+        self.keys = [key for key, _ in entries]
+        self.refs = [item for _, item in entries]
+        self.scores = [self.items[item][2] for item in self.refs]
+        self._tree = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _top_positions(self, positions):
+        return heapq.nlargest(SUMMARY_SIZE, positions, key=self.scores.__getitem__)
+
+    def _build_tree(self):
+        blocks = (len(self.keys) + BLOCK_SIZE - 1) // BLOCK_SIZE
+        size = 1
+        while size < max(blocks, 1):
+            size *= 2
+        tree = [[] for _ in range(2 * size)]
+        for block in range(blocks):
+            start = block * BLOCK_SIZE
+            tree[size + block] = self._top_positions(range(start, min(start + BLOCK_SIZE, len(self.keys))))
+        for node in range(size - 1, 0, -1):
+            tree[node] = self._top_positions(tree[2 * node] + tree[2 * node + 1])
+        self._tree = (size, tree)
+
+    def _candidates(self, lo, hi):
+        if self._tree is None:
+            self._build_tree()
+        size, tree = self._tree
+        first_block = -(-lo // BLOCK_SIZE)
+        last_block = hi // BLOCK_SIZE
+        if first_block >= last_block:
+            return list(range(lo, hi))
+
+        candidates = list(range(lo, first_block * BLOCK_SIZE))
+        candidates.extend(range(last_block * BLOCK_SIZE, hi))
+        left = first_block + size
+        right = last_block + size
+        while left < right:
+            if left & 1:
+                candidates.extend(tree[left])
+                left += 1
+            if right & 1:
+                right -= 1
+                candidates.extend(tree[right])
+            left //= 2
+            right //= 2
+        return candidates
+
+    def suggest(self, prefix, limit=10):
+        prefix = normalize(prefix)
+        limit = max(1, min(limit, MAX_SUGGESTIONS))
+        if not prefix:
+            return []
+        with self._lock:
+            return self._suggest(prefix, limit)
+
+    def _suggest(self, prefix, limit):
+        lo = bisect_left(self.keys, prefix)
+        hi = bisect_right(self.keys, prefix + "\uffff")
+        ranked = []
+        seen = set()
+        for position in self._top_positions(self._candidates(lo, hi)):
+            item = self.refs[position]
+            if item in seen:
+                continue
+            seen.add(item)
+            ranked.append(item)
+            if len(ranked) == limit:
+                break
+
+        return [
+            {
+                "type": kind,
+                "id": pk,
+                "label": self.items[(kind, pk)][0],
+                "slug": self.items[(kind, pk)][1],
+            }
+            for kind, pk in ranked
+        ]
+
+    def remove(self, item):
+        with self._lock:
+            self._remove(item)
+
+    def _remove(self, item):
+        previous = self.items.pop(item, None)
+        if previous is None:
+            return
+        for key in _keys_for(previous[0]):
+            lo = bisect_left(self.keys, key)
+            hi = bisect_right(self.keys, key)
+            for position in range(lo, hi):
+                if self.refs[position] == item:
+                    del self.keys[position]
+                    del self.refs[position]
+                    del self.scores[position]
+                    break
+        self._tree = None
+
+    def upsert(self, item, label, slug, popularity=None):
+        with self._lock:
+            self._upsert(item, label, slug, popularity)
+
+    def _upsert(self, item, label, slug, popularity):
+        previous = self.items.get(item)
+        if popularity is None:
+            popularity = previous[2] if previous else 0
+        self._remove(item)
+        if len(self.keys) >= self.max_entries:
+            return
+        self.items[item] = (label, slug, popularity)
+        for key in _keys_for(label):
+            position = bisect_right(self.keys, key)
+            self.keys.insert(position, key)
+            self.refs.insert(position, item)
+            self.scores.insert(position, popularity)
+        self._tree = None
+
+
+def _load_rows():
+    products = (
+        Product.objects.filter(is_active=True)
+        .annotate(popularity=Sum("orderitem__quantity"))
+        .values_list("id", "name", "slug", "popularity")
+    )
+    categories = (
+        Category.objects.filter(is_active=True)
+        .annotate(popularity=Count("products", filter=Q(products__is_active=True)))
+        .values_list("id", "name", "slug", "popularity")
+    )
+    rows = [("product", pk, name, slug, popularity) for pk, name, slug, popularity in products]
+    rows.extend(("category", pk, name, slug, popularity) for pk, name, slug, popularity in categories)
+    return rows
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def build_index():
+    return SuggestionIndex(
+        _load_rows(),
+        max_entries=settings.SUGGEST_MAX_ENTRIES,
+        version=catalog_version(),
+    )
+
+
+def get_index():
+    # Writes handled by this worker are applied incrementally via signals;
+    # writes from other workers show up as a new catalog version and trigger
+    # a full rebuild, at most once per SUGGEST_REBUILD_INTERVAL seconds.
+    global _index
+    index = _index
+    if index is not None:
+        stale = index.version != catalog_version()
+        if not stale or time.monotonic() - index.built_at < settings.SUGGEST_REBUILD_INTERVAL:
+            return index
+    with _index_lock:
+        if _index is index:
+            _index = build_index()
+        return _index
+
+
+def apply_change(kind, instance, deleted=False):
+    index = _index
+    if index is None:
+        return
+    item = (kind, instance.pk)
+    with _index_lock:
+        if deleted or not instance.is_active:
+            index.remove(item)
+        else:
+            index.upsert(item, instance.name, instance.slug)
+        index.version = catalog_version()
+
+
+def reset_index():
+    global _index
+    with _index_lock:
+        _index = None
@@ -1,8 +1,65 @@
+import io
+import re
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.core import signing
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
 from rest_framework.test import APIClient
 
-from .models import Category, Offer, Product
+from . import blobs as blobs_module
+from .blobs import blob_name, content_hash
+from .cache import snapshot_lock_key
+from .carts import add_to_cart
+from .categories import resolve_category_id
+from .guest_cart import GUEST_CART_SALT, MAX_GUEST_LINE_QUANTITY
+from .home import HOME_SNAPSHOT_KEY
+from .models import (
+    CartItem,
+    Category,
+    CustomerProfile,
+    Enquiry,
+    ImageBlob,
+    Offer,
+    Order,
+    OrderItem,
+    Product,
+    ProductCard,
+    ProductImage,
+    ProductSimilarity,
+    ProductSizeVariant,
+    WishlistItem,
+)
+from .offers import OFFERS_SNAPSHOT_KEY, offer_row
+from .pricing import effective_price
+from .queries import public_products
+from .serializers import PRODUCT_CARD_FIELDS, OfferSerializer
+from .suggest import SuggestionIndex
+from .suggest import get_index as get_suggestion_index
+from .suggest import reset_index as reset_suggestion_index
+
+
+def without_image_files(test):
+    # Fixture rows name image files that were never written; skip the
+    # derivative build for them, as if the original could not be read.
+    patcher = mock.patch("products.images.build_image_variants", return_value={})
+    patcher.start()
+    test.addCleanup(patcher.stop)
 
 
 class OfferApiTests(TestCase):
@@ -131,3 +188,2035 @@ class OfferApiTests(TestCase):
         self.assertEqual(response.status_code, 400)
         self.assertEqual(response.data.get("detail"), "Offer price is required")
         self.assertEqual(Offer.objects.count(), 0)
+
+
+class ProductListPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.category = Category.objects.create(name="Kitchen")
+        self.other_category = Category.objects.create(name="Garden")
+        self.products = [
+            Product.objects.create(
+                category=self.category,
+                name=f"Pan {index}",
+                original_price=100 + index,
+                stock=5,
+            )
+            for index in range(5)
+        ]
+        Product.objects.create(
+            category=self.other_category,
+            name="Hose",
+            original_price=250,
+            stock=2,
+        )
+
+    def _collect_pages(self, url):
+        ids = []
+        pages = 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(item["id"] for item in response.data["results"])
+            pages += 1
+            cursor = response.data["next"]
+            url = None
+            if cursor:
+                url = f"/api/products/?category=kitchen&limit=2&cursor={cursor}"
+        return ids, pages
+
+    def test_cursor_pages_cover_category_newest_first(self):
+        ids, pages = self._collect_pages("/api/products/?category=kitchen&limit=2")
+
+        self.assertEqual(pages, 3)
+        self.assertEqual(ids, [product.id for product in reversed(self.products)])
+
+    def test_inserts_during_scroll_do_not_shift_pages(self):
+        first = self.client.get("/api/products/?category=kitchen&limit=2")
+        seen = [item["id"] for item in first.data["results"]]
+
+        Product.objects.create(
+            category=self.category,
+            name="Pan late",
+            original_price=99,
+            stock=1,
+        )
+
+        second = self.client.get(
+            f"/api/products/?category=kitchen&limit=2&cursor={first.data['next']}"
+        )
+        self.assertEqual(
+            [item["id"] for item in second.data["results"]],
+            [self.products[2].id, self.products[1].id],
+        )
+        self.assertFalse(set(seen) & {item["id"] for item in second.data["results"]})
+
+    def test_invalid_cursor_returns_400(self):
+        response = self.client.get("/api/products/?cursor=not-a-cursor")
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_without_pagination_params_returns_plain_list(self):
+        response = self.client.get("/api/products/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 6)
+
+
+class ProductSerializationQueryCountTests(TestCase):
+    def setUp(self):
+        without_image_files(self)
+        self.client = APIClient()
+        self.customer = User.objects.create_user(
+            username="buyer@example.com",
+            password="pass12345",
+        )
+        self.category = Category.objects.create(name="Toys")
+        self.products = []
+
+    def _add_products(self, count):
+        for _ in range(count):
+            index = len(self.products)
+            product = Product.objects.create(
+                category=self.category,
+                name=f"Toy {index}",
+                original_price=200,
+                offer_price=150,
+                stock=4,
+                image=f"products/toy-{index}.jpg",
+            )
+            for order in range(2):
+                ProductImage.objects.create(
+                    product=product,
+                    image=f"products/extra/toy-{index}-{order}.jpg",
+                    display_order=order,
+                )
+                ProductSizeVariant.objects.create(
+                    product=product,
+                    size_label=f"S{order}",
+                    original_price=200,
+                    offer_price=150,
+                    stock=3,
+                    display_order=order,
+                )
+            CartItem.objects.create(user=self.customer, product=product)
+            WishlistItem.objects.create(user=self.customer, product=product)
+            order = Order.objects.create(
+                user=self.customer,
+                full_name="Buyer",
+                phone="999",
+                address="Street",
+                city="City",
+                state="State",
+                pincode="600001",
+                total_amount=150,
+            )
+            OrderItem.objects.create(order=order, product=product, price=150)
+            self.products.append(product)
+
+    def _count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def _assert_constant(self, url):
+        self._add_products(1)
+        small = self._count_queries(url)
+        self._add_products(4)
+        large = self._count_queries(url)
+        self.assertEqual(small, large)
+
+    def test_product_list_is_constant(self):
+        self._assert_constant("/api/products/")
+
+    def test_related_products_is_constant(self):
+        extra = Product.objects.create(
+            category=self.category,
+            name="Anchor",
+            original_price=50,
+        )
+        resolve_category_id("toys")
+        self._assert_constant(f"/api/products/related/toys/{extra.id}/")
+
+    def test_customer_lists_are_constant(self):
+        self.client.force_login(self.customer)
+        for url in ("/api/cart/", "/api/wishlist/", "/api/orders/"):
+            with self.subTest(url=url):
+                self.products = []
+                CartItem.objects.all().delete()
+                WishlistItem.objects.all().delete()
+                Order.objects.all().delete()
+                self._assert_constant(url)
+
+    def test_images_and_variants_keep_display_order(self):
+        self._add_products(1)
+        product = self.products[0]
+        ProductSizeVariant.objects.create(
+            product=product,
+            size_label="XS",
+            original_price=200,
+            stock=1,
+            display_order=0,
+            is_active=False,
+        )
+
+        response = self.client.get("/api/products/")
+
+        row = response.data[0]
+        self.assertEqual([v["size_label"] for v in row["size_variants"]], ["S0", "S1"])
+        self.assertEqual(len(row["images"]), 3)
+        self.assertTrue(row["images"][1].endswith("toy-0-0.jpg"))
+
+    def test_sparse_fields_skip_unrequested_relations(self):
+        self._add_products(2)
+        full = self._count_queries("/api/products/")
+        cache.clear()
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/api/products/?fields=id,name,selling_price")
+
+        self.assertEqual(set(response.data[0]), {"id", "name", "selling_price"})
+        self.assertEqual(str(response.data[0]["selling_price"]), "150.00")
+        self.assertLess(len(ctx.captured_queries), full)
+        # The ETag aggregates count images too; no image rows are loaded.
+        self.assertFalse(
+            any(q["sql"].startswith('SELECT "products_productimage"') for q in ctx.captured_queries)
+        )
+
+    def test_card_view_applies_to_nested_products(self):
+        self._add_products(1)
+        self.client.force_login(self.customer)
+
+        response = self.client.get("/api/cart/?view=card")
+        product = response.data[0]["product"]
+        self.assertEqual(set(product), set(PRODUCT_CARD_FIELDS))
+        self.assertEqual(product["image"], "/media/products/toy-0.jpg")
+        self.assertEqual(product["discount_percentage"], 25)
+
+        response = self.client.get(f"/api/products/{self.products[0].id}/?view=card")
+        self.assertEqual(set(response.data), set(PRODUCT_CARD_FIELDS))
+
+        response = self.client.get("/api/orders/")
+        self.assertIn("size_variants", response.data[0]["items"][0]["product"])
+
+
+class CatalogResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.seller = User.objects.create_user(
+            username="seller",
+            password="pass12345",
+            is_staff=True,
+        )
+        self.category = Category.objects.create(name="Lamps")
+        self.product = Product.objects.create(
+            category=self.category,
+            name="Desk Lamp",
+            original_price=900,
+            stock=3,
+        )
+
+    def test_repeat_request_is_served_from_cache(self):
+        first = self.client.get("/api/products/")
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get("/api/products/")
+
+        self.assertEqual(first["X-Cache"], "MISS")
+        self.assertEqual(second["X-Cache"], "HIT")
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+    def test_query_params_are_part_of_the_key(self):
+        self.client.get("/api/products/")
+        response = self.client.get("/api/products/?category=lamps")
+
+        self.assertEqual(response["X-Cache"], "MISS")
+
+    def test_catalog_writes_invalidate_cached_responses(self):
+        self.client.get(f"/api/products/{self.product.id}/")
+        ProductSizeVariant.objects.create(
+            product=self.product,
+            size_label="Large",
+            original_price=1200,
+            stock=1,
+        )
+
+        response = self.client.get(f"/api/products/{self.product.id}/")
+
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(len(response.data["size_variants"]), 1)
+
+    def test_stats_count_hits_and_misses_for_sellers(self):
+        self.client.get("/api/categories/")
+        self.client.get("/api/categories/")
+        self.client.get("/api/offers/")
+
+        self.assertEqual(self.client.get("/api/seller/cache/stats/").status_code, 401)
+        self.client.force_login(self.seller)
+        stats = self.client.get("/api/seller/cache/stats/").data
+
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 2)
+
+
+class ConditionalCatalogGetTests(TestCase):
+    def setUp(self):
+        without_image_files(self)
+        cache.clear()
+        self.client = APIClient()
+        self.category = Category.objects.create(name="Bags")
+        self.product = Product.objects.create(
+            category=self.category,
+            name="Tote",
+            original_price=700,
+            stock=6,
+        )
+        Offer.objects.create(product=self.product, title="Bag Week")
+
+    def test_matching_etag_returns_304_without_serializing(self):
+        for url in (
+            "/api/products/",
+            f"/api/products/{self.product.id}/",
+            "/api/categories/",
+            "/api/offers/",
+        ):
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                self.assertEqual(first.status_code, 200)
+                self.assertIn("Last-Modified", first)
+
+                with CaptureQueriesContext(connection) as ctx:
+                    second = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+
+                self.assertEqual(second.status_code, 304)
+                self.assertEqual(second.content, b"")
+                self.assertEqual(len(ctx.captured_queries), 0)
+
+    def test_etag_takes_precedence_over_last_modified(self):
+        for url in ("/api/offers/", "/api/products/"):
+            with self.subTest(url=url):
+                first = self.client.get(url)
+
+                both = self.client.get(
+                    url,
+                    HTTP_IF_NONE_MATCH=first["ETag"],
+                    HTTP_IF_MODIFIED_SINCE=first["Last-Modified"],
+                )
+                self.assertEqual(both.status_code, 304)
+
+                # One-second resolution cannot tell same-second edits apart.
+                bare = self.client.get(url, HTTP_IF_MODIFIED_SINCE=first["Last-Modified"])
+                self.assertEqual(bare.status_code, 200)
+
+    def test_variant_and_image_changes_produce_new_etags(self):
+        for url in ("/api/products/", f"/api/products/{self.product.id}/"):
+            with self.subTest(url=url):
+                cache.clear()
+                variant = ProductSizeVariant.objects.create(
+                    product=self.product,
+                    size_label="M",
+                    original_price=700,
+                    stock=3,
+                )
+                etags = [self.client.get(url)["ETag"]]
+
+                variant.stock = 0
+                variant.save()
+                etags.append(self.client.get(url)["ETag"])
+
+                image = ProductImage.objects.create(product=self.product, image="products/extra/tote.jpg")
+                etags.append(self.client.get(url)["ETag"])
+
+                image.delete()
+                variant.delete()
+                etags.append(self.client.get(url)["ETag"])
+                self.assertEqual(len(set(etags)), len(etags))
+
+    def test_delete_paired_with_insert_produces_new_etag(self):
+        first = self.client.get("/api/products/")
+        updated_at = self.product.updated_at
+        self.product.delete()
+        replacement = Product.objects.create(category=self.category, name="Tote", original_price=700, stock=6)
+        Product.objects.filter(id=replacement.id).update(updated_at=updated_at)
+
+        second = self.client.get("/api/products/", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(second.status_code, 200)
+
+    def test_product_change_produces_new_etag(self):
+        first = self.client.get("/api/products/")
+        self.product.name = "Tote XL"
+        self.product.save()
+
+        second = self.client.get("/api/products/", HTTP_IF_NONE_MATCH=first["ETag"])
+
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(second["ETag"], first["ETag"])
+
+    def test_missing_product_has_no_validator(self):
+        response = self.client.get("/api/products/999999/")
+
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn("ETag", response)
+
+
+class ProductCardReadModelTests(TestCase):
+    def setUp(self):
+        without_image_files(self)
+        cache.clear()
+        self.client = APIClient()
+        self.category = Category.objects.create(name="Shoes")
+        self.product = Product.objects.create(
+            category=self.category,
+            name="Runner",
+            original_price=1000,
+            offer_price=750,
+            stock=0,
+        )
+
+    def test_card_tracks_product_variant_and_image_writes(self):
+        card = ProductCard.objects.get(product=self.product)
+        self.assertEqual(card.selling_price, 750)
+        self.assertEqual(card.discount_percentage, 25)
+        self.assertFalse(card.in_stock)
+        self.assertEqual(card.image_count, 0)
+
+        ProductSizeVariant.objects.create(
+            product=self.product,
+            size_label="9",
+            original_price=1200,
+            offer_price=1100,
+            stock=2,
+        )
+        ProductImage.objects.create(product=self.product, image="products/extra/runner.jpg")
+
+        card.refresh_from_db()
+        self.assertTrue(card.in_stock)
+        self.assertEqual(card.min_variant_price, 1100)
+        self.assertEqual(card.image_count, 1)
+        self.assertTrue(card.primary_image_url.endswith("runner.jpg"))
+
+    def test_card_view_reads_only_the_card_table(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/api/products/?view=card&limit=10")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["results"][0]["id"], self.product.id)
+        self.assertEqual(response.data["results"][0]["selling_price"], "750.00")
+        listing_sql = [q["sql"] for q in ctx.captured_queries if "products_productcard" in q["sql"]]
+        self.assertEqual(len(listing_sql), 1)
+        self.assertNotIn('"products_product"', listing_sql[0])
+
+    def test_cards_are_kept_without_upsert_targets(self):
+        # MySQL cannot name the conflict target of an upsert.
+        with mock.patch.object(connection.features, "supports_update_conflicts_with_target", False):
+            product = Product.objects.create(category=self.category, name="Trail", original_price=500)
+            self.product.offer_price = 600
+            self.product.save()
+
+        self.assertEqual(ProductCard.objects.get(product=product).selling_price, 500)
+        self.assertEqual(ProductCard.objects.get(product=self.product).selling_price, 600)
+
+    def test_rebuild_command_restores_missing_cards(self):
+        ProductCard.objects.all().delete()
+
+        call_command("rebuild_product_cards", batch_size=1, stdout=io.StringIO())
+
+        self.assertTrue(ProductCard.objects.filter(product=self.product).exists())
+
+
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.kitchen = Category.objects.create(name="Kitchen")
+        self.decor = Category.objects.create(name="Decor")
+        self.kettle = Product.objects.create(
+            category=self.kitchen,
+            name="Copper Kettle",
+            description="Boils water fast",
+            original_price=800,
+        )
+        self.mug = Product.objects.create(
+            category=self.decor,
+            name="Tea Mug",
+            description="Pairs well with a copper kettle",
+            original_price=200,
+        )
+
+    def _ids(self, query):
+        response = self.client.get("/api/products/search/", {"q": query})
+        self.assertEqual(response.status_code, 200)
+        return [item["id"] for item in response.data["results"]]
+
+    def test_name_matches_rank_above_description_matches(self):
+        self.assertEqual(self._ids("copper kettle"), [self.kettle.id, self.mug.id])
+
+    def test_matches_category_name_and_prefix(self):
+        self.assertEqual(self._ids("kitch"), [self.kettle.id])
+
+    def test_index_follows_product_saves(self):
+        self.mug.name = "Tea Cup"
+        self.mug.save()
+        self.kettle.is_active = False
+        self.kettle.save()
+
+        self.assertEqual(self._ids("cup"), [self.mug.id])
+        self.assertEqual(self._ids("boils"), [])
+
+    def test_operator_characters_are_treated_as_text(self):
+        self.assertEqual(self._ids('copper" (*:'), [self.kettle.id, self.mug.id])
+
+    def test_results_are_paginated(self):
+        response = self.client.get("/api/products/search/", {"q": "copper", "limit": 1})
+        self.assertEqual(response.data["next"], 2)
+
+        response = self.client.get("/api/products/search/", {"q": "copper", "limit": 1, "page": 2})
+        self.assertEqual([item["id"] for item in response.data["results"]], [self.mug.id])
+        self.assertIsNone(response.data["next"])
+
+
+class ProductSuggestTests(TestCase):
+    def setUp(self):
+        reset_suggestion_index()
+        self.addCleanup(reset_suggestion_index)
+        self.client = APIClient()
+        self.customer = User.objects.create_user(username="fan@example.com", password="pass12345")
+        self.category = Category.objects.create(name="Kitchen")
+        self.kettle = Product.objects.create(
+            category=self.category, name="Copper Kettle", original_price=800
+        )
+        self.kadai = Product.objects.create(
+            category=self.category, name="Iron Kadai", original_price=600
+        )
+        order = Order.objects.create(
+            user=self.customer,
+            full_name="Fan",
+            phone="1",
+            address="A",
+            city="C",
+            state="S",
+            pincode="1",
+            total_amount=600,
+        )
+        OrderItem.objects.create(order=order, product=self.kadai, quantity=3, price=600)
+
+    def _labels(self, prefix):
+        response = self.client.get("/api/products/suggest/", {"prefix": prefix})
+        self.assertEqual(response.status_code, 200)
+        return [row["label"] for row in response.data]
+
+    def test_prefix_matches_any_word_ranked_by_popularity(self):
+        self.assertEqual(self._labels("k"), ["Iron Kadai", "Kitchen", "Copper Kettle"])
+        self.assertEqual(self._labels("KETT"), ["Copper Kettle"])
+
+    def test_index_follows_catalog_signals(self):
+        self._labels("k")
+
+        self.kettle.name = "Copper Pot"
+        self.kettle.save()
+        self.kadai.is_active = False
+        self.kadai.save()
+        Product.objects.create(category=self.category, name="Knife Set", original_price=300)
+
+        self.assertEqual(self._labels("k"), ["Kitchen", "Knife Set"])
+        self.assertEqual(self._labels("pot"), ["Copper Pot"])
+
+    def test_index_size_is_bounded(self):
+        with self.settings(SUGGEST_MAX_ENTRIES=2):
+            self.assertEqual(len(get_suggestion_index()), 2)
+
+    def test_lookups_are_safe_during_updates(self):
+        rows = [("product", pk, f"Kettle {pk}", f"kettle-{pk}", pk) for pk in range(500)]
+        index = SuggestionIndex(rows, max_entries=10000)
+        done = threading.Event()
+        errors = []
+
+        def churn():
+            pk = 0
+            while not done.is_set():
+                pk = (pk + 1) % 500
+                index.remove(("product", pk))
+                index.upsert(("product", pk), f"Kettle {pk} Mk2", f"kettle-{pk}", pk)
+
+        def read():
+            try:
+                for _ in range(300):
+                    for row in index.suggest("kettle", limit=20):
+                        self.assertTrue(row["label"].startswith(f"Kettle {row['id']}"))
+            except Exception as exc:
+                errors.append(exc)
+
+        writer = threading.Thread(target=churn)
+        readers = [threading.Thread(target=read) for _ in range(4)]
+        writer.start()
+        for reader in readers:
+            reader.start()
+        for reader in readers:
+            reader.join()
+        done.set()
+        writer.join()
+        self.assertEqual(errors, [])
+
+
+class ProductFacetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.kitchen = Category.objects.create(name="Kitchen")
+        self.apparel = Category.objects.create(name="Apparel")
+        self.pan = Product.objects.create(
+            category=self.kitchen, name="Pan", original_price=400, offer_price=300, stock=5
+        )
+        self.pot = Product.objects.create(
+            category=self.kitchen, name="Pot", original_price=1200, stock=0
+        )
+        self.shirt = Product.objects.create(
+            category=self.apparel, name="Shirt", original_price=800, stock=0
+        )
+        ProductSizeVariant.objects.create(
+            product=self.shirt, size_label="M", original_price=800, stock=4
+        )
+        ProductSizeVariant.objects.create(
+            product=self.shirt, size_label="L", original_price=800, stock=0
+        )
+
+    def _ids(self, query):
+        response = self.client.get(f"/api/products/?{query}")
+        self.assertEqual(response.status_code, 200)
+        return {row["id"] for row in response.data}
+
+    def test_filters_apply_to_listing(self):
+        self.assertEqual(self._ids("in_stock=1"), {self.pan.id, self.shirt.id})
+        self.assertEqual(self._ids("on_offer=true"), {self.pan.id})
+        self.assertEqual(self._ids("min_price=500&max_price=1000"), {self.shirt.id})
+        self.assertEqual(self._ids("size=M,XL"), {self.shirt.id})
+        self.assertEqual(self._ids("category=kitchen&in_stock=1"), {self.pan.id})
+
+    def test_facet_counts_use_a_fixed_number_of_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/api/products/?facets=1&view=card&in_stock=1")
+
+        facets = response.data["facets"]
+        self.assertEqual(
+            {row["slug"]: row["count"] for row in facets["categories"]},
+            {"apparel": 1, "kitchen": 1},
+        )
+        self.assertEqual({row["size_label"]: row["count"] for row in facets["sizes"]}, {"M": 1, "L": 1})
+        self.assertEqual(facets["in_stock"], 2)
+        self.assertEqual(facets["on_offer"], 1)
+        self.assertEqual([bucket["count"] for bucket in facets["price"]["buckets"]], [1, 1, 1, 0, 0])
+        self.assertEqual(len(response.data["results"]), 2)
+
+        facet_queries = [
+            q for q in ctx.captured_queries
+            if "COUNT(" in q["sql"].upper() and "products_productcard" in q["sql"]
+        ]
+        self.assertEqual(len(facet_queries), 3)
+
+
+class RelatedProductsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.buyer = User.objects.create_user(username="buyer", password="pass12345")
+        self.kitchen = Category.objects.create(name="Kitchen")
+        self.garden = Category.objects.create(name="Garden")
+        self.pan = Product.objects.create(category=self.kitchen, name="Pan", original_price=300)
+        self.lid = Product.objects.create(category=self.kitchen, name="Lid", original_price=80)
+        self.spoon = Product.objects.create(category=self.kitchen, name="Spoon", original_price=40)
+        self.bowl = Product.objects.create(category=self.kitchen, name="Bowl", original_price=90)
+        self.hose = Product.objects.create(category=self.garden, name="Hose", original_price=500)
+
+    def _order(self, *products, status="placed"):
+        order = Order.objects.create(
+            user=self.buyer,
+            full_name="Buyer",
+            phone="999",
+            address="Street",
+            city="City",
+            state="State",
+            pincode="600001",
+            total_amount=0,
+            status=status,
+        )
+        for product in products:
+            OrderItem.objects.create(order=order, product=product, price=product.original_price, quantity=1)
+
+    def _related_ids(self, product, query=""):
+        response = self.client.get(f"/api/products/related/kitchen/{product.id}/{query}")
+        self.assertEqual(response.status_code, 200)
+        return [row["id"] for row in response.data]
+
+    def test_co_purchases_rank_first_then_category_bestsellers(self):
+        self._order(self.pan, self.lid)
+        self._order(self.pan, self.lid)
+        self._order(self.pan, self.hose)
+        self._order(self.lid, self.hose)
+        self._order(self.bowl, self.bowl)
+        self._order(self.pan, self.spoon, status="cancelled")
+
+        call_command("build_product_similarity", stdout=io.StringIO())
+
+        ranked = list(ProductSimilarity.objects.filter(product=self.pan))
+        self.assertEqual([row.related_id for row in ranked], [self.lid.id, self.hose.id])
+        self.assertAlmostEqual(ranked[0].score, 2 / 3)
+        self.assertEqual(
+            self._related_ids(self.pan),
+            [self.lid.id, self.hose.id, self.bowl.id, self.spoon.id],
+        )
+        self.assertEqual(self._related_ids(self.pan, "?limit=1"), [self.lid.id])
+
+    def test_without_similarities_falls_back_to_bestsellers(self):
+        self._order(self.spoon)
+        self._order(self.spoon)
+        self._order(self.bowl)
+
+        self.assertEqual(self._related_ids(self.pan), [self.spoon.id, self.bowl.id, self.lid.id])
+
+
+class CategoryResolverTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.category = Category.objects.create(name="Home Decor")
+        self.lamp = Product.objects.create(category=self.category, name="Lamp", original_price=300)
+        Product.objects.create(category=Category.objects.create(name="Toys"), name="Kite", original_price=90)
+
+    def _listing_ids(self, value):
+        return list(public_products(value).values_list("id", flat=True))
+
+    def test_listing_resolves_category_in_the_same_query(self):
+        self._listing_ids("home-decor")
+
+        for value in ("home-decor", "HOME-DECOR", "home decor"):
+            with self.subTest(value=value):
+                with CaptureQueriesContext(connection) as ctx:
+                    ids = self._listing_ids(value)
+                self.assertEqual(ids, [self.lamp.id])
+                self.assertEqual(len(ctx.captured_queries), 1)
+                self.assertNotIn("products_category", ctx.captured_queries[0]["sql"])
+
+    def test_category_writes_refresh_the_map(self):
+        self.assertEqual(resolve_category_id("home-decor"), self.category.id)
+
+        self.category.slug = "living"
+        self.category.save()
+        self.assertIsNone(resolve_category_id("home-decor"))
+        self.assertEqual(resolve_category_id("Living"), self.category.id)
+
+        self.lamp.delete()
+        self.category.delete()
+        self.assertIsNone(resolve_category_id("living"))
+
+    def test_unmapped_category_falls_back_to_a_subquery(self):
+        self._listing_ids("toys")
+        Category.objects.bulk_create([Category(name="Garden", slug="garden")])
+        garden = Category.objects.get(slug="garden")
+        hose = Product.objects.create(category=garden, name="Hose", original_price=500)
+
+        with CaptureQueriesContext(connection) as ctx:
+            ids = self._listing_ids("Garden")
+        self.assertEqual(ids, [hose.id])
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(self._listing_ids("nowhere"), [])
+
+
+@override_settings(CATALOG_SNAPSHOT_BACKGROUND_REBUILD=False)
+class HomeFeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.category = Category.objects.create(name="Decor")
+        self.vase = Product.objects.create(
+            category=self.category,
+            name="Vase",
+            original_price=400,
+            offer_price=300,
+            featured=True,
+        )
+        Product.objects.create(category=self.category, name="Plain", original_price=100)
+        Offer.objects.create(product=self.vase, title="Vase week", is_active=True)
+
+    def test_fresh_snapshot_is_served_without_queries(self):
+        first = self.client.get("/api/home/")
+        self.assertEqual([row["slug"] for row in first.data["categories"]], ["decor"])
+        self.assertEqual([row["title"] for row in first.data["offers"]], ["Vase week"])
+        self.assertEqual([row["id"] for row in first.data["featured"]], [self.vase.id])
+
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get("/api/home/")
+        self.assertEqual(second["X-Snapshot"], "FRESH")
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+    def test_catalog_write_regenerates_the_snapshot(self):
+        self.client.get("/api/home/")
+        lamp = Product.objects.create(
+            category=self.category,
+            name="Lamp",
+            original_price=900,
+            featured=True,
+        )
+
+        response = self.client.get("/api/home/")
+        self.assertEqual(response["X-Snapshot"], "FRESH")
+        self.assertEqual([row["id"] for row in response.data["featured"]], [lamp.id, self.vase.id])
+
+    def test_stale_snapshot_is_served_while_a_rebuild_runs(self):
+        self.client.get("/api/home/")
+        self.vase.featured = False
+        self.vase.save()
+        cache.add(snapshot_lock_key(HOME_SNAPSHOT_KEY), True)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/api/home/")
+        self.assertEqual(response["X-Snapshot"], "STALE")
+        self.assertEqual([row["id"] for row in response.data["featured"]], [self.vase.id])
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+    @override_settings(CATALOG_CACHE_TIMEOUT=42)
+    def test_snapshot_ages_out_after_the_catalog_timeout(self):
+        # Another worker's version bump is invisible with a per-process
+        # cache, so the snapshot must not outlive CATALOG_CACHE_TIMEOUT.
+        with mock.patch.object(cache, "set", wraps=cache.set) as cache_set:
+            self.client.get("/api/home/")
+        timeouts = [call.kwargs["timeout"] for call in cache_set.call_args_list if call.args[0] == HOME_SNAPSHOT_KEY]
+        self.assertEqual(timeouts, [42])
+
+
+@override_settings(CATALOG_SNAPSHOT_BACKGROUND_REBUILD=False)
+class OfferListSnapshotTests(TestCase):
+    def setUp(self):
+        without_image_files(self)
+        cache.clear()
+        self.client = APIClient()
+        self.seller = User.objects.create_user(username="seller", password="pass12345", is_staff=True)
+        self.category = Category.objects.create(name="Audio")
+
+    def _add_offers(self, count):
+        for index in range(count):
+            product = Product.objects.create(
+                category=self.category,
+                name=f"Speaker {index}",
+                original_price=1000,
+                offer_price=800,
+                image=f"products/speaker-{index}.jpg",
+            )
+            Offer.objects.create(product=product, title=f"Deal {index}", display_order=index)
+
+    def _count_queries(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/api/offers/")
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_offers_are_built_in_one_query_with_serializer_shape(self):
+        self._add_offers(1)
+        small = self._count_queries()
+        self._add_offers(4)
+        self.assertEqual(self._count_queries(), small)
+
+        row = self.client.get("/api/offers/").data[0]
+        self.assertEqual(row, OfferSerializer(Offer.objects.get(id=row["id"])).data)
+        self.assertEqual(row["image"], "/media/products/speaker-0.jpg")
+
+    def test_broken_row_is_skipped_and_counted(self):
+        self._add_offers(2)
+        broken = Offer.objects.get(title="Deal 1")
+        real_offer_row = offer_row
+
+        def flaky(row):
+            if row["id"] == broken.id:
+                raise ValueError("bad row")
+            return real_offer_row(row)
+
+        with mock.patch("products.offers.offer_row", side_effect=flaky):
+            with self.assertLogs("products.offers", level="ERROR"):
+                response = self.client.get("/api/offers/")
+
+        self.assertEqual([row["title"] for row in response.data], ["Deal 0"])
+        self.client.force_login(self.seller)
+        stats = self.client.get("/api/seller/cache/stats/").data
+        self.assertEqual(stats["offer_row_failures"], 1)
+
+    def test_stale_offers_are_served_while_a_rebuild_runs(self):
+        self._add_offers(1)
+        self.client.get("/api/offers/")
+        Offer.objects.update(title="Renamed")
+        Offer.objects.first().save()
+        cache.add(snapshot_lock_key(OFFERS_SNAPSHOT_KEY), True)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/api/offers/")
+        self.assertEqual(response["X-Snapshot"], "STALE")
+        self.assertEqual(response.data[0]["title"], "Deal 0")
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+        cache.delete(snapshot_lock_key(OFFERS_SNAPSHOT_KEY))
+        response = self.client.get("/api/offers/")
+        self.assertEqual(response["X-Snapshot"], "FRESH")
+        self.assertEqual(response.data[0]["title"], "Renamed")
+
+
+@override_settings(CATALOG_SNAPSHOT_BACKGROUND_REBUILD=False)
+class ScheduledOfferTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.seller = User.objects.create_user(username="seller", password="pass12345", is_staff=True)
+        self.category = Category.objects.create(name="Garden")
+        self.product = Product.objects.create(category=self.category, name="Hose", original_price=500)
+        self.now = timezone.now()
+
+    def _titles_at(self, moment):
+        with mock.patch("django.utils.timezone.now", return_value=moment), \
+                mock.patch("products.cache.time.time", return_value=moment.timestamp()):
+            response = self.client.get("/api/offers/")
+        self.assertEqual(response.status_code, 200)
+        return [row["title"] for row in response.data]
+
+    def test_offers_follow_their_window_without_writes(self):
+        start = self.now + timedelta(hours=1)
+        end = self.now + timedelta(hours=2)
+        Offer.objects.create(product=self.product, title="Always")
+        Offer.objects.create(product=self.product, title="Flash", starts_at=start, ends_at=end)
+
+        self.assertEqual(self._titles_at(self.now), ["Always"])
+        snapshot = cache.get(OFFERS_SNAPSHOT_KEY)
+        self.assertEqual(snapshot["expires_at"], start.timestamp())
+
+        self.assertEqual(self._titles_at(start - timedelta(seconds=1)), ["Always"])
+        self.assertEqual(self._titles_at(start), ["Flash", "Always"])
+        self.assertEqual(cache.get(OFFERS_SNAPSHOT_KEY)["expires_at"], end.timestamp())
+        self.assertEqual(self._titles_at(end), ["Always"])
+        self.assertIsNone(cache.get(OFFERS_SNAPSHOT_KEY)["expires_at"])
+
+    def test_seller_sets_and_validates_the_window(self):
+        self.client.force_login(self.seller)
+        payload = {
+            "title": "Weekend",
+            "product": self.product.id,
+            "offer_price": "400",
+            "starts_at": "2030-01-04T00:00:00Z",
+            "ends_at": "2030-01-06T00:00:00Z",
+        }
+
+        response = self.client.post("/api/seller/offers/", payload, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["starts_at"], "2030-01-04T00:00:00Z")
+        self.assertEqual(self._titles_at(self.now), [])
+
+        response = self.client.put(
+            f"/api/seller/offers/{response.data['id']}/",
+            {"offer_price": "400", "ends_at": "2030-01-03T00:00:00Z"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["detail"], "ends_at must be after starts_at")
+
+    def _buy_now_price_at(self, moment):
+        customer = User.objects.create_user(username=f"buyer{moment.timestamp()}", password="pass12345")
+        CustomerProfile.objects.create(
+            user=customer, name="Buyer", phone="999", address="1 Road", city="Kochi", state="KL", pincode="682001",
+        )
+        self.client.force_login(customer)
+        payload = {
+            "product_id": self.product.id,
+            "full_name": "Buyer",
+            "phone": "999",
+            "address1": "1 Road",
+            "city": "Kochi",
+            "state": "KL",
+            "pincode": "682001",
+            "payment_method": "cod",
+        }
+        with mock.patch("django.utils.timezone.now", return_value=moment):
+            # The scheduled run of the command at that moment.
+            call_command("apply_offer_prices", stdout=io.StringIO())
+            response = self.client.post("/api/orders/buy-now/", payload, format="json")
+        self.assertEqual(response.status_code, 201)
+        return Decimal(response.data["total_amount"])
+
+    def test_offer_price_applies_only_inside_its_window(self):
+        start = self.now + timedelta(days=7)
+        end = start + timedelta(days=2)
+        self.product.offer_price = 450
+        self.product.save()
+        self.client.force_login(self.seller)
+        response = self.client.post("/api/seller/offers/", {
+            "title": "Next week",
+            "product": self.product.id,
+            "offer_price": "400",
+            "starts_at": start.isoformat(),
+            "ends_at": end.isoformat(),
+        }, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Decimal(response.data["offer_price"]), Decimal("400"))
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.offer_price, Decimal("450"))
+        self.assertEqual(self._buy_now_price_at(self.now), Decimal("450"))
+        self.assertEqual(self._buy_now_price_at(start), Decimal("400"))
+        self.assertEqual(self._buy_now_price_at(end - timedelta(seconds=1)), Decimal("400"))
+        self.assertEqual(self._buy_now_price_at(end), Decimal("450"))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.offer_price, Decimal("450"))
+        self.assertIsNone(self.product.applied_offer_price)
+
+    def test_deleting_the_live_offer_restores_the_price(self):
+        self.client.force_login(self.seller)
+        response = self.client.post("/api/seller/offers/", {
+            "title": "Now", "product": self.product.id, "offer_price": "450",
+        }, format="json")
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.offer_price, Decimal("450"))
+
+        self.client.delete(f"/api/seller/offers/{response.data['id']}/")
+        self.product.refresh_from_db()
+        self.assertIsNone(self.product.offer_price)
+
+    def test_ended_and_inactive_offers_keep_the_sellers_price(self):
+        other = Product.objects.create(category=self.category, name="Rake", original_price=100, offer_price=60)
+        self.product.offer_price = 70
+        self.product.save()
+        Offer.objects.create(
+            product=self.product, title="Gone", offer_price=50,
+            starts_at=self.now - timedelta(days=2), ends_at=self.now - timedelta(days=1),
+        )
+        Offer.objects.create(product=other, title="Off", offer_price=40, is_active=False)
+
+        call_command("apply_offer_prices", stdout=io.StringIO())
+
+        self.product.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.product.offer_price, Decimal("70"))
+        self.assertEqual(other.offer_price, Decimal("60"))
+
+    def test_offer_list_and_seller_view_show_the_offers_price(self):
+        self.product.offer_price = 450
+        self.product.save()
+        offer = Offer.objects.create(product=self.product, title="Flash", offer_price=400)
+
+        row = self.client.get("/api/offers/").data[0]
+        self.assertEqual(row["offer_price"], "400.00")
+        self.assertEqual(row["offer_price"], OfferSerializer(Offer.objects.get(pk=offer.pk)).data["offer_price"])
+
+
+class ProductOrderingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        category = Category.objects.create(name="Tools")
+        self.hammer = Product.objects.create(category=category, name="Hammer", original_price=400, offer_price=300)
+        self.saw = Product.objects.create(category=category, name="Saw", original_price=350)
+        self.drill = Product.objects.create(category=category, name="Drill", original_price=2000, offer_price=1000)
+        self.tape = Product.objects.create(category=category, name="Tape", original_price=300, offer_price=350)
+        ProductSizeVariant.objects.create(
+            product=self.drill, size_label="Pro", original_price=2500, offer_price=2200
+        )
+        ProductSizeVariant.objects.create(
+            product=self.drill, size_label="Lite", original_price=900
+        )
+
+    def _ids(self, query):
+        ids = []
+        url = f"/api/products/?{query}&limit=2"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(row["id"] for row in response.data["results"])
+            url = f"/api/products/?{query}&limit=2&cursor={response.data['next']}" if response.data["next"] else None
+        return ids
+
+    def test_orderings_sort_in_the_database_across_pages(self):
+        by_price = [self.hammer.id, self.tape.id, self.saw.id, self.drill.id]
+        for view in ("", "&view=card"):
+            with self.subTest(view=view):
+                self.assertEqual(self._ids(f"ordering=price{view}"), by_price)
+                self.assertEqual(self._ids(f"ordering=-price{view}"), by_price[::-1])
+                self.assertEqual(
+                    self._ids(f"ordering=discount{view}"),
+                    [self.drill.id, self.hammer.id, self.tape.id, self.saw.id],
+                )
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get("/api/products/?ordering=price&limit=2&fields=id")
+        listing = [q["sql"] for q in ctx.captured_queries if "LIMIT 3" in q["sql"]]
+        self.assertIn('ORDER BY "products_product"."effective_price" ASC', listing[0])
+
+    def test_invalid_ordering_and_mismatched_cursor_return_400(self):
+        self.assertEqual(self.client.get("/api/products/?ordering=name").status_code, 400)
+        newest = self.client.get("/api/products/?limit=1").data["next"]
+        response = self.client.get(f"/api/products/?ordering=price&cursor={newest}")
+        self.assertEqual(response.status_code, 400)
+
+    def test_stored_price_matches_python_pricing(self):
+        rows = Product.objects.in_bulk()
+
+        for product in (self.hammer, self.saw, self.drill, self.tape):
+            self.assertEqual(rows[product.id].effective_price, effective_price(product.original_price, product.offer_price))
+
+
+@skipUnless(connection.vendor == "sqlite", "reads SQLite EXPLAIN QUERY PLAN output")
+class QueryPlanTests(TestCase):
+    # A plan step like "SCAN products_product" with no index after it reads
+    # every row of the table. Seller dashboards that list every order item
+    # are full scans by design.
+    FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+    ALLOWED_SCANS = {
+        ("/api/seller/orders/", "products_orderitem"),
+    }
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.customer = User.objects.create_user(username="plan@example.com", password="pass12345")
+        self.seller = User.objects.create_user(username="planner", password="pass12345", is_staff=True)
+        self.category = Category.objects.create(name="Plans")
+        self.products = [
+            Product.objects.create(
+                category=self.category,
+                name=f"Plan {index}",
+                original_price=100 + index,
+                offer_price=90 + index if index % 2 else None,
+                featured=index % 2 == 0,
+                is_active=index != 3,
+            )
+            for index in range(4)
+        ]
+        Offer.objects.create(product=self.products[0], title="Plan offer", is_active=True)
+        order = Order.objects.create(
+            user=self.customer,
+            full_name="Plan",
+            phone="999",
+            address="Street",
+            city="City",
+            state="State",
+            pincode="600001",
+            total_amount=100,
+        )
+        OrderItem.objects.create(order=order, product=self.products[0], price=100, quantity=1)
+        CartItem.objects.create(user=self.customer, product=self.products[0])
+        WishlistItem.objects.create(user=self.customer, product=self.products[1])
+        Enquiry.objects.create(user=self.customer, name="Plan", email="plan@example.com", message="Hi")
+        self.order = order
+
+    def _full_scans(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        scans = []
+        with connection.cursor() as cursor:
+            for query in ctx.captured_queries:
+                if not query["sql"].startswith("SELECT"):
+                    continue
+                cursor.execute("EXPLAIN QUERY PLAN " + query["sql"])
+                for row in cursor.fetchall():
+                    match = self.FULL_SCAN.match(row[-1])
+                    if match and (url, match.group(1)) not in self.ALLOWED_SCANS:
+                        scans.append((match.group(1), query["sql"]))
+        return scans
+
+    def _assert_no_full_scans(self, urls):
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self._full_scans(url), [])
+
+    def test_catalog_views_use_indexes(self):
+        product = self.products[0]
+        self._assert_no_full_scans([
+            "/api/products/",
+            "/api/products/?limit=2",
+            "/api/products/?category=plans&limit=2",
+            "/api/products/?view=card&limit=2",
+            "/api/products/?category=plans&view=card&limit=2",
+            "/api/products/?ordering=price&limit=2",
+            "/api/products/?ordering=discount&limit=2",
+            "/api/products/?facets=1",
+            f"/api/products/{product.id}/",
+            f"/api/products/related/plans/{product.id}/",
+            "/api/products/search/?q=plan",
+            "/api/categories/",
+            "/api/offers/",
+            "/api/home/",
+        ])
+
+    def test_customer_views_use_indexes(self):
+        self.client.force_login(self.customer)
+        self._assert_no_full_scans([
+            "/api/cart/",
+            "/api/wishlist/",
+            "/api/orders/",
+            f"/api/orders/{self.order.id}/",
+            "/api/customer/enquiries/",
+        ])
+
+    def test_seller_views_use_indexes(self):
+        self.client.force_login(self.seller)
+        self._assert_no_full_scans([
+            "/api/seller/orders/",
+            "/api/seller/enquiries/",
+            "/api/products/inactive/",
+        ])
+
+    def test_detects_a_full_scan(self):
+        # Product.name has no index, so this must be reported.
+        with CaptureQueriesContext(connection) as ctx:
+            list(Product.objects.filter(name="Plan 1"))
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + ctx.captured_queries[0]["sql"])
+            details = [row[-1] for row in cursor.fetchall()]
+        self.assertTrue(any(self.FULL_SCAN.match(detail) for detail in details), details)
+
+
+def use_temp_media(test, backend="django.core.files.storage.FileSystemStorage"):
+    # Points the default storage at a throwaway MEDIA_ROOT for one test.
+    media_root = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+    storage_settings = override_settings(
+        MEDIA_ROOT=media_root,
+        STORAGES={**settings.STORAGES, "default": {"BACKEND": backend}},
+    )
+    storage_settings.enable()
+    test.addCleanup(storage_settings.disable)
+
+
+class ProductImageDerivativeTests(TestCase):
+    def setUp(self):
+        use_temp_media(self)
+        cache.clear()
+        self.client = APIClient()
+        self.seller = User.objects.create_user(username="seller", password="pass12345", is_staff=True)
+        self.category = Category.objects.create(name="Prints")
+
+    def _upload(self, name, width, height, mode="RGB"):
+        buffer = io.BytesIO()
+        Image.new(mode, (width, height), (200, 80, 40, 128)[: len(mode)]).save(buffer, "PNG")
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+    def _widths(self, srcset):
+        return [int(entry.rsplit(" ", 1)[1][:-1]) for entry in srcset.split(", ")]
+
+    def test_upload_builds_bounded_derivatives_and_srcset(self):
+        self.client.force_login(self.seller)
+        response = self.client.post(
+            "/api/products/",
+            {
+                "category": self.category.id,
+                "name": "Poster",
+                "original_price": "500",
+                "image": self._upload("poster.png", 2000, 1000),
+                "images": [self._upload("detail.png", 900, 600, mode="RGBA")],
+            },
+            format="multipart",
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+
+        srcset = response.data["data"]["image_srcset"]
+        self.assertEqual((srcset["width"], srcset["height"]), (2000, 1000))
+        self.assertTrue(srcset["placeholder"].startswith("data:image/webp;base64,"))
+        self.assertEqual(self._widths(srcset["webp"]), [160, 320, 640, 1280])
+        self.assertEqual(self._widths(srcset["jpeg"]), [160, 320, 640, 1280])
+
+        product = Product.objects.get(name="Poster")
+        _, name, _ = product.image_variants["webp"][1]
+        with default_storage.open(name) as handle:
+            derived = Image.open(handle)
+            self.assertEqual((derived.format, derived.size), ("WEBP", (320, 160)))
+
+        # Extra images are never upscaled: 900px tops out at 900w.
+        detail = self.client.get(f"/api/products/{product.id}/").data["extra_images"][0]
+        self.assertEqual(self._widths(detail["image_srcset"]["jpeg"]), [160, 320, 640, 900])
+
+    def test_replacing_the_image_rebuilds_and_removes_old_derivatives(self):
+        product = Product.objects.create(
+            category=self.category,
+            name="Card",
+            original_price=100,
+            image=self._upload("card.png", 400, 400),
+        )
+        old_names = [name for _, name, _ in product.image_variants["jpeg"]]
+        self.assertTrue(all(default_storage.exists(name) for name in old_names))
+
+        product.image = self._upload("card-v2.png", 200, 100)
+        product.save()
+
+        product.refresh_from_db()
+        self.assertEqual(product.image_variants["source"], product.image.name)
+        self.assertEqual([entry[0] for entry in product.image_variants["jpeg"]], [160, 200])
+        self.assertFalse(any(default_storage.exists(name) for name in old_names))
+
+    def test_unreadable_image_is_served_without_srcset(self):
+        product = Product.objects.create(category=self.category, name="Lost", original_price=100)
+        product.image = "products/missing.png"
+        with self.assertLogs("products.images", level="WARNING"):
+            product.save()
+
+        response = self.client.get(f"/api/products/{product.id}/")
+        self.assertIsNone(response.data["image_srcset"])
+
+        # Saves that leave the image alone, including of a freshly loaded row
+        # without derivatives, neither retry nor log.
+        with mock.patch("products.images.build_image_variants") as build:
+            product.stock = 3
+            product.save()
+            Product.objects.get(pk=product.pk).save()
+        build.assert_not_called()
+
+        # Once the file is there the backfill command picks it up.
+        default_storage.save("products/missing.png", self._upload("missing.png", 300, 300))
+        out = io.StringIO()
+        call_command("build_image_variants", stdout=out)
+        self.assertIn("Built derivatives for 1 images", out.getvalue())
+        response = self.client.get(f"/api/products/{product.id}/")
+        self.assertEqual(self._widths(response.data["image_srcset"]["webp"]), [160, 300])
+
+
+    def test_reads_use_stored_urls_without_storage_calls(self):
+        buyer = User.objects.create_user(username="buyer@example.com", password="pass12345")
+        product = Product.objects.create(
+            category=self.category,
+            name="Map",
+            original_price=300,
+            offer_price=250,
+            image=self._upload("map.png", 400, 200),
+        )
+        ProductImage.objects.create(product=product, image=self._upload("map-back.png", 400, 200))
+        Offer.objects.create(product=product, title="Maps", is_active=True)
+        order = Order.objects.create(
+            user=buyer,
+            full_name="Buyer",
+            phone="999",
+            address="Street",
+            city="City",
+            state="State",
+            pincode="600001",
+            total_amount=250,
+        )
+        OrderItem.objects.create(order=order, product=product, price=250, quantity=1)
+        self.assertEqual(product.image_url, default_storage.url(product.image.name))
+
+        self.client.force_login(self.seller)
+        with mock.patch.object(FileSystemStorage, "url", side_effect=AssertionError("storage URL built")):
+            listing = self.client.get("/api/products/")
+            offers = self.client.get("/api/offers/")
+            orders = self.client.get("/api/seller/orders/")
+
+        row = listing.data[0]
+        self.assertEqual(row["image"], product.image_url)
+        self.assertEqual(len(row["images"]), 2)
+        self.assertEqual(self._widths(row["extra_images"][0]["image_srcset"]["webp"]), [160, 320, 400])
+        self.assertEqual(offers.data[0]["image"], product.image_url)
+        self.assertEqual(orders.data[0]["items"][0]["image"], product.image_url)
+
+    def test_backfill_command_stores_missing_urls(self):
+        product = Product.objects.create(
+            category=self.category,
+            name="Atlas",
+            original_price=300,
+            image=self._upload("atlas.png", 200, 200),
+        )
+        legacy = {
+            **product.image_variants,
+            "webp": [entry[:2] for entry in product.image_variants["webp"]],
+        }
+        Product.objects.filter(id=product.id).update(image_url="", image_variants=legacy)
+        ProductCard.objects.filter(product=product).update(primary_image_url="")
+
+        out = io.StringIO()
+        call_command("backfill_image_urls", stdout=out)
+
+        self.assertIn("Stored URLs for 1 images", out.getvalue())
+        product.refresh_from_db()
+        self.assertEqual(product.image_url, default_storage.url(product.image.name))
+        self.assertEqual(
+            [entry[2] for entry in product.image_variants["webp"]],
+            [default_storage.url(entry[1]) for entry in product.image_variants["webp"]],
+        )
+        self.assertEqual(product.card.primary_image_url, product.image_url)
+
+
+class SlowStorage(FileSystemStorage):
+    # Local stand-in for a remote backend: every write takes `latency`
+    # seconds, and the peak number of overlapping writes is recorded.
+    latency = 0.05
+    lock = threading.Lock()
+    active = 0
+    peak = 0
+    writes = 0
+    failing = ()
+
+    @classmethod
+    def reset(cls):
+        cls.active = cls.peak = cls.writes = 0
+        cls.failing = ()
+
+    def _save(self, name, content):
+        cls = type(self)
+        with cls.lock:
+            cls.active += 1
+            cls.writes += 1
+            cls.peak = max(cls.peak, cls.active)
+        try:
+            time.sleep(cls.latency)
+            if any(part in name for part in cls.failing):
+                raise OSError(f"upload of {name} refused")
+            return super()._save(name, content)
+        finally:
+            with cls.lock:
+                cls.active -= 1
+
+
+@override_settings(PRODUCT_IMAGE_UPLOAD_WORKERS=3, PRODUCT_IMAGE_UPLOADS_DEFERRED=False)
+class ProductImageUploadTests(TestCase):
+    def setUp(self):
+        use_temp_media(self, "products.tests.SlowStorage")
+        SlowStorage.reset()
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_login(
+            User.objects.create_user(username="seller", password="pass12345", is_staff=True)
+        )
+        self.category = Category.objects.create(name="Frames")
+
+    def _upload(self, name, shade=0):
+        buffer = io.BytesIO()
+        Image.new("RGB", (200, 100), (10, 120, shade)).save(buffer, "PNG")
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+    def _create(self, **extra):
+        return self.client.post(
+            "/api/products/",
+            {
+                "category": self.category.id,
+                "name": "Frame",
+                "original_price": "300",
+                "image": self._upload("main.png"),
+                "images": [self._upload(f"side-{index}.png", shade=index + 1) for index in range(3)],
+                **extra,
+            },
+            format="multipart",
+        )
+
+    def test_writes_of_one_request_run_on_a_bounded_pool(self):
+        started = time.monotonic()
+        response = self._create()
+        elapsed = time.monotonic() - started
+        self.assertEqual(response.status_code, 201, response.data)
+
+        # 4 originals plus 4 derivatives each (160w and 200w, WebP and JPEG).
+        self.assertEqual(SlowStorage.writes, 20)
+        self.assertEqual(SlowStorage.peak, 3)
+        self.assertLess(elapsed, SlowStorage.writes * SlowStorage.latency)
+
+        product = Product.objects.get(name="Frame")
+        self.assertTrue(default_storage.exists(product.image.name))
+        self.assertEqual(
+            [row.status for row in product.images.all()],
+            ["ready", "ready", "ready"],
+        )
+        self.assertEqual(product.card.image_count, 4)
+
+    def test_deferred_mode_returns_pending_rows_and_uploads_after_commit(self):
+        with mock.patch("products.uploads._start_background") as start:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self._create(defer_images="1")
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(SlowStorage.writes, 0)
+        data = response.data["data"]
+        self.assertIsNone(data["image"])
+        self.assertEqual([row["status"] for row in data["extra_images"]], ["pending"] * 3)
+        self.assertTrue(all(row["image"] is None for row in data["extra_images"]))
+
+        product = Product.objects.get(name="Frame")
+        self.assertEqual(product.card.image_count, 0)
+
+        SlowStorage.failing = (content_hash(self._upload("side-2.png", shade=3)),)
+        job, *args = start.call_args.args
+        with self.assertLogs("products.blobs", level="ERROR"):
+            job(*args)
+
+        product.refresh_from_db()
+        self.assertTrue(product.image.name.startswith("products/blobs/"))
+        self.assertEqual(product.image_variants["source"], product.image.name)
+        self.assertEqual(
+            [row.status for row in product.images.all()],
+            ["ready", "ready", "failed"],
+        )
+        self.assertEqual(ProductCard.objects.get(product=product).image_count, 3)
+
+        response = self.client.get(f"/api/products/{product.id}/")
+        self.assertEqual(len(response.data["images"]), 3)
+
+
+class ImageBlobTests(TestCase):
+    def setUp(self):
+        use_temp_media(self, "products.tests.SlowStorage")
+        SlowStorage.reset()
+        SlowStorage.latency = 0
+        self.addCleanup(setattr, SlowStorage, "latency", 0.05)
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_login(
+            User.objects.create_user(username="seller", password="pass12345", is_staff=True)
+        )
+        self.category = Category.objects.create(name="Mugs")
+
+    def _upload(self, name, shade=0):
+        buffer = io.BytesIO()
+        Image.new("RGB", (120, 120), (shade, 90, 160)).save(buffer, "PNG")
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+    def _create(self, name, main, extras=()):
+        response = self.client.post(
+            "/api/products/",
+            {
+                "category": self.category.id,
+                "name": name,
+                "original_price": "250",
+                "image": main,
+                "images": list(extras),
+            },
+            format="multipart",
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        return Product.objects.get(name=name)
+
+    def test_identical_bytes_are_stored_once(self):
+        small = self._create("Mug S", self._upload("mug.png"), [self._upload("mug-copy.png")])
+        writes = SlowStorage.writes
+        large = self._create("Mug L", self._upload("IMG_0001.png"))
+
+        blob = ImageBlob.objects.get()
+        self.assertEqual(blob.ref_count, 3)
+        self.assertEqual(SlowStorage.writes, writes)
+        self.assertEqual(large.image.name, blob.name)
+        self.assertEqual(small.images.get().image.name, blob.name)
+        self.assertEqual(large.image_variants, blob.variants)
+        self.assertEqual(self.client.get(f"/api/products/{large.id}/").data["image"], blob.url)
+
+    def test_blob_is_kept_when_its_derivatives_fail(self):
+        with mock.patch("products.blobs.build_upload_variants", side_effect=OSError("bad image")), \
+                self.captureOnCommitCallbacks(execute=True), \
+                self.assertLogs("products.blobs", level="ERROR"):
+            product = self._create("Mug", self._upload("mug.png"))
+
+        product.refresh_from_db()
+        blob = ImageBlob.objects.get()
+        self.assertEqual(product.image_blob_id, blob.id)
+        self.assertEqual(blob.ref_count, 1)
+        self.assertTrue(default_storage.exists(product.image.name))
+
+    def test_failed_upload_gives_its_blob_references_back(self):
+        self._create("Mug", self._upload("mug.png"))
+        reused = ImageBlob.objects.get()
+        kept = self._upload("side.png", shade=30)
+        kept_name = blob_name(content_hash(kept), kept.name)
+        save = blobs_module._save
+
+        def flaky_save(write):
+            if write[2].name == "broken.png":
+                raise OSError("storage unavailable")
+            return save(write)
+
+        with mock.patch("products.blobs._save", side_effect=flaky_save), \
+                self.captureOnCommitCallbacks(execute=True), \
+                self.assertRaises(OSError):
+            self.client.post(
+                "/api/products/",
+                {
+                    "category": self.category.id,
+                    "name": "Mug L",
+                    "original_price": "250",
+                    "image": self._upload("mug-again.png"),
+                    "images": [kept, self._upload("broken.png", shade=60)],
+                },
+                format="multipart",
+            )
+
+        reused.refresh_from_db()
+        self.assertEqual(reused.ref_count, 1)
+        self.assertEqual(ImageBlob.objects.count(), 1)
+        self.assertFalse(default_storage.exists(kept_name))
+
+    def test_failed_save_gives_its_blob_references_back(self):
+        names = [
+            blob_name(content_hash(upload), upload.name)
+            for upload in (self._upload("mug.png"), self._upload("mug-side.png", shade=40))
+        ]
+        with mock.patch.object(ProductImage.objects, "bulk_create", side_effect=DatabaseError("boom")), \
+                self.captureOnCommitCallbacks(execute=True), \
+                self.assertRaises(DatabaseError):
+            self.client.post(
+                "/api/products/",
+                {
+                    "category": self.category.id,
+                    "name": "Mug",
+                    "original_price": "250",
+                    "image": self._upload("mug.png"),
+                    "images": [self._upload("mug-side.png", shade=40)],
+                },
+                format="multipart",
+            )
+
+        self.assertFalse(Product.objects.filter(name="Mug").exists())
+        self.assertFalse(ImageBlob.objects.exists())
+        self.assertFalse(any(default_storage.exists(name) for name in names))
+
+    def test_blob_is_removed_with_its_last_reference(self):
+        product = self._create(
+            "Mug",
+            self._upload("mug.png"),
+            [self._upload("mug-side.png", shade=40), self._upload("mug-side-again.png", shade=40)],
+        )
+        side = ImageBlob.objects.get(ref_count=2)
+        first, second = product.images.all()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f"/api/products/images/{first.id}/")
+        self.assertEqual(response.status_code, 204)
+        side.refresh_from_db()
+        self.assertEqual(side.ref_count, 1)
+        self.assertTrue(default_storage.exists(side.name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f"/api/products/images/{second.id}/")
+        self.assertFalse(ImageBlob.objects.filter(id=side.id).exists())
+        self.assertFalse(default_storage.exists(side.name))
+        self.assertFalse(any(default_storage.exists(entry[1]) for entry in side.variants["webp"]))
+        self.assertEqual(ImageBlob.objects.get().ref_count, 1)
+
+    def test_replace_reuses_unchanged_photos_and_drops_the_rest(self):
+        product = self._create(
+            "Mug",
+            self._upload("mug.png"),
+            [self._upload("keep.png", shade=10), self._upload("drop.png", shade=20)],
+        )
+        dropped = ImageBlob.objects.get(sha256=content_hash(self._upload("drop.png", shade=20)))
+        writes = SlowStorage.writes
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(
+                f"/api/products/{product.id}/",
+                {
+                    "image": self._upload("mug-again.png"),
+                    "images": [self._upload("keep-again.png", shade=10)],
+                    "replace_images": "1",
+                },
+                format="multipart",
+            )
+        self.assertEqual(response.status_code, 200, response.data)
+
+        self.assertEqual(SlowStorage.writes, writes)
+        self.assertFalse(ImageBlob.objects.filter(id=dropped.id).exists())
+        self.assertEqual(
+            sorted(ImageBlob.objects.values_list("ref_count", flat=True)),
+            [1, 1],
+        )
+        self.assertEqual(product.images.count(), 1)
+
+
+class CartWriteTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="buyer", password="pass12345")
+        self.client = APIClient()
+        self.client.force_login(self.user)
+        category = Category.objects.create(name="Mugs")
+        self.product = Product.objects.create(category=category, name="Mug", original_price=250)
+        self.size = ProductSizeVariant.objects.create(product=self.product, size_label="L", original_price=300, stock=5)
+
+    def test_add_increments_the_existing_line(self):
+        for quantity in (2, 3):
+            response = self.client.post("/api/cart/add/", {"product_id": self.product.id, "quantity": quantity})
+            self.assertEqual(response.status_code, 200)
+        self.client.post(
+            "/api/cart/add/",
+            {"product_id": self.product.id, "size_variant_id": self.size.id},
+        )
+
+        self.assertEqual(response.data["quantity"], 5)
+        self.assertEqual(
+            dict(CartItem.objects.values_list("size_variant_id", "quantity")),
+            {None: 5, self.size.id: 1},
+        )
+
+    def test_adding_to_an_existing_line_is_one_update(self):
+        add_to_cart(self.user, self.product)
+        with CaptureQueriesContext(connection) as queries:
+            add_to_cart(self.user, self.product, quantity=4)
+
+        writes = [query["sql"] for query in queries if not query["sql"].startswith("SELECT")]
+        self.assertEqual(len(writes), 1)
+        self.assertIn('"quantity" = ("products_cartitem"."quantity" + 4)', writes[0])
+
+    def test_update_writes_only_quantity_and_timestamp(self):
+        add_to_cart(self.user, self.product)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.put("/api/cart/update/", {"product_id": self.product.id, "quantity": 7})
+
+        self.assertEqual(response.status_code, 200)
+        update = next(query["sql"] for query in queries if query["sql"].startswith("UPDATE"))
+        assigned = update.split(" SET ", 1)[1].split(" WHERE ", 1)[0]
+        self.assertEqual(re.findall(r'"(\w+)" =', assigned), ["quantity", "updated_at"])
+        self.assertEqual(CartItem.objects.get().quantity, 7)
+
+
+    def test_sync_merges_the_client_cart_in_one_request(self):
+        other = Product.objects.create(category=self.product.category, name="Plate", original_price=90)
+        add_to_cart(self.user, self.product, quantity=2)
+        response = self.client.post(
+            "/api/cart/sync/",
+            {
+                "items": [
+                    {"product_id": self.product.id, "quantity": 3},
+                    {"product_id": self.product.id, "size_variant_id": self.size.id},
+                    {"product_id": other.id, "quantity": 2},
+                    {"product_id": other.id, "quantity": 1},
+                    {"product_id": other.id, "size_variant_id": self.size.id},
+                    {"product_id": 999999, "quantity": 4},
+                ]
+            },
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {(line["product_id"], line["size_variant_id"], line["quantity"]) for line in response.data},
+            {(self.product.id, None, 5), (self.product.id, self.size.id, 1), (other.id, None, 3)},
+        )
+        self.assertEqual(CartItem.objects.count(), 3)
+
+    def test_sync_queries_do_not_grow_with_the_cart(self):
+        category = self.product.category
+
+        def sync(count):
+            products = [
+                Product.objects.create(category=category, name=f"Sync {count}-{index}", original_price=100)
+                for index in range(count)
+            ]
+            add_to_cart(self.user, products[0])
+            lines = [{"product_id": product.id, "quantity": 2} for product in products]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post("/api/cart/sync/", {"items": lines}, format="json")
+            self.assertEqual(response.status_code, 200)
+            writes = [query["sql"] for query in queries if not query["sql"].startswith(("SELECT", "SAVEPOINT", "RELEASE"))]
+            return len(queries), len(writes)
+
+        self.assertEqual(sync(2), sync(12))
+
+    def test_sync_rejects_a_malformed_cart(self):
+        for payload in ({"items": "nope"}, {"items": [{"quantity": 2}]}, {"items": [{"product_id": "x"}]}):
+            response = self.client.post("/api/cart/sync/", payload, format="json")
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(CartItem.objects.exists())
+
+
+class CompactItemTests(TestCase):
+    def setUp(self):
+        without_image_files(self)
+        self.user = User.objects.create_user(username="buyer", password="pass12345")
+        self.client = APIClient()
+        self.client.force_login(self.user)
+        self.category = Category.objects.create(name="Mugs")
+
+    def _fill(self, count):
+        for index in range(count):
+            product = Product.objects.create(
+                category=self.category,
+                name=f"Mug {index}",
+                original_price=200,
+                offer_price=150,
+                stock=4,
+                image=f"products/mug-{index}.jpg",
+            )
+            size = ProductSizeVariant.objects.create(product=product, size_label="L", original_price=300, stock=2)
+            ProductImage.objects.create(product=product, image=f"products/extra/mug-{index}.jpg")
+            add_to_cart(self.user, product, size)
+            WishlistItem.objects.create(user=self.user, product=product)
+
+    def test_compact_items_use_a_fixed_number_of_queries(self):
+        for url in ("/api/cart/", "/api/wishlist/"):
+            with self.subTest(url=url):
+                CartItem.objects.all().delete()
+                WishlistItem.objects.all().delete()
+                # Session, user, then the items joined to their products.
+                self._fill(2)
+                with self.assertNumQueries(3):
+                    self.client.get(url)
+                self._fill(10)
+                with self.assertNumQueries(3):
+                    response = self.client.get(url)
+                self.assertEqual(len(response.data), 12)
+
+    def test_compact_shapes(self):
+        self._fill(1)
+        line = self.client.get("/api/cart/").data[0]
+        self.assertEqual(line["name"], "Mug 0")
+        self.assertEqual(line["image"], "/media/products/mug-0.jpg")
+        self.assertEqual((line["size_label"], str(line["price"]), line["stock"]), ("L", "300.00", 2))
+        self.assertNotIn("product", line)
+
+        item = self.client.get("/api/wishlist/").data[0]
+        self.assertEqual(item["slug"], Product.objects.get().slug)
+        self.assertEqual((str(item["price"]), str(item["discounted_price"]), item["stock"]), ("200.00", "150.00", 4))
+        self.assertTrue(item["has_offer"])
+
+    def test_full_view_keeps_the_nested_product(self):
+        self._fill(1)
+        line = self.client.get("/api/cart/?view=full").data[0]
+        self.assertIn("size_variants", line["product"])
+        item = self.client.get("/api/wishlist/?view=full").data[0]
+        self.assertIn("images", item["product"])
+
+
+class GuestCartTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        category = Category.objects.create(name="Mugs")
+        self.mug = Product.objects.create(category=category, name="Mug", original_price=250)
+        self.plate = Product.objects.create(category=category, name="Plate", original_price=90)
+        self.size = ProductSizeVariant.objects.create(product=self.mug, size_label="L", original_price=300, stock=5)
+
+    def _cookie(self):
+        return self.client.cookies[settings.GUEST_CART_COOKIE_NAME].value
+
+    def test_guest_cart_lives_in_a_signed_cookie(self):
+        self.client.post("/api/cart/add/", {"product_id": self.mug.id, "quantity": 2})
+        self.client.post("/api/cart/add/", {"product_id": self.mug.id, "size_variant_id": self.size.id})
+        response = self.client.post("/api/cart/add/", {"product_id": self.mug.id})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["quantity"], 3)
+        self.assertFalse(CartItem.objects.exists())
+        self.assertLess(len(self._cookie()), 200)
+
+        # The products, then the chosen sizes.
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/cart/")
+        self.assertEqual(
+            [(line["product_id"], line["size_variant_id"], line["quantity"]) for line in response.data],
+            [(self.mug.id, None, 3), (self.mug.id, self.size.id, 1)],
+        )
+        self.assertEqual(str(response.data[1]["price"]), "300.00")
+
+    def test_guest_update_and_remove(self):
+        self.client.post("/api/cart/add/", {"product_id": self.mug.id})
+        self.client.post("/api/cart/add/", {"product_id": self.plate.id})
+
+        response = self.client.put("/api/cart/update/", {"product_id": self.mug.id, "quantity": 4})
+        self.assertEqual(response.data["quantity"], 4)
+        self.assertEqual(self.client.put("/api/cart/update/", {"product_id": 999, "quantity": 1}).status_code, 404)
+        self.assertEqual(self.client.delete(f"/api/cart/remove/{self.plate.id}/").status_code, 204)
+
+        self.assertEqual(
+            [(line["product_id"], line["quantity"]) for line in self.client.get("/api/cart/").data],
+            [(self.mug.id, 4)],
+        )
+
+    def test_tampered_cookie_is_an_empty_cart(self):
+        self.client.post("/api/cart/add/", {"product_id": self.mug.id})
+        self.client.cookies[settings.GUEST_CART_COOKIE_NAME] = self._cookie()[:-2] + "xx"
+
+        self.assertEqual(self.client.get("/api/cart/").data, [])
+
+    def test_login_merges_the_guest_cart(self):
+        user = User.objects.create_user(username="buyer@example.com", password="pass12345")
+        add_to_cart(user, self.mug, quantity=2)
+        self.client.post("/api/cart/add/", {"product_id": self.mug.id, "quantity": 3})
+        self.client.post("/api/cart/add/", {"product_id": self.plate.id})
+
+        response = self.client.post(
+            "/api/customer/login/",
+            {"email": "buyer@example.com", "password": "pass12345"},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._cookie(), "")
+        self.assertEqual(
+            dict(CartItem.objects.filter(user=user).values_list("product_id", "quantity")),
+            {self.mug.id: 5, self.plate.id: 1},
+        )
+
+    def test_guest_quantities_are_capped(self):
+        response = self.client.post("/api/cart/add/", {"product_id": self.mug.id, "quantity": 500})
+        self.assertEqual(response.data["quantity"], MAX_GUEST_LINE_QUANTITY)
+        response = self.client.put("/api/cart/update/", {"product_id": self.mug.id, "quantity": 10 ** 9})
+        self.assertEqual(response.data["quantity"], MAX_GUEST_LINE_QUANTITY)
+
+        self.client.cookies[settings.GUEST_CART_COOKIE_NAME] = signing.dumps(
+            [[self.plate.id, 0, 10 ** 9]], salt=GUEST_CART_SALT, compress=True,
+        )
+        self.assertEqual(self.client.get("/api/cart/").data[0]["quantity"], MAX_GUEST_LINE_QUANTITY)
+
+    def test_failed_merge_still_logs_in(self):
+        User.objects.create_user(username="buyer@example.com", password="pass12345")
+        self.client.post("/api/cart/add/", {"product_id": self.mug.id})
+        guest_cookie = self._cookie()
+
+        with mock.patch("products.views.sync_cart", side_effect=DatabaseError("boom")), \
+                self.assertLogs("products.views", level="ERROR"):
+            response = self.client.post(
+                "/api/customer/login/",
+                {"email": "buyer@example.com", "password": "pass12345"},
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(settings.GUEST_CART_COOKIE_NAME, response.cookies)
+        self.assertEqual(self._cookie(), guest_cookie)
+
+    def test_guest_writes_need_a_csrf_token(self):
+        client = APIClient(enforce_csrf_checks=True)
+        response = client.post("/api/cart/add/", {"product_id": self.mug.id})
+        self.assertEqual(response.status_code, 403)
+        self.assertNotIn(settings.GUEST_CART_COOKIE_NAME, response.cookies)
+
+        token = client.get("/api/csrf/").data["csrfToken"]
+        response = client.post("/api/cart/add/", {"product_id": self.mug.id}, HTTP_X_CSRFTOKEN=token)
+        self.assertEqual(response.status_code, 200)
+        response = client.delete(f"/api/cart/remove/{self.mug.id}/")
+        self.assertEqual(response.status_code, 403)
+
+
+class CartSummaryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="buyer", password="pass12345")
+        self.client = APIClient()
+        self.client.force_login(self.user)
+        category = Category.objects.create(name="Mugs")
+        self.mug = Product.objects.create(category=category, name="Mug", original_price=200, offer_price=150, stock=10)
+        self.plate = Product.objects.create(category=category, name="Plate", original_price=90, stock=1)
+        self.size = ProductSizeVariant.objects.create(
+            product=self.mug,
+            size_label="L",
+            original_price=300,
+            offer_price=240,
+            stock=0,
+        )
+
+    def _summary(self):
+        response = self.client.get("/api/cart/summary/")
+        self.assertEqual(response.status_code, 200)
+        return {key: str(value) if not isinstance(value, (bool, int)) else value for key, value in response.data.items()}
+
+    def test_summary_is_one_aggregate_query(self):
+        add_to_cart(self.user, self.mug, quantity=2)
+        add_to_cart(self.user, self.size.product, self.size)
+        add_to_cart(self.user, self.plate, quantity=3)
+
+        with CaptureQueriesContext(connection) as queries:
+            summary = self._summary()
+
+        self.assertEqual(summary, {
+            "line_count": 3,
+            "item_count": 6,
+            "subtotal": "970.00",
+            "discount_total": "160.00",
+            "total": "810.00",
+            "out_of_stock_count": 2,
+            "has_out_of_stock": True,
+        })
+        # One joined aggregate, next to the cart stamp read.
+        cart_queries = [query["sql"] for query in queries if "products_cartitem" in query["sql"]]
+        self.assertEqual(len(cart_queries), 2)
+        self.assertEqual(sum("products_productsizevariant" in sql for sql in cart_queries), 1)
+
+    def test_summary_and_lines_agree_on_edge_offer_prices(self):
+        self.plate.offer_price = 0
+        self.plate.save()
+        self.size.offer_price = self.size.original_price
+        self.size.save()
+        add_to_cart(self.user, self.plate, quantity=2)
+        add_to_cart(self.user, self.mug, self.size)
+
+        lines = self.client.get("/api/cart/").data
+        self.assertEqual([line["has_offer"] for line in lines], [False, False])
+        charged = sum(
+            Decimal(str(line["discounted_price"] if line["has_offer"] else line["price"])) * line["quantity"]
+            for line in lines
+        )
+        self.assertEqual(self._summary()["total"], str(charged))
+
+    def test_summary_is_cached_until_the_cart_changes(self):
+        add_to_cart(self.user, self.mug)
+        self.assertEqual(self._summary()["item_count"], 1)
+        with CaptureQueriesContext(connection) as queries:
+            self._summary()
+        # Only the cart stamp is read; the joined aggregate is not rerun.
+        cart_queries = [query["sql"] for query in queries if "products_cartitem" in query["sql"]]
+        self.assertEqual(len(cart_queries), 1)
+        self.assertNotIn("products_product", cart_queries[0])
+
+        self.client.post("/api/cart/add/", {"product_id": self.mug.id, "quantity": 2})
+        self.assertEqual(self._summary()["item_count"], 3)
+        self.client.put("/api/cart/update/", {"product_id": self.mug.id, "quantity": 5})
+        self.assertEqual(self._summary()["item_count"], 5)
+        self.client.post("/api/cart/sync/", {"items": [{"product_id": self.plate.id}]}, format="json")
+        self.assertEqual(self._summary()["line_count"], 2)
+        self.client.delete(f"/api/cart/remove/{self.plate.id}/")
+        self.assertEqual(self._summary()["line_count"], 1)
+
+        self.mug.offer_price = 100
+        self.mug.save()
+        self.assertEqual(self._summary()["total"], "500.00")
+
+    def test_summary_sees_writes_made_by_other_workers(self):
+        add_to_cart(self.user, self.mug)
+        self.assertEqual(self._summary()["item_count"], 1)
+
+        # Writes that skip this worker's invalidation, as another worker's do.
+        with mock.patch("products.carts.invalidate_cart_summary"), \
+                mock.patch("products.signals.invalidate_cart_summary"):
+            CartItem.objects.filter(user=self.user).update(quantity=4, updated_at=timezone.now())
+            self.assertEqual(self._summary()["item_count"], 4)
+            add_to_cart(self.user, self.plate)
+            self.assertEqual(self._summary()["line_count"], 2)
+            CartItem.objects.filter(user=self.user, product=self.plate).delete()
+            self.assertEqual(self._summary()["line_count"], 1)
+
+    def test_guest_summary_uses_the_cookie(self):
+        self.client.logout()
+        self.client.post("/api/cart/add/", {"product_id": self.mug.id, "quantity": 2})
+        self.client.post("/api/cart/add/", {"product_id": self.plate.id, "quantity": 3})
+
+        summary = self._summary()
+        self.assertEqual(
+            (summary["item_count"], summary["total"], summary["out_of_stock_count"]),
+            (5, "570.00", 1),
+        )
+
+
+class CartConcurrencyTests(TransactionTestCase):
+    THREADS = 8
+    ADDS_PER_THREAD = 10
+
+    def test_concurrent_adds_keep_every_increment(self):
+        user = User.objects.create_user(username="buyer", password="pass12345")
+        category = Category.objects.create(name="Mugs")
+        product = Product.objects.create(category=category, name="Mug", original_price=250)
+        start = threading.Barrier(self.THREADS)
+        errors = []
+
+        def hammer():
+            try:
+                start.wait()
+                for _ in range(self.ADDS_PER_THREAD):
+                    add_to_cart(user, product)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=hammer) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(CartItem.objects.count(), 1)
+        self.assertEqual(CartItem.objects.get().quantity, self.THREADS * self.ADDS_PER_THREAD)
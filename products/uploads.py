@@ -0,0 +1,95 @@
+import logging
+import threading
+
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .blobs import blob_fields, release_blob, store_blobs
+from .cache import bump_catalog_version
+from .cards import refresh_product_cards
+from .models import Product, ProductImage
+
+
+logger = logging.getLogger(__name__)
+
+
+def store_product_uploads(main_image, extra_files):
+    # Stores the main image and every extra image as content-addressed blobs
+    # in one concurrent batch and returns (main blob or None, [extra blobs]).
+    uploads = ([main_image] if main_image else []) + list(extra_files)
+    blobs = store_blobs(uploads)
+    if main_image:
+        return blobs[0], blobs[1:]
+    return None, blobs
+
+
+def upload_pending_images(product_id, main_upload, pending):
+    # Background half of defer_product_images(). `pending` is
+    # [(ProductImage id, ContentFile)]; a failed file marks its row "failed".
+    uploads = ([main_upload] if main_upload else []) + [upload for _, upload in pending]
+    blobs = store_blobs(uploads, skip_failed=True)
+    main_blob = blobs.pop(0) if main_upload else None
+
+    for (image_id, _), blob in zip(pending, blobs):
+        rows = ProductImage.objects.filter(id=image_id)
+        if blob is None:
+            rows.update(status="failed", updated_at=timezone.now())
+        elif not rows.update(status="ready", updated_at=timezone.now(), **blob_fields(blob)):
+            # The pending row was deleted while its file was uploading.
+            release_blob(blob.id)
+
+    if main_blob:
+        previous = Product.objects.filter(id=product_id).values_list("image_blob_id", flat=True).first()
+        updated = Product.objects.filter(id=product_id).update(
+            updated_at=timezone.now(),
+            **blob_fields(main_blob),
+        )
+        release_blob(previous if updated else main_blob.id)
+
+    refresh_product_cards([product_id])
+    bump_catalog_version()
+
+
+def _run_in_background(job, *args):
+    try:
+        job(*args)
+    except Exception:
+        logger.exception("Deferred image upload job failed")
+    finally:
+        # Connections are per thread; close this one instead of leaking it.
+        connections.close_all()
+
+
+def _start_background(job, *args):
+    threading.Thread(target=_run_in_background, args=(job, *args), daemon=True).start()
+
+
+def _read_upload(upload):
+    # The request's upload (possibly a temp file) is gone once the response
+    # is sent, so a deferred upload keeps its bytes in memory.
+    return ContentFile(b"".join(upload.chunks()), name=upload.name)
+
+
+def defer_product_images(product, main_image, extra_files):
+    # Creates one "pending" ProductImage per extra file now and uploads every
+    # file on a background thread once the transaction commits. The main
+    # image replaces product.image when its upload lands. Returns the rows.
+    start = product.images.count()
+    pending = [
+        ProductImage.objects.create(
+            product=product,
+            image="",
+            status="pending",
+            display_order=start + index,
+        )
+        for index in range(len(extra_files))
+    ]
+    main_upload = _read_upload(main_image) if main_image else None
+    uploads = [(row.id, _read_upload(upload)) for row, upload in zip(pending, extra_files)]
+    if main_upload or uploads:
+        product_id = product.id
+        transaction.on_commit(
+            lambda: _start_background(upload_pending_images, product_id, main_upload, uploads)
+        )
+    return pending
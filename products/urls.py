@@ -24,11 +24,16 @@ urlpatterns = [
     path("auth/me/", me_view, name="auth-me"),
     
 
+    # home
+    path("home/", views.home_feed, name="home"),
+
     # categories
     path("categories/", category_list, name="categories"),
 
     # products
     path("products/", product_list, name="products"),
+    path("products/search/", views.product_search, name="products-search"),
+    path("products/suggest/", views.product_suggest, name="products-suggest"),
     path("products/<int:id>/", product_detail, name="product-detail"),
     path("products/images/<int:id>/", views.product_image_delete, name="product-image-delete"),
     path("products/related/<str:category>/<int:id>/", views.related_products, name="products-related"),
@@ -36,6 +41,7 @@ urlpatterns = [
     path("offers/", offer_list, name="offers-public"),                 # public
     path("seller/offers/", seller_offer_list, name="seller-offers"),   # seller
     path("seller/offers/<int:id>/", seller_offer_detail, name="seller-offer-detail"),
+    path("seller/cache/stats/", views.seller_cache_stats, name="seller-cache-stats"),
 
     # customer auth/profile
     path("customer/register/", views.customer_register, name="customer-register"),
@@ -46,8 +52,10 @@ urlpatterns = [
 
     # cart
     path("cart/", views.cart_list, name="cart"),
+    path("cart/summary/", views.cart_summary, name="cart-summary"),
     path("cart/add/", views.cart_add, name="cart-add"),
     path("cart/update/", views.cart_update, name="cart-update"),
+    path("cart/sync/", views.cart_sync, name="cart-sync"),
     path("cart/remove/<int:product_id>/", views.cart_remove, name="cart-remove"),
 
     # wishlist
@@ -1,4 +1,6 @@
+from rest_framework.authentication import SessionAuthentication
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import PermissionDenied
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework import status
@@ -10,20 +12,75 @@ from django.conf import settings
 from django.contrib.auth.hashers import check_password
 from django.middleware.csrf import get_token
 from django.views.decorators.csrf import ensure_csrf_cookie
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 import logging
 
 
 from .models import Product, ProductImage, Category, Offer, ProductSizeVariant, CartItem, WishlistItem, CustomerProfile, Order, OrderItem, Enquiry
 from .serializers import (
     ProductSerializer,
+    ProductCardSerializer,
     CategorySerializer,
     OfferSerializer,
     CartItemSerializer,
+    CompactCartItemSerializer,
     WishlistItemSerializer,
+    CompactWishlistItemSerializer,
     CustomerProfileSerializer,
     OrderSerializer,
     EnquirySerializer,
+    requested_product_fields,
+    wants_compact_items,
 )
+from .cache import cached_catalog_response, catalog_cache_stats
+from .conditional import (
+    catalog_condition,
+    category_list_validator,
+    product_detail_validator,
+    product_list_validator,
+    request_snapshot,
+    snapshot_condition,
+)
+from .home import home_snapshot
+from .blobs import blob_fields, release_blob
+from .carts import (
+    MAX_SYNC_LINES,
+    add_to_cart,
+    cached_cart_summary,
+    cart_line,
+    guest_cart_summary,
+    set_cart_quantity,
+    sync_cart,
+)
+from .guest_cart import (
+    add_guest_line,
+    clear_guest_cart,
+    guest_cart_items,
+    read_guest_cart,
+    remove_guest_lines,
+    set_guest_line,
+    write_guest_cart,
+)
+from .images import stored_image_url
+from .offers import apply_offer_prices, offers_snapshot
+from .facets import apply_product_filters, facet_counts, parse_product_filters
+from .pagination import InvalidCursor, paginate_by_key, parse_limit, wants_pagination
+from .pricing import PRODUCT_ORDERINGS, effective_price, with_card_sort_keys
+from .cards import refresh_product_cards
+from .queries import (
+    compact_item_queryset,
+    order_queryset,
+    product_queryset,
+    public_product_cards,
+    public_products,
+    with_product_relations,
+)
+from .search import search_product_ids
+from .signals import invalidate_catalog
+from .similarity import RELATED_LIMIT, related_product_ids
+from .suggest import get_index as get_suggestion_index
+from .uploads import defer_product_images, store_product_uploads
 
 logger = logging.getLogger(__name__)
 
@@ -39,22 +96,79 @@ def _extract_upload_images(request):
     return files
 
 
-def _save_product_images(product, files, replace=False):
-    if not files:
+def _extra_uploads(upload_files, main_image):
+    extra_files = list(upload_files)
+    if main_image:
+        try:
+            extra_files.remove(main_image)
+        except ValueError:
+            pass
+    return extra_files
+
+
+def _defer_images(request):
+    raw = request.data.get("defer_images")
+    if raw in (None, ""):
+        return settings.PRODUCT_IMAGE_UPLOADS_DEFERRED
+    return str(raw).lower() in ("1", "true", "yes")
+
+
+def _save_product_with_images(request, serializer, upload_files, main_image, replace=False, **save_kwargs):
+    # The serializer has already validated the main image; its storage write
+    # happens here, together with the extra images, instead of in save().
+    extra_files = _extra_uploads(upload_files, main_image)
+    if _defer_images(request):
+        if main_image:
+            # Keep the current image until the background upload lands.
+            current = serializer.instance.image if serializer.instance else None
+            save_kwargs["image"] = current.name if current else None
+        product = serializer.save(**save_kwargs)
+        if replace:
+            product.images.all().delete()
+        defer_product_images(product, main_image, extra_files)
+        return product
+
+    main_blob, extra_blobs = store_product_uploads(main_image, extra_files)
+    previous_blob_id = serializer.instance.image_blob_id if serializer.instance else None
+    if main_blob:
+        save_kwargs.update(blob_fields(main_blob))
+    try:
+        with transaction.atomic():
+            product = serializer.save(**save_kwargs)
+            if main_blob:
+                release_blob(previous_blob_id)
+            if replace:
+                product.images.all().delete()
+            _save_product_images(product, extra_blobs)
+    except Exception:
+        # No row took the references store_product_uploads() handed out;
+        # give them back so unused blobs are collected.
+        for blob in [main_blob, *extra_blobs]:
+            if blob is not None:
+                release_blob(blob.id)
+        raise
+    return product
+
+
+def _save_product_images(product, blobs):
+    # `blobs` come from store_product_uploads(), each already holding the
+    # reference its new row takes over.
+    if not blobs:
         return
-    if replace:
-        product.images.all().delete()
     start = product.images.count()
     ProductImage.objects.bulk_create(
         [
             ProductImage(
                 product=product,
-                image=file_obj,
                 display_order=start + index,
+                **blob_fields(blob),
             )
-            for index, file_obj in enumerate(files)
+            for index, blob in enumerate(blobs)
         ]
     )
+    # bulk_create bypasses post_save, so refresh the card and cached reads here.
+    refresh_product_cards([product.id])
+    invalidate_catalog()
 
 
 def _parse_offer_price(raw_offer_price, original_price):
@@ -72,6 +186,28 @@ def _parse_offer_price(raw_offer_price, original_price):
     return offer_price_val
 
 
+def _parse_offer_datetime(raw, label):
+    if raw in (None, ""):
+        return None
+    value = parse_datetime(str(raw))
+    if value is None:
+        raise ValueError(f"Invalid {label}")
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def _parse_offer_window(data, starts_at=None, ends_at=None):
+    # Only keys present in the payload change; the rest keep their values.
+    if "starts_at" in data:
+        starts_at = _parse_offer_datetime(data.get("starts_at"), "starts_at")
+    if "ends_at" in data:
+        ends_at = _parse_offer_datetime(data.get("ends_at"), "ends_at")
+    if starts_at and ends_at and ends_at <= starts_at:
+        raise ValueError("ends_at must be after starts_at")
+    return starts_at, ends_at
+
+
 # AUTH APIs (SESSION BASED)
 @api_view(["GET"])
 @permission_classes([AllowAny])
@@ -226,7 +362,7 @@ def customer_login(request):
 
     login(request, user)
     request.session.pop("is_seller", None)
-    return Response(
+    response = Response(
         {
             "message": "Login successful",
             "user": {
@@ -236,6 +372,17 @@ def customer_login(request):
         },
         status=status.HTTP_200_OK
     )
+    guest_lines = read_guest_cart(request)
+    if guest_lines:
+        # The user is logged in either way. A failed merge keeps the guest
+        # cookie, so the next login tries again.
+        try:
+            sync_cart(user, guest_lines)
+        except Exception:
+            logger.exception("Could not merge the guest cart of user id=%s", user.id)
+        else:
+            clear_guest_cart(response)
+    return response
 
 
 
@@ -321,6 +468,19 @@ def _ensure_profile_complete(request):
     return None
 
 
+def _ensure_guest_csrf(request):
+    # DRF checks CSRF only for logged-in sessions, but guest cart writes are
+    # authenticated by the cart cookie, so they get the same check.
+    try:
+        SessionAuthentication().enforce_csrf(request)
+    except PermissionDenied as exc:
+        return Response(
+            {"detail": exc.detail},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    return None
+
+
 def _ensure_authenticated(request):
     if not request.user.is_authenticated:
         return Response(
@@ -334,7 +494,9 @@ def _ensure_authenticated(request):
 
 # CATEGORY APIs (READ)
 
+@catalog_condition("category_list", category_list_validator)
 @api_view(["GET", "POST"])
+@cached_catalog_response("category_list")
 def category_list(request):
     if request.method == "GET":
         categories = Category.objects.filter(is_active=True)
@@ -357,24 +519,63 @@ def category_list(request):
 
 
 
+@catalog_condition("product_list", product_list_validator)
 @api_view(["GET", "POST"])
+@cached_catalog_response("product_list")
 def product_list(request):
 
     # PUBLIC
     if request.method == "GET":
         category_value = request.query_params.get("category")
-        products = Product.objects.filter(is_active=True)
-
-        if category_value:
-            category = Category.objects.filter(
-                Q(slug__iexact=category_value) | Q(name__iexact=category_value)
-            ).first()
-            if category:
-                products = products.filter(category=category)
-            else:
-                products = Product.objects.none()
+        filters = parse_product_filters(request.query_params)
+        fields = requested_product_fields(request.query_params)
+        context = {"product_fields": fields}
+        ordering = request.query_params.get("ordering") or "newest"
+        if ordering not in PRODUCT_ORDERINGS:
+            return Response(
+                {"detail": f"Invalid ordering, use one of: {', '.join(PRODUCT_ORDERINGS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        sort_key, descending, parse_sort_key = PRODUCT_ORDERINGS[ordering]
+        # Card view without an explicit ?fields= reads only the precomputed
+        # ProductCard rows.
+        if request.query_params.get("view") == "card" and not request.query_params.get("fields"):
+            products = with_card_sort_keys(
+                apply_product_filters(public_product_cards(category_value), filters)
+            )
+            serializer_class = ProductCardSerializer
+        else:
+            products = product_queryset(
+                apply_product_filters(public_products(category_value), filters, card_prefix="card__"),
+                fields=fields,
+            )
+            serializer_class = ProductSerializer
 
-        serializer = ProductSerializer(products, many=True)
+        with_facets = str(request.query_params.get("facets", "")).lower() in ("1", "true", "yes")
+        if with_facets or wants_pagination(request):
+            try:
+                rows, next_cursor = paginate_by_key(
+                    products,
+                    request.query_params.get("cursor"),
+                    parse_limit(request.query_params.get("limit")),
+                    key=sort_key,
+                    descending=descending,
+                    parse=parse_sort_key,
+                )
+            except InvalidCursor as exc:
+                return Response(
+                    {"detail": str(exc)},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            serializer = serializer_class(rows, many=True, context=context)
+            payload = {"results": serializer.data, "next": next_cursor}
+            if with_facets:
+                payload["facets"] = facet_counts(filters, category_value)
+            return Response(payload, status=status.HTTP_200_OK)
+
+        sign = "-" if descending else ""
+        products = products.order_by(f"{sign}{sort_key}", f"{sign}pk")
+        serializer = serializer_class(products, many=True, context=context)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     # PROTECTED
@@ -393,14 +594,9 @@ def product_list(request):
 
         serializer = ProductSerializer(data=data)
         if serializer.is_valid():
-            product = serializer.save(seller=request.user)
-            extra_files = list(upload_files)
-            if main_image:
-                try:
-                    extra_files.remove(main_image)
-                except ValueError:
-                    pass
-            _save_product_images(product, extra_files, replace=False)
+            _save_product_with_images(
+                request, serializer, upload_files, main_image, seller=request.user
+            )
             return Response(
                 {"message": "Product created", "data": serializer.data},
                 status=status.HTTP_201_CREATED
@@ -409,7 +605,9 @@ def product_list(request):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@catalog_condition("product_detail", product_detail_validator)
 @api_view(["GET", "PUT", "DELETE"])
+@cached_catalog_response("product_detail")
 def product_detail(request, id):
 
     try:
@@ -422,7 +620,10 @@ def product_detail(request, id):
 
     # PUBLIC
     if request.method == "GET":
-        serializer = ProductSerializer(product)
+        serializer = ProductSerializer(
+            product,
+            context={"product_fields": requested_product_fields(request.query_params)},
+        )
         return Response(serializer.data, status=status.HTTP_200_OK)
     
     # PROTECTED
@@ -443,20 +644,16 @@ def product_detail(request, id):
             product, data=data, partial=True
         )
         if serializer.is_valid():
-            if product.seller is None:
-                saved = serializer.save(seller=request.user)
-            else:
-                saved = serializer.save()
+            save_kwargs = {"seller": request.user} if product.seller is None else {}
             replace_images = str(request.data.get("replace_images", "")).lower() in ("1", "true", "yes")
-            extra_files = list(upload_files)
-            if main_image:
-                try:
-                    extra_files.remove(main_image)
-                except ValueError:
-                    pass
-            if replace_images and not extra_files:
-                saved.images.all().delete()
-            _save_product_images(saved, extra_files, replace=replace_images)
+            _save_product_with_images(
+                request,
+                serializer,
+                upload_files,
+                main_image,
+                replace=replace_images,
+                **save_kwargs,
+            )
             return Response(
                 {"message": "Product updated", "data": serializer.data},
                 status=status.HTTP_200_OK
@@ -471,6 +668,47 @@ def product_detail(request, id):
             status=status.HTTP_200_OK
         )
         
+@api_view(["GET"])
+@permission_classes([AllowAny])
+@cached_catalog_response("product_search")
+def product_search(request):
+    query = (request.query_params.get("q") or "").strip()
+    limit = parse_limit(request.query_params.get("limit"))
+    try:
+        page = max(1, int(request.query_params.get("page", 1)))
+    except (TypeError, ValueError):
+        page = 1
+
+    if not query:
+        return Response({"results": [], "next": None}, status=status.HTTP_200_OK)
+
+    ids = search_product_ids(query, limit + 1, offset=(page - 1) * limit)
+    has_more = len(ids) > limit
+    ids = ids[:limit]
+    fields = requested_product_fields(request.query_params)
+    products = product_queryset(Product.objects.filter(id__in=ids), fields=fields).in_bulk()
+    ranked = [products[pk] for pk in ids if pk in products]
+
+    serializer = ProductSerializer(ranked, many=True, context={"product_fields": fields})
+    return Response(
+        {"results": serializer.data, "next": page + 1 if has_more else None},
+        status=status.HTTP_200_OK
+    )
+
+
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def product_suggest(request):
+    try:
+        limit = int(request.query_params.get("limit", 8))
+    except (TypeError, ValueError):
+        limit = 8
+    suggestions = get_suggestion_index().suggest(
+        request.query_params.get("prefix", ""), limit
+    )
+    return Response(suggestions, status=status.HTTP_200_OK)
+
+
 @api_view(["GET"])
 def inactive_product_list(request):
     guard = _ensure_seller(request)
@@ -478,41 +716,46 @@ def inactive_product_list(request):
       return guard
 
 
-    products = Product.objects.filter(is_active=False)
-    serializer = ProductSerializer(products, many=True)
+    fields = requested_product_fields(request.query_params)
+    products = product_queryset(
+        Product.objects.filter(is_active=False),
+        active_variants=False,
+        fields=fields,
+    )
+    serializer = ProductSerializer(products, many=True, context={"product_fields": fields})
     return Response(serializer.data, status=status.HTTP_200_OK)
 
 @api_view(["GET"])
 @permission_classes([AllowAny])
+@cached_catalog_response("related_products")
 def related_products(request, category, id):
-    category_obj = Category.objects.filter(
-        Q(slug__iexact=category) | Q(name__iexact=category)
-    ).first()
-
-    if not category_obj:
-        return Response([], status=status.HTTP_200_OK)
+    limit = parse_limit(request.query_params.get("limit"), default=RELATED_LIMIT)
+    ids = related_product_ids(id, category, limit)
 
-    products = Product.objects.filter(
-        is_active=True,
-        category=category_obj
-    ).exclude(id=id)
+    fields = requested_product_fields(request.query_params)
+    products = product_queryset(Product.objects.filter(id__in=ids), fields=fields).in_bulk()
+    ranked = [products[pk] for pk in ids if pk in products]
 
-    serializer = ProductSerializer(products, many=True)
+    serializer = ProductSerializer(ranked, many=True, context={"product_fields": fields})
     return Response(serializer.data, status=status.HTTP_200_OK)
+@snapshot_condition(offers_snapshot)
 @api_view(["GET"])
 @permission_classes([AllowAny])
 def offer_list(request):
-    offers = Offer.objects.select_related("product").filter(
-        is_active=True,
-        product__is_active=True,
-    ).order_by("display_order", "-created_at")
-    payload = []
-    for offer in offers:
-        try:
-            payload.append(OfferSerializer(offer).data)
-        except Exception:
-            logger.exception("Skipping broken offer id=%s in public offer_list", offer.id)
-    return Response(payload, status=status.HTTP_200_OK)
+    snapshot, stale = request_snapshot(request, offers_snapshot)
+    response = Response(snapshot["data"], status=status.HTTP_200_OK)
+    response["X-Snapshot"] = "STALE" if stale else "FRESH"
+    return response
+
+
+@snapshot_condition(home_snapshot)
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def home_feed(request):
+    snapshot, stale = request_snapshot(request, home_snapshot)
+    response = Response(snapshot["data"], status=status.HTTP_200_OK)
+    response["X-Snapshot"] = "STALE" if stale else "FRESH"
+    return response
 @api_view(["GET", "POST"])
 def seller_offer_list(request):
     guard = _ensure_seller(request)
@@ -544,6 +787,7 @@ def seller_offer_list(request):
             )
         try:
             offer_price_val = _parse_offer_price(offer_price, product.original_price)
+            starts_at, ends_at = _parse_offer_window(request.data)
         except ValueError as exc:
             return Response(
                 {"detail": str(exc)},
@@ -557,9 +801,11 @@ def seller_offer_list(request):
                 subtitle=request.data.get("subtitle", ""),
                 display_order=request.data.get("display_order", 0),
                 is_active=request.data.get("is_active", True),
+                starts_at=starts_at,
+                ends_at=ends_at,
+                offer_price=offer_price_val,
             )
-            product.offer_price = offer_price_val
-            product.save(update_fields=["offer_price"])
+            apply_offer_prices([product.id])
 
         serializer = OfferSerializer(offer)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -584,6 +830,7 @@ def seller_offer_detail(request, id):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     if request.method == "PUT":
+        previous_product_id = offer.product_id
         product_id = request.data.get("product")
         if product_id is not None:
             try:
@@ -602,6 +849,7 @@ def seller_offer_detail(request, id):
             )
         try:
             offer_price_val = _parse_offer_price(offer_price, offer.product.original_price)
+            starts_at, ends_at = _parse_offer_window(request.data, offer.starts_at, offer.ends_at)
         except ValueError as exc:
             return Response(
                 {"detail": str(exc)},
@@ -617,26 +865,39 @@ def seller_offer_detail(request, id):
                 offer.display_order = request.data.get("display_order", 0)
             if "is_active" in request.data:
                 offer.is_active = request.data.get("is_active", True)
+            offer.starts_at = starts_at
+            offer.ends_at = ends_at
+            offer.offer_price = offer_price_val
             offer.save()
-
-            offer.product.offer_price = offer_price_val
-            offer.product.save(update_fields=["offer_price"])
+            apply_offer_prices({previous_product_id, offer.product_id})
 
         serializer = OfferSerializer(offer)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     if request.method == "DELETE":
-        offer.delete()
+        with transaction.atomic():
+            offer.delete()
+            apply_offer_prices([offer.product_id])
         return Response({"message": "Offer deleted"}, status=status.HTTP_200_OK)
 
+@api_view(["GET"])
+def seller_cache_stats(request):
+    guard = _ensure_seller(request)
+    if guard:
+        return guard
+
+    return Response(catalog_cache_stats(), status=status.HTTP_200_OK)
+
+
 @api_view(["GET"])
 def seller_product_list(request):
     guard = _ensure_seller(request)
     if guard:
         return guard
 
-    products = Product.objects.all()  # ALL PRODUCTS
-    serializer = ProductSerializer(products, many=True)
+    fields = requested_product_fields(request.query_params)
+    products = product_queryset(active_variants=False, fields=fields)  # ALL PRODUCTS
+    serializer = ProductSerializer(products, many=True, context={"product_fields": fields})
     return Response(serializer.data)
 
 
@@ -644,26 +905,79 @@ def seller_product_list(request):
 
 @api_view(["GET"])
 def cart_list(request):
-    guard = _ensure_authenticated(request)
-    if guard:
-        return guard
+    if not request.user.is_authenticated:
+        lines = read_guest_cart(request)
+        if wants_compact_items(request.query_params):
+            items = guest_cart_items(lines, fields=set())
+            return Response(CompactCartItemSerializer(items, many=True).data, status=status.HTTP_200_OK)
+        fields = requested_product_fields(request.query_params)
+        items = guest_cart_items(lines, fields=fields)
+        serializer = CartItemSerializer(items, many=True, context={"product_fields": fields})
+        return Response(serializer.data, status=status.HTTP_200_OK)
 
     try:
-        items = CartItem.objects.filter(user=request.user).select_related(
-            "product", "product__category", "size_variant"
-        )
-        serializer = CartItemSerializer(items, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return _cart_response(request)
     except DatabaseError:
         return Response([], status=status.HTTP_200_OK)
 
 
+def _cart_response(request):
+    if wants_compact_items(request.query_params):
+        items = compact_item_queryset(
+            CartItem.objects.filter(user=request.user).select_related("size_variant"),
+            "quantity",
+            "size_variant",
+        )
+        return Response(CompactCartItemSerializer(items, many=True).data, status=status.HTTP_200_OK)
+
+    fields = requested_product_fields(request.query_params)
+    items = with_product_relations(
+        CartItem.objects.filter(user=request.user).select_related("size_variant"),
+        fields=fields,
+    )
+    serializer = CartItemSerializer(items, many=True, context={"product_fields": fields})
+    return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+def _parse_sync_lines(payload):
+    # [(product_id, size_variant_id or None, quantity)] from the client's
+    # cart, or None when it is not a list of line objects. Quantities are
+    # read like cart_add reads them.
+    if not isinstance(payload, list):
+        return None
+    lines = []
+    for entry in payload:
+        if not isinstance(entry, dict):
+            return None
+        try:
+            product_id = int(entry.get("product_id") or entry.get("product"))
+        except (TypeError, ValueError):
+            return None
+        size_variant_id = entry.get("size_variant_id") or entry.get("size_variant")
+        try:
+            size_variant_id = int(size_variant_id) if size_variant_id not in (None, "") else None
+        except (TypeError, ValueError):
+            return None
+        try:
+            quantity = max(1, int(entry.get("quantity", 1)))
+        except (TypeError, ValueError):
+            quantity = 1
+        lines.append((product_id, size_variant_id, quantity))
+    return lines
+
+
+@api_view(["GET"])
+def cart_summary(request):
+    # Badge and checkout-sidebar figures without the line items.
+    if not request.user.is_authenticated:
+        summary = guest_cart_summary(guest_cart_items(read_guest_cart(request), fields=set()))
+    else:
+        summary = cached_cart_summary(request.user)
+    return Response(summary, status=status.HTTP_200_OK)
+
+
 @api_view(["POST"])
 def cart_add(request):
-    guard = _ensure_authenticated(request)
-    if guard:
-        return guard
-
     product_id = request.data.get("product_id") or request.data.get("product")
     size_variant_id = request.data.get("size_variant_id") or request.data.get("size_variant")
     quantity = request.data.get("quantity", 1)
@@ -698,27 +1012,54 @@ def cart_add(request):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-    item, created = CartItem.objects.get_or_create(
-        user=request.user,
-        product=product,
-        size_variant=size_variant,
-        defaults={"quantity": quantity}
-    )
-
-    if not created:
-        item.quantity += quantity
-        item.save()
+    if not request.user.is_authenticated:
+        guard = _ensure_guest_csrf(request)
+        if guard:
+            return guard
+        key = (product.id, size_variant.id if size_variant else None)
+        lines = add_guest_line(read_guest_cart(request), *key, quantity)
+        if lines is None:
+            return Response(
+                {"detail": "Cart is full"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        quantity = next(line[2] for line in lines if line[:2] == key)
+        item = CartItem(product=product, size_variant=size_variant, quantity=quantity)
+        return write_guest_cart(Response(CartItemSerializer(item).data, status=status.HTTP_200_OK), lines)
 
+    item = add_to_cart(request.user, product, size_variant, quantity)
     serializer = CartItemSerializer(item)
     return Response(serializer.data, status=status.HTTP_200_OK)
 
 
-@api_view(["PUT"])
-def cart_update(request):
+@api_view(["POST"])
+def cart_sync(request):
+    # Merges a whole client-side cart (e.g. a guest cart at login) in one
+    # request and returns the resulting cart. Lines for products or sizes
+    # that no longer exist are skipped.
     guard = _ensure_authenticated(request)
     if guard:
         return guard
 
+    payload = request.data.get("items") if isinstance(request.data, dict) else request.data
+    lines = _parse_sync_lines(payload)
+    if lines is None:
+        return Response(
+            {"detail": "items must be a list of {product_id, size_variant_id, quantity}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if len(lines) > MAX_SYNC_LINES:
+        return Response(
+            {"detail": f"At most {MAX_SYNC_LINES} items can be synced at once"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    sync_cart(request.user, lines)
+    return _cart_response(request)
+
+
+@api_view(["PUT"])
+def cart_update(request):
     product_id = request.data.get("product_id") or request.data.get("product")
     size_variant_id = request.data.get("size_variant_id") or request.data.get("size_variant")
     quantity = request.data.get("quantity")
@@ -731,13 +1072,14 @@ def cart_update(request):
             status=status.HTTP_400_BAD_REQUEST
         )
 
-    items = CartItem.objects.filter(user=request.user, product_id=product_id)
-    if size_variant_id not in (None, ""):
-        items = items.filter(size_variant_id=size_variant_id)
-    else:
-        items = items.filter(size_variant__isnull=True)
+    if not request.user.is_authenticated:
+        return _guest_cart_update(request, product_id, size_variant_id, quantity)
 
-    item = items.first()
+    item = cart_line(
+        request.user,
+        product_id,
+        size_variant_id if size_variant_id not in (None, "") else None,
+    ).first()
     if item is None:
         return Response(
             {"detail": "Item not found"},
@@ -748,19 +1090,55 @@ def cart_update(request):
         item.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
-    item.quantity = quantity
-    item.save()
+    set_cart_quantity(item, quantity)
     serializer = CartItemSerializer(item)
     return Response(serializer.data, status=status.HTTP_200_OK)
 
 
-@api_view(["DELETE"])
-def cart_remove(request, product_id):
-    guard = _ensure_authenticated(request)
+def _guest_line_key(product_id, size_variant_id):
+    # (product_id, size_variant_id or None) as ints, or None if malformed.
+    try:
+        return int(product_id), int(size_variant_id) if size_variant_id not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _guest_cart_update(request, product_id, size_variant_id, quantity):
+    guard = _ensure_guest_csrf(request)
     if guard:
         return guard
+    key = _guest_line_key(product_id, size_variant_id)
+    lines = set_guest_line(read_guest_cart(request), *key, quantity) if key else None
+    if lines is None:
+        return Response(
+            {"detail": "Item not found"},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    if quantity <= 0:
+        return write_guest_cart(Response(status=status.HTTP_204_NO_CONTENT), lines)
 
+    items = guest_cart_items([line for line in lines if line[:2] == key])
+    if not items:
+        return Response(
+            {"detail": "Item not found"},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    return write_guest_cart(Response(CartItemSerializer(items[0]).data, status=status.HTTP_200_OK), lines)
+
+
+@api_view(["DELETE"])
+def cart_remove(request, product_id):
     size_variant_id = request.query_params.get("size_variant_id")
+    if not request.user.is_authenticated:
+        guard = _ensure_guest_csrf(request)
+        if guard:
+            return guard
+        key = _guest_line_key(product_id, size_variant_id)
+        lines = read_guest_cart(request)
+        if key:
+            lines = remove_guest_lines(lines, *key)
+        return write_guest_cart(Response(status=status.HTTP_204_NO_CONTENT), lines)
+
     items = CartItem.objects.filter(user=request.user, product_id=product_id)
     if size_variant_id not in (None, ""):
         items = items.filter(size_variant_id=size_variant_id)
@@ -780,10 +1158,16 @@ def wishlist_list(request):
     if guard:
         return guard
 
-    items = WishlistItem.objects.filter(user=request.user).select_related(
-        "product", "product__category"
+    if wants_compact_items(request.query_params):
+        items = compact_item_queryset(WishlistItem.objects.filter(user=request.user), "added_at")
+        return Response(CompactWishlistItemSerializer(items, many=True).data, status=status.HTTP_200_OK)
+
+    fields = requested_product_fields(request.query_params)
+    items = with_product_relations(
+        WishlistItem.objects.filter(user=request.user),
+        fields=fields,
     )
-    serializer = WishlistItemSerializer(items, many=True)
+    serializer = WishlistItemSerializer(items, many=True, context={"product_fields": fields})
     return Response(serializer.data, status=status.HTTP_200_OK)
 
 
@@ -876,15 +1260,8 @@ def buy_now_order(request):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-    if size_variant is not None:
-        has_offer = (
-            size_variant.offer_price is not None
-            and size_variant.offer_price < size_variant.original_price
-        )
-        selling_price = size_variant.offer_price if has_offer else size_variant.original_price
-    else:
-        has_offer = product.offer_price is not None and product.offer_price < product.original_price
-        selling_price = product.offer_price if has_offer else product.original_price
+    priced = size_variant if size_variant is not None else product
+    selling_price = effective_price(priced.original_price, priced.offer_price)
 
     total_amount = selling_price * quantity
     full_address = address1 if not address2 else f"{address1}, {address2}"
@@ -959,20 +1336,9 @@ def order_from_cart(request):
     for item in cart_items:
         product = item.product
         size_variant = item.size_variant
-        if size_variant is not None:
-            has_offer = (
-                size_variant.offer_price is not None
-                and size_variant.offer_price < size_variant.original_price
-            )
-            selling_price = size_variant.offer_price if has_offer else size_variant.original_price
-            size_label = size_variant.size_label
-        else:
-            has_offer = (
-                product.offer_price is not None
-                and product.offer_price < product.original_price
-            )
-            selling_price = product.offer_price if has_offer else product.original_price
-            size_label = ""
+        priced = size_variant if size_variant is not None else product
+        selling_price = effective_price(priced.original_price, priced.offer_price)
+        size_label = size_variant.size_label if size_variant is not None else ""
         line_total = selling_price * item.quantity
         total_amount += line_total
         OrderItem.objects.create(
@@ -988,7 +1354,7 @@ def order_from_cart(request):
     order.save(update_fields=["total_amount"])
     cart_items.delete()
 
-    order = Order.objects.prefetch_related("items", "items__product").get(id=order.id)
+    order = order_queryset(Order.objects.all()).get(id=order.id)
     serializer = OrderSerializer(order)
     return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -1001,8 +1367,9 @@ def order_list(request):
             status=status.HTTP_401_UNAUTHORIZED
         )
 
-    orders = Order.objects.filter(user=request.user).prefetch_related("items", "items__product")
-    serializer = OrderSerializer(orders, many=True)
+    fields = requested_product_fields(request.query_params)
+    orders = order_queryset(Order.objects.filter(user=request.user), fields=fields)
+    serializer = OrderSerializer(orders, many=True, context={"product_fields": fields})
     return Response(serializer.data, status=status.HTTP_200_OK)
 
 
@@ -1014,8 +1381,9 @@ def order_detail(request, id):
             status=status.HTTP_401_UNAUTHORIZED
         )
 
+    fields = requested_product_fields(request.query_params)
     try:
-        order = Order.objects.prefetch_related("items", "items__product").get(
+        order = order_queryset(Order.objects.all(), fields=fields).get(
             id=id, user=request.user
         )
     except Order.DoesNotExist:
@@ -1024,7 +1392,7 @@ def order_detail(request, id):
             status=status.HTTP_404_NOT_FOUND
         )
 
-    serializer = OrderSerializer(order)
+    serializer = OrderSerializer(order, context={"product_fields": fields})
     return Response(serializer.data, status=status.HTTP_200_OK)
 
 
@@ -1105,6 +1473,8 @@ def product_image_delete(request, id):
         )
 
     image.delete()
+    # Keeps the product's Last-Modified/ETag moving when only its gallery changes.
+    image.product.save(update_fields=["updated_at"])
     return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -1153,7 +1523,7 @@ def seller_order_list(request):
             "product_id": item.product.id,
             "product_name": item.product.name,
             "category_name": item.product.category.name if item.product.category else "",
-            "image": item.product.image.url if item.product.image else "",
+            "image": stored_image_url(item.product) or "",
             "size_label": item.size_label or (item.size_variant.size_label if item.size_variant else ""),
             "quantity": item.quantity,
             "price": item.price,